@@ -0,0 +1,780 @@
+import io, math, os, random, shutil, sys, time
+
+from Catalog.Schema        import DBSchema
+from Storage.BufferPool    import BufferPool
+from Storage.StorageEngine import StorageEngine
+
+benchDataDir = "bench-data/"
+
+# Creates a storage engine in a scratch data directory, along with a relation
+# holding the given number of empty pages.
+def scratchStorage(numPages, **kwargs):
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+  schema  = DBSchema('bench', [('id', 'int'), ('payload', 'char(100)')])
+  storage = StorageEngine(dataDir=benchDataDir, **kwargs)
+  storage.createRelation(schema.name, schema)
+  (_, rFile) = storage.fileMgr.relationFile(schema.name)
+  pageIds = [rFile.allocatePage().pageId for i in range(numPages)]
+  return (storage, rFile, pageIds)
+
+# Releases every page held in the buffer pool, including pinned pages.
+def resetBufferPool(bufPool):
+  for pageId in list(bufPool.pageMap.keys()):
+    while bufPool.pagePinCount(pageId):
+      bufPool.unpinPage(pageId)
+    bufPool.discardPage(pageId)
+
+# Measures the latency of a buffer pool miss as a growing fraction of the
+# pool is pinned. Eviction cost should stay flat as the pinned fraction grows.
+def evictionLatency(poolPages=1024, misses=5000, fractions=[0.0, 0.25, 0.5, 0.75, 0.9, 0.99]):
+  pageSize = io.DEFAULT_BUFFER_SIZE
+  (storage, rFile, pageIds) = scratchStorage(3 * poolPages, poolSize=poolPages*pageSize)
+  bufPool = storage.bufferPool
+
+  for fraction in fractions:
+    resetBufferPool(bufPool)
+    numPinned = int(fraction * poolPages)
+    for pageId in pageIds[:numPinned]:
+      bufPool.getPage(pageId, pinned=True)
+
+    # Fill the rest of the pool with unpinned pages.
+    for pageId in pageIds[numPinned:poolPages]:
+      bufPool.getPage(pageId)
+
+    # Cycle through pages that are not resident, so that every access misses.
+    candidates = pageIds[poolPages:]
+    start = time.time()
+    for i in range(misses):
+      bufPool.getPage(candidates[i % len(candidates)])
+    end = time.time()
+
+    print("Pinned: {:.0%}".format(fraction) \
+          + " Miss latency (us): {:.2f}".format(1e6 * (end - start) / misses))
+
+  storage.close()
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+
+# Measures the buffer pool hit ratio of point lookups on a hot set of pages that
+# fits in the buffer pool, interleaved with sequential scans of a relation four
+# times larger than the pool, with and without scan rings.
+def scanResistance(poolPages=256, hotPages=128, scans=3, scanPagesPerLookup=4):
+  pageSize = io.DEFAULT_BUFFER_SIZE
+  (storage, rFile, pageIds) = scratchStorage(hotPages + 4 * poolPages, poolSize=poolPages*pageSize)
+  bufPool  = storage.bufferPool
+  hotSet   = pageIds[:hotPages]
+  ringFraction = BufferPool.scanRingFraction
+
+  for (label, fraction) in [("shared pool", math.inf), ("scan ring", ringFraction)]:
+    BufferPool.scanRingFraction = fraction
+    resetBufferPool(bufPool)
+    for pageId in hotSet:
+      bufPool.getPage(pageId)
+
+    hits = 0
+    lookups = 0
+    for i in range(scans):
+      for (j, _) in enumerate(rFile.pages()):
+        if j % scanPagesPerLookup == 0:
+          hits    += bufPool.getPageWithHit(hotSet[lookups % hotPages])[1]
+          lookups += 1
+
+    print("Scan with " + label + " Lookup hit ratio: {:.3f}".format(hits / lookups))
+
+  BufferPool.scanRingFraction = ringFraction
+  storage.close()
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+
+# Returns the resident set size of this process, in megabytes.
+def residentMemory():
+  with open('/proc/self/statm') as f:
+    return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1 << 20)
+
+# Reports the resident memory after loading a TPC-H dataset and then reading every
+# page of every relation into a buffer pool large enough to hold the database.
+def loadMemory(datadir='test/datasets/tpch-tiny', scaleFactor=1.0, poolPages=32768):
+  from Database                import Database
+  from Utils.WorkloadGenerator import WorkloadGenerator
+
+  pageSize = io.DEFAULT_BUFFER_SIZE
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+  print("Startup RSS (MB): {:.1f}".format(residentMemory()))
+
+  wg = WorkloadGenerator()
+  db = Database(dataDir=benchDataDir, pageSize=pageSize, poolSize=poolPages*pageSize)
+  print("Empty pool RSS (MB): {:.1f}".format(residentMemory()))
+
+  wg.createRelations(db)
+  wg.loadDataset(db, datadir, scaleFactor)
+
+  ringFraction = BufferPool.scanRingFraction
+  BufferPool.scanRingFraction = math.inf
+  numPages = sum(1 for rel in db.relations() for _ in db.storageEngine().pages(rel))
+  BufferPool.scanRingFraction = ringFraction
+
+  bufPool = db.bufferPool()
+  print("Resident pages: " + str(bufPool.numPages() - bufPool.numFreePages()) + " of " + str(numPages))
+  print("Loaded RSS (MB): {:.1f}".format(residentMemory()))
+
+  db.close()
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+
+# Measures the time to construct a default-sized buffer pool, and the resident
+# memory it holds before any page is read.
+def poolStartup(trials=20):
+  start = time.time()
+  for i in range(trials):
+    bufPool = BufferPool()
+  end = time.time()
+
+  print("Pool construction (ms): {:.2f}".format(1e3 * (end - start) / trials))
+  print("Empty pool RSS (MB): {:.1f}".format(residentMemory()))
+
+# Loads a TPC-H dataset through a small buffer pool, with and without the background
+# writer, and reports the number of page writes, the number of write calls made
+# after merging adjacent pages, and the fraction of writes that directly follow the
+# previous write to the same file.
+def dirtyWrites(datadir='test/datasets/tpch-tiny', scaleFactor=1.0, poolPages=64):
+  from Database                import Database
+  from Storage.File            import StorageFile
+  from Utils.WorkloadGenerator import WorkloadGenerator
+
+  pageSize   = io.DEFAULT_BUFFER_SIZE
+  writePage  = StorageFile.writePageData
+  writePages = StorageFile.writePagesData
+  writes     = []
+  writeCalls = [0]
+
+  def tracedWrite(storageFile, pageId, pageData):
+    writes.append((pageId.fileId.fileIndex, pageId.pageIndex))
+    writeCalls[0] += 1
+    writePage(storageFile, pageId, pageData)
+
+  def tracedWrites(storageFile, pageData):
+    writes.extend((pageId.fileId.fileIndex, pageId.pageIndex) for (pageId, _) in pageData)
+    writeCalls[0] += len(storageFile.pageRuns([pageId for (pageId, _) in pageData]))
+    writePages(storageFile, pageData)
+
+  StorageFile.writePageData  = tracedWrite
+  StorageFile.writePagesData = tracedWrites
+  for writer in [False, True]:
+    shutil.rmtree(benchDataDir, ignore_errors=True)
+    del writes[:]
+    writeCalls[0] = 0
+
+    wg = WorkloadGenerator()
+    db = Database(dataDir=benchDataDir, pageSize=pageSize, poolSize=poolPages*pageSize, backgroundWriter=writer)
+    wg.createRelations(db)
+    start = time.time()
+    wg.loadDataset(db, datadir, scaleFactor, bulk=False)
+    db.close()
+    end = time.time()
+
+    lastWrite  = {}
+    sequential = 0
+    for (fileIndex, pageIndex) in writes:
+      if lastWrite.get(fileIndex, None) == pageIndex - 1:
+        sequential += 1
+      lastWrite[fileIndex] = pageIndex
+
+    print("Background writer: " + str(writer) + " Page writes: " + str(len(writes)) \
+          + " Write calls: " + str(writeCalls[0]) \
+          + " Sequential: {:.1%}".format(sequential / max(1, len(writes))) \
+          + " Load and close time (s): {:.2f}".format(end - start))
+
+  StorageFile.writePageData  = writePage
+  StorageFile.writePagesData = writePages
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+
+# Asks the operating system to drop its cached pages for the relation files in a data directory.
+def dropFileCache(dataDir):
+  for name in os.listdir(dataDir):
+    if name.endswith('.rel'):
+      fd = os.open(os.path.join(dataDir, name), os.O_RDONLY)
+      os.fsync(fd)
+      os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+      os.close(fd)
+
+# Runs the WorkloadGenerator's sequential scan workload on a cold buffer pool that
+# is smaller than the scanned relations, with and without sequential read-ahead.
+# Relation files are also dropped from the operating system's cache before each run.
+def readAheadScan(datadir='test/datasets/tpch-tiny', scaleFactor=1.0, poolPages=256, trials=3):
+  from Database                import Database
+  from Utils.WorkloadGenerator import WorkloadGenerator
+
+  pageSize = io.DEFAULT_BUFFER_SIZE
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+  wg = WorkloadGenerator()
+  db = Database(dataDir=benchDataDir, pageSize=pageSize)
+  wg.createRelations(db)
+  wg.loadDataset(db, datadir, scaleFactor)
+  db.close()
+
+  for readAhead in [False, True]:
+    for i in range(trials):
+      dropFileCache(benchDataDir)
+      db = Database(dataDir=benchDataDir, pageSize=pageSize, poolSize=poolPages*pageSize, readAhead=readAhead)
+      print("Read-ahead: " + str(readAhead))
+      wg.scanRelations(db, ['lineitem', 'orders'])
+      bufPool = db.bufferPool()
+      print("Prefetched pages: " + str(bufPool.numPrefetched) + " used: " + str(bufPool.numPrefetchHits))
+      db.close()
+
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+
+# Reads every page of a relation from disk, one page per call, and with vectored
+# reads of windows of adjacent pages.
+def vectoredReads(numPages=8192, window=32, trials=3):
+  pageSize = io.DEFAULT_BUFFER_SIZE
+  (storage, rFile, pageIds) = scratchStorage(numPages, poolSize=window*pageSize)
+  rFile.flush()
+  buffers = [bytearray(pageSize) for i in range(window)]
+
+  for trial in range(trials):
+    start = time.time()
+    for pageId in pageIds:
+      rFile.readPage(pageId, buffers[0])
+    end = time.time()
+    print("Single page reads (ms): {:.1f}".format(1e3 * (end - start)))
+
+    start = time.time()
+    for i in range(0, numPages, window):
+      rFile.readPages(pageIds[i:i+window], buffers[:len(pageIds[i:i+window])])
+    end = time.time()
+    print("Vectored reads of " + str(window) + " pages (ms): {:.1f}".format(1e3 * (end - start)))
+
+  storage.close()
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+
+# Runs the WorkloadGenerator's sequential scan workload on relations read into buffer
+# pool frames, and on memory-mapped relations, with the dataset in the OS cache.
+def mappedScan(datadir='test/datasets/tpch-tiny', scaleFactor=1.0, poolPages=256, trials=3):
+  from Database                import Database
+  from Utils.WorkloadGenerator import WorkloadGenerator
+
+  pageSize = io.DEFAULT_BUFFER_SIZE
+  wg = WorkloadGenerator()
+  for mapped in [False, True]:
+    shutil.rmtree(benchDataDir, ignore_errors=True)
+    db = Database(dataDir=benchDataDir, pageSize=pageSize)
+    for name in wg.schemas:
+      db.createRelation(name, wg.schemas[name].schema(), mapped=mapped)
+    wg.loadDataset(db, datadir, scaleFactor)
+    db.close()
+
+    for i in range(trials):
+      db = Database(dataDir=benchDataDir, pageSize=pageSize, poolSize=poolPages*pageSize)
+      print("Mapped: " + str(mapped))
+      wg.scanRelations(db, ['lineitem', 'orders'])
+      db.close()
+
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+
+# Measures the time to reopen a storage engine holding a relation of the given
+# size, with its saved free space map, and by scanning its page headers.
+def restartTime(numPages=16384, trials=3):
+  (storage, rFile, pageIds) = scratchStorage(numPages)
+  storage.close()
+
+  for fsm in [True, False]:
+    for i in range(trials):
+      if not fsm:
+        os.remove(rFile.freeSpaceMapPath())
+      start   = time.time()
+      storage = StorageEngine(dataDir=benchDataDir)
+      end     = time.time()
+      print("Free space map: " + str(fsm) + " Restart time (ms): {:.1f}".format(1e3 * (end - start)))
+      storage.close()
+
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+
+# Loads the lineitem relation of a TPC-H dataset with per-tuple inserts, and with a bulk load.
+# Reports the total load time including CSV parsing, and the time spent in the storage layer.
+def bulkLoad(datadir='test/datasets/tpch-tiny', poolPages=1024):
+  from Database                import Database
+  from Utils.WorkloadGenerator import WorkloadGenerator
+
+  pageSize = io.DEFAULT_BUFFER_SIZE
+  wg       = WorkloadGenerator()
+  with open(os.path.join(datadir, 'lineitem.csv')) as f:
+    lines = f.readlines()
+
+  for bulk in [False, True]:
+    shutil.rmtree(benchDataDir, ignore_errors=True)
+    db = Database(dataDir=benchDataDir, pageSize=pageSize, poolSize=poolPages*pageSize)
+    db.createRelation('lineitem', wg.schemas['lineitem'].schema())
+
+    start = time.time()
+    tuples = list(wg.packLines('lineitem', lines, 1.0))
+    parsed = time.time()
+    if bulk:
+      db.bulkLoad('lineitem', tuples)
+    else:
+      for tupleData in tuples:
+        db.insertTuple('lineitem', tupleData)
+    db.close()
+    end = time.time()
+
+    print("Bulk load: " + str(bulk) + " Tuples: " + str(len(tuples)) \
+          + " Load time (s): {:.2f}".format(end - start) \
+          + " Storage time (s): {:.3f}".format(end - parsed))
+
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+
+# Loads a TPC-H dataset in bulk, sequentially and with parallel CSV parsing by
+# growing numbers of worker processes.
+def parallelLoad(datadir='test/datasets/tpch-tiny', scaleFactor=1.0, workerCounts=[None, 1, 2, 4]):
+  from Database                import Database
+  from Utils.WorkloadGenerator import WorkloadGenerator
+
+  print("CPUs: " + str(os.cpu_count()))
+  for workers in workerCounts:
+    shutil.rmtree(benchDataDir, ignore_errors=True)
+    wg = WorkloadGenerator()
+    db = Database(dataDir=benchDataDir)
+    wg.createRelations(db)
+    start = time.time()
+    wg.loadDataset(db, datadir, scaleFactor, workers=workers)
+    db.close()
+    end = time.time()
+    print("Workers: " + str(workers) + " Load time (s): {:.2f}".format(end - start))
+
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+
+# Loads a TPC-H dataset with its fixed-size schemas, and with its character fields declared
+# as variable-length fields. Reports the tuples per page and pages of each relation, and the
+# pages read and time taken by a cold scan of the lineitem and orders relations.
+def varcharLayout(datadir='test/datasets/tpch-tiny', scaleFactor=1.0, poolPages=256):
+  from Catalog.Schema          import Types
+  from Database                import Database
+  from Utils.WorkloadGenerator import WorkloadGenerator
+
+  pageSize = io.DEFAULT_BUFFER_SIZE
+  for variable in [False, True]:
+    shutil.rmtree(benchDataDir, ignore_errors=True)
+    wg = WorkloadGenerator()
+    if variable:
+      for (name, schema) in wg.schemas.items():
+        wg.schemas[name] = DBSchema(name, [(f, 'var' + t if t.startswith('char') and Types.typeSize(t) > 1 else t) \
+                                             for (f, t) in schema.schema()])
+    db = Database(dataDir=benchDataDir, pageSize=pageSize)
+    for name in wg.schemas:
+      db.createRelation(name, wg.schemas[name].schema())
+    wg.loadDataset(db, datadir, scaleFactor)
+    db.close()
+
+    print("Variable-length: " + str(variable))
+    db = Database(dataDir=benchDataDir, pageSize=pageSize, poolSize=poolPages*pageSize)
+    for name in sorted(wg.schemas):
+      (_, rFile) = db.fileManager().relationFile(name)
+      print(name + " Pages: " + str(rFile.numPages()) \
+            + " Tuples per page: {:.1f}".format(rFile.numTuples() / max(1, rFile.numPages())))
+
+    scanned = sum(db.fileManager().relationFile(name)[1].numPages() for name in ['lineitem', 'orders'])
+    print("Pages scanned: " + str(scanned))
+    dropFileCache(benchDataDir)
+    wg.scanRelations(db, ['lineitem', 'orders'])
+    db.close()
+
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+
+# Loads the lineitem relation of a TPC-H dataset with row-oriented and PAX pages, and times
+# a scan of all its tuples, and TPC-H Q6 as a query plan, processed operator-at-a-time and
+# compiled. Selections and projections over PAX pages decode only the columns they use.
+def paxScan(datadir='test/datasets/tpch-tiny', scaleFactor=1.0, poolPages=8192, trials=3):
+  from Database                import Database
+  from Storage.PaxPage         import PaxPage
+  from Storage.SlottedPage     import SlottedPage
+  from Utils.WorkloadGenerator import WorkloadGenerator
+
+  pageSize = io.DEFAULT_BUFFER_SIZE
+  wg       = WorkloadGenerator()
+  schema   = wg.schemas['lineitem']
+
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+  db = Database(dataDir=benchDataDir, pageSize=pageSize, poolSize=poolPages*pageSize)
+  for (name, pageClass) in [('row', SlottedPage), ('pax', PaxPage)]:
+    db.createRelation(name, schema.schema(), pageClass=pageClass)
+    with open(os.path.join(datadir, 'lineitem.csv')) as f:
+      db.bulkLoad(name, wg.packLines('lineitem', f, scaleFactor))
+
+  groupKeySchema = DBSchema('groupKey', [('ONE', 'int')])
+  groupAggSchema = DBSchema('groupBy', [('revenue', 'double')])
+  for name in ['row', 'pax']:
+    (_, rFile) = db.fileManager().relationFile(name)
+    print(name + " Pages: " + str(rFile.numPages()))
+    for i in range(trials):
+      start = time.time()
+      numTuples = sum(1 for tupleData in rFile.tuples())
+      scanned = time.time()
+      print(name + " Tuples: " + str(numTuples) + " Scan time (s): {:.3f}".format(scanned - start))
+
+      for compiled in [False, True]:
+        query = db.query().fromTable(name).where(
+                  "(L_SHIPDATE >= 19940101) and (L_SHIPDATE < 19950101) and "
+                  "(0.06 - 0.01 <= L_DISCOUNT <= 0.06 + 0.01) and (L_QUANTITY < 24)").select(
+                  {'revenue' : ('L_EXTENDEDPRICE * L_DISCOUNT', 'double')}).groupBy(
+                  groupSchema=groupKeySchema,
+                  aggSchema=groupAggSchema,
+                  groupExpr=['1'],
+                  aggExprs=[('sum', 'revenue')],
+                  groupHashFn=(lambda gbVal: 0)).finalize()
+
+        start   = time.time()
+        results = [query.schema().unpack(tup) for (_, page) in db.processQuery(query, compiled=compiled) for tup in page]
+        end     = time.time()
+        print(name + (" compiled" if compiled else " volcano ") + " Q6 time (s): {:.3f}".format(end - start) \
+              + " Revenue: {:.2f}".format(results[0].revenue))
+
+  db.close()
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+
+
+# Compares a selection on lineitem's ship date with and without zone maps,
+# over a relation loaded in ship date order and one in its original order.
+def zoneMapScan(datadir='test/datasets/tpch-tiny', scaleFactor=1.0, poolPages=8192, trials=3):
+  from Database                import Database
+  from Utils.WorkloadGenerator import WorkloadGenerator
+
+  pageSize  = io.DEFAULT_BUFFER_SIZE
+  wg        = WorkloadGenerator()
+  schema    = wg.schemas['lineitem']
+  predicate = 'L_SHIPDATE >= 19940101 and L_SHIPDATE < 19950101'
+
+  with open(os.path.join(datadir, 'lineitem.csv')) as f:
+    tuples = list(wg.packLines('lineitem', f, scaleFactor))
+  shipdates = [schema.unpack(tupleData).L_SHIPDATE for tupleData in tuples]
+  clustered = [tupleData for (_, tupleData) in sorted(zip(shipdates, tuples), key=lambda x: x[0])]
+
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+  db = Database(dataDir=benchDataDir, pageSize=pageSize, poolSize=poolPages*pageSize)
+  relations = [('unsorted', tuples, False), ('unsorted_zm', tuples, True), \
+               ('clustered', clustered, False), ('clustered_zm', clustered, True)]
+  for (name, rows, zoneMaps) in relations:
+    db.createRelation(name, schema.schema(), zoneMaps=zoneMaps)
+    db.bulkLoad(name, iter(rows))
+
+  for (name, _, _) in relations:
+    (_, rFile) = db.fileManager().relationFile(name)
+    for i in range(trials):
+      query = db.query().fromTable(name).where(predicate).finalize()
+      scan  = query.root.subPlan
+      start = time.time()
+      numResults = sum(1 for (_, page) in db.processQuery(query) for tupleData in page)
+      end   = time.time()
+      pagesRead = sum(1 for _ in db.storageEngine().pages(name, scan.pageRanges))
+      print(name + " Pages: " + str(rFile.numPages()) + " Scanned: " + str(pagesRead) \
+            + " Results: " + str(numResults) + " Time (s): {:.3f}".format(end - start))
+      db.storageEngine().removeRelation(query.root.relationId())
+
+  db.close()
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+
+
+# Measures slotted page header operations on the slot bitvector: filling pages
+# tuple-at-a-time, iterating over their tuples, and counting their tuples.
+def slotBitmap(numPages=200, trials=3):
+  from Catalog.Identifiers import FileId, PageId
+  from Storage.SlottedPage import SlottedPage
+
+  pageSize = io.DEFAULT_BUFFER_SIZE
+  for tupleSize in [8, 64]:
+    schema    = DBSchema('bench', [('id', 'int'), ('payload', 'char(' + str(tupleSize - 4) + ')')])
+    tupleData = schema.pack(schema.instantiate(1, 'x'))
+    for i in range(trials):
+      start = time.time()
+      pages = []
+      for j in range(numPages):
+        page = SlottedPage(pageId=PageId(FileId(0), j), buffer=bytes(pageSize), schema=schema)
+        while page.insertTuple(tupleData):
+          pass
+        pages.append(page)
+      inserted = time.time()
+      numTuples = sum(1 for page in pages for _ in page)
+      scanned = time.time()
+      counted = sum(page.header.numTuples() for page in pages)
+      end = time.time()
+      print("Tuple size: " + str(tupleSize) + " Tuples: " + str(numTuples) + " Counted: " + str(counted) \
+            + " Insert (s): {:.3f}".format(inserted - start) + " Scan (s): {:.3f}".format(scanned - inserted) \
+            + " Count (s): {:.3f}".format(end - scanned))
+
+
+# Compares decoding lineitem pages tuple-at-a-time with decoding whole pages,
+# and times a selection and projection query over lineitem.
+def batchDecode(datadir='test/datasets/tpch-tiny', scaleFactor=1.0, poolPages=8192, trials=3):
+  from Database                import Database
+  from Utils.WorkloadGenerator import WorkloadGenerator
+
+  pageSize = io.DEFAULT_BUFFER_SIZE
+  wg       = WorkloadGenerator()
+  schema   = wg.schemas['lineitem']
+
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+  db = Database(dataDir=benchDataDir, pageSize=pageSize, poolSize=poolPages*pageSize)
+  db.createRelation('lineitem', schema.schema())
+  with open(os.path.join(datadir, 'lineitem.csv')) as f:
+    db.bulkLoad('lineitem', wg.packLines('lineitem', f, scaleFactor))
+  (_, rFile) = db.fileManager().relationFile('lineitem')
+
+  for i in range(trials):
+    start = time.time()
+    numTuples = sum(1 for (_, page) in rFile.pages() for tupleData in page if schema.unpack(tupleData))
+    unpacked = time.time()
+    numDecoded = sum(len(page.decodeAll(schema)) for (_, page) in rFile.pages())
+    decoded = time.time()
+    query = db.query().fromTable('lineitem').where('L_QUANTITY < 24') \
+              .select({'revenue': ('L_EXTENDEDPRICE * L_DISCOUNT', 'double')}).finalize()
+    numResults = sum(1 for (_, page) in db.processQuery(query) for tupleData in page)
+    end = time.time()
+    print("Tuples: " + str(numTuples) + " Decoded: " + str(numDecoded) + " Results: " + str(numResults) \
+          + " Unpack (s): {:.3f}".format(unpacked - start) + " Decode (s): {:.3f}".format(decoded - unpacked) \
+          + " Query (s): {:.3f}".format(end - decoded))
+    db.storageEngine().removeRelation(query.root.relationId())
+
+  db.close()
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+
+
+# Times packing and unpacking lineitem tuples with their schema, in memory.
+def schemaCodecs(datadir='test/datasets/tpch-tiny', scaleFactor=1.0, trials=3):
+  from Utils.WorkloadGenerator import WorkloadGenerator
+
+  wg     = WorkloadGenerator()
+  schema = wg.schemas['lineitem']
+  with open(os.path.join(datadir, 'lineitem.csv')) as f:
+    tuples = list(wg.packLines('lineitem', f, scaleFactor))
+  instances = [schema.unpack(tupleData) for tupleData in tuples]
+
+  for i in range(trials):
+    start    = time.time()
+    unpacked = [schema.unpack(tupleData) for tupleData in tuples]
+    middle   = time.time()
+    packed   = [schema.pack(instance) for instance in instances]
+    end      = time.time()
+    print("Tuples: " + str(len(tuples)) + " Matches: " + str(unpacked == instances) \
+          + " Unpack (s): {:.3f}".format(middle - start) + " Pack (s): {:.3f}".format(end - middle))
+
+
+# Compares binary projections of lineitem tuples onto key schemas with
+# projections through their unpacked instances.
+def binaryProjection(datadir='test/datasets/tpch-tiny', scaleFactor=1.0, trials=3):
+  from Utils.WorkloadGenerator import WorkloadGenerator
+
+  wg     = WorkloadGenerator()
+  schema = wg.schemas['lineitem']
+  with open(os.path.join(datadir, 'lineitem.csv')) as f:
+    tuples = list(wg.packLines('lineitem', f, scaleFactor))
+
+  keySchemas = [DBSchema('lineitemKey', [('L_ORDERKEY', 'int'), ('L_LINENUMBER', 'int')]), \
+                DBSchema('lineitemShip', [('L_SHIPMODE', 'char(10)'), ('L_SHIPDATE', 'int'), ('L_DISCOUNT', 'double')])]
+  for keySchema in keySchemas:
+    for i in range(trials):
+      start   = time.time()
+      unpacked = [keySchema.pack(schema.project(schema.unpack(tupleData), keySchema)) for tupleData in tuples]
+      middle  = time.time()
+      binary  = [schema.projectBinary(tupleData, keySchema) for tupleData in tuples]
+      end     = time.time()
+      print(keySchema.name + " Tuples: " + str(len(tuples)) + " Matches: " + str(unpacked == binary) \
+            + " Unpacked (s): {:.3f}".format(middle - start) + " Binary (s): {:.3f}".format(end - middle))
+
+
+# Measures the memory held by a list of tuple ids, with a tuple id per slot of each page
+# as produced by bulk loading, and the time to hash, compare, pack and unpack them.
+def tupleIdMemory(numTupleIds=1000000, tuplesPerPage=100):
+  import tracemalloc
+  from Catalog.Identifiers import FileId, PageId, TupleId
+
+  tracemalloc.start()
+  start    = time.time()
+  fileId   = FileId(1)
+  tupleIds = []
+  for i in range(numTupleIds // tuplesPerPage):
+    pageId = PageId(fileId, i % 65536)
+    tupleIds.extend(TupleId(pageId, j) for j in range(tuplesPerPage))
+  created = time.time()
+  (memory, _) = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+
+  unique  = len(set(tupleIds))
+  hashed  = time.time()
+  packed  = [tupleId.pack() for tupleId in tupleIds]
+  middle  = time.time()
+  matches = all(TupleId.unpack(data) == tupleId for (data, tupleId) in zip(packed, tupleIds))
+  end     = time.time()
+  print("Tuple ids: " + str(len(tupleIds)) + " Unique: " + str(unique) + " Round trip: " + str(matches) \
+        + " Memory (MB): {:.1f}".format(memory / (1024 * 1024)) + " Create (s): {:.3f}".format(created - start) \
+        + " Set (s): {:.3f}".format(hashed - created) + " Pack (s): {:.3f}".format(middle - hashed) \
+        + " Unpack and compare (s): {:.3f}".format(end - middle))
+
+
+# Times TPC-H Q6 as a selection, group-by and projection plan over lineitem.
+def tpchQ6(datadir='test/datasets/tpch-tiny', scaleFactor=1.0, poolPages=8192, trials=3):
+  from Database                import Database
+  from Utils.WorkloadGenerator import WorkloadGenerator
+
+  pageSize = io.DEFAULT_BUFFER_SIZE
+  wg       = WorkloadGenerator()
+
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+  db = Database(dataDir=benchDataDir, pageSize=pageSize, poolSize=poolPages*pageSize)
+  db.createRelation('lineitem', wg.schemas['lineitem'].schema())
+  with open(os.path.join(datadir, 'lineitem.csv')) as f:
+    db.bulkLoad('lineitem', wg.packLines('lineitem', f, scaleFactor))
+
+  groupKeySchema = DBSchema('groupKey', [('ONE', 'int')])
+  groupAggSchema = DBSchema('groupBy', [('revenue', 'double')])
+  for i in range(trials):
+    query = db.query().fromTable('lineitem').where(
+              "(L_SHIPDATE >= 19940101) and (L_SHIPDATE < 19950101) and "
+              "(0.06 - 0.01 <= L_DISCOUNT <= 0.06 + 0.01) and (L_QUANTITY < 24)").groupBy(
+              groupSchema=groupKeySchema,
+              aggSchema=groupAggSchema,
+              groupExpr=(lambda e: 1),
+              aggExprs=[(0, lambda acc, e: acc + (e.L_EXTENDEDPRICE * e.L_DISCOUNT), lambda x: x)],
+              groupHashFn=(lambda gbVal: hash(gbVal) % 1)).select(
+              {'revenue' : ('revenue', 'double')}).finalize()
+
+    start   = time.time()
+    results = [query.schema().unpack(tup) for (_, page) in db.processQuery(query) for tup in page]
+    end     = time.time()
+    print("Q6 results: " + str(results) + " Time (s): {:.3f}".format(end - start))
+
+  db.close()
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+
+
+# Times a selection, projection and selection chain over lineitem, processed
+# operator-at-a-time and as a compiled pipeline.
+def compiledPipeline(datadir='test/datasets/tpch-tiny', scaleFactor=1.0, poolPages=8192, trials=3):
+  from Database                import Database
+  from Utils.WorkloadGenerator import WorkloadGenerator
+
+  pageSize = io.DEFAULT_BUFFER_SIZE
+  wg       = WorkloadGenerator()
+
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+  db = Database(dataDir=benchDataDir, pageSize=pageSize, poolSize=poolPages*pageSize)
+  db.createRelation('lineitem', wg.schemas['lineitem'].schema())
+  with open(os.path.join(datadir, 'lineitem.csv')) as f:
+    db.bulkLoad('lineitem', wg.packLines('lineitem', f, scaleFactor))
+
+  for i in range(trials):
+    for compiled in [False, True]:
+      query = db.query().fromTable('lineitem').where("L_QUANTITY < 40").select(
+                { 'orderkey' : ('L_ORDERKEY', 'int')
+                , 'revenue'  : ('L_EXTENDEDPRICE * (1 - L_DISCOUNT)', 'double')
+                , 'charge'   : ('L_EXTENDEDPRICE * (1 - L_DISCOUNT) * (1 + L_TAX)', 'double') }).where(
+                "revenue > 10000.0").finalize()
+
+      start   = time.time()
+      results = sum(len(list(page)) for (_, page) in db.processQuery(query, compiled=compiled))
+      end     = time.time()
+      print(("Compiled" if compiled else "Volcano ") + " pipeline results: " + str(results) \
+              + " Time (s): {:.3f}".format(end - start))
+
+  db.close()
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+
+
+# Times TPC-H Q6 with expression string aggregates, processing rows and NumPy column batches.
+def vectorizedQ6(datadir='test/datasets/tpch-tiny', scaleFactor=1.0, poolPages=8192, trials=3):
+  from Database                import Database
+  from Utils.WorkloadGenerator import WorkloadGenerator
+
+  pageSize = io.DEFAULT_BUFFER_SIZE
+  wg       = WorkloadGenerator()
+
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+  db = Database(dataDir=benchDataDir, pageSize=pageSize, poolSize=poolPages*pageSize)
+  db.createRelation('lineitem', wg.schemas['lineitem'].schema())
+  with open(os.path.join(datadir, 'lineitem.csv')) as f:
+    db.bulkLoad('lineitem', wg.packLines('lineitem', f, scaleFactor))
+
+  groupKeySchema = DBSchema('groupKey', [('ONE', 'int')])
+  groupAggSchema = DBSchema('groupBy', [('revenue', 'double')])
+  for i in range(trials):
+    for vectorized in [False, True]:
+      query = db.query().fromTable('lineitem').where(
+                "(L_SHIPDATE >= 19940101) and (L_SHIPDATE < 19950101) and "
+                "(0.06 - 0.01 <= L_DISCOUNT <= 0.06 + 0.01) and (L_QUANTITY < 24)").groupBy(
+                groupSchema=groupKeySchema,
+                aggSchema=groupAggSchema,
+                groupExpr=['1'],
+                aggExprs=[('sum', 'L_EXTENDEDPRICE * L_DISCOUNT')],
+                groupHashFn=(lambda gbVal: hash(gbVal) % 1)).select(
+                {'revenue' : ('revenue', 'double')}).finalize()
+
+      start   = time.time()
+      results = [query.schema().unpack(tup) for (_, page) in db.processQuery(query, vectorized=vectorized) for tup in page]
+      end     = time.time()
+      print(("Vectorized" if vectorized else "Row       ") + " Q6 results: " + str(results) \
+              + " Time (s): {:.3f}".format(end - start))
+
+  db.close()
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+
+
+# Times hash joins of two synthetic relations on unique keys, partitioned by
+# expressions into 8 partitions, and partitioned by the join for its memory.
+def hashJoin(numTuples=5000, poolPages=8192, trials=3):
+  from Database import Database
+
+  pageSize = io.DEFAULT_BUFFER_SIZE
+
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+  db = Database(dataDir=benchDataDir, pageSize=pageSize, poolSize=poolPages*pageSize)
+  db.createRelation('lhs', [('id', 'int'), ('a', 'int')])
+  db.createRelation('rhs', [('id2', 'int'), ('b', 'int')])
+  lhsSchema = db.relationSchema('lhs')
+  rhsSchema = db.relationSchema('rhs')
+  db.bulkLoad('lhs', (lhsSchema.pack(lhsSchema.instantiate(i, 2*i)) for i in range(numTuples)))
+  db.bulkLoad('rhs', (rhsSchema.pack(rhsSchema.instantiate(i, 3*i)) for i in random.sample(range(numTuples), numTuples)))
+
+  lhsKeySchema = DBSchema('lhsKey', [('id', 'int')])
+  rhsKeySchema = DBSchema('rhsKey', [('id2', 'int')])
+  partitionings = [ ('Partitioned by expressions', {'lhsHashFn': 'hash(id) % 8', 'rhsHashFn': 'hash(id2) % 8'})
+                  , ('Hybrid, in memory        ', {})
+                  , ('Hybrid, 4 memory pages   ', {'memoryPages': 4}) ]
+  for i in range(trials):
+    for (name, kwargs) in partitionings:
+      query = db.query().fromTable('lhs').join(
+                db.query().fromTable('rhs'),
+                method='hash', lhsKeySchema=lhsKeySchema, rhsKeySchema=rhsKeySchema, **kwargs).finalize()
+
+      start   = time.time()
+      results = sum(len(list(page)) for (_, page) in db.processQuery(query))
+      end     = time.time()
+      print(name + " hash join results: " + str(results) + " Time (s): {:.3f}".format(end - start))
+
+  db.close()
+  shutil.rmtree(benchDataDir, ignore_errors=True)
+
+
+benchmarks = { 'eviction'       : evictionLatency
+             , 'scanResistance' : scanResistance
+             , 'loadMemory'     : loadMemory
+             , 'poolStartup'    : poolStartup
+             , 'dirtyWrites'    : dirtyWrites
+             , 'readAheadScan'  : readAheadScan
+             , 'vectoredReads'  : vectoredReads
+             , 'mappedScan'     : mappedScan
+             , 'restartTime'    : restartTime
+             , 'bulkLoad'       : bulkLoad
+             , 'parallelLoad'   : parallelLoad
+             , 'varcharLayout'  : varcharLayout
+             , 'paxScan'        : paxScan
+             , 'zoneMapScan'    : zoneMapScan
+             , 'slotBitmap'     : slotBitmap
+             , 'batchDecode'    : batchDecode
+             , 'schemaCodecs'   : schemaCodecs
+             , 'binaryProjection' : binaryProjection
+             , 'tupleIdMemory'  : tupleIdMemory
+             , 'tpchQ6'         : tpchQ6
+             , 'compiledPipeline' : compiledPipeline
+             , 'vectorizedQ6'   : vectorizedQ6
+             , 'hashJoin'       : hashJoin }
+
+if __name__ == "__main__":
+  names = sys.argv[1:] if len(sys.argv) > 1 else sorted(benchmarks.keys())
+  for name in names:
+    print("Benchmark: " + name)
+    benchmarks[name]()
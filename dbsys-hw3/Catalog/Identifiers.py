@@ -1,10 +1,13 @@
 """
 Database internal object identifiers for files, pages, and tuples.
 
-All identifiers implement structural equality.
+All identifiers implement structural equality. Identifiers are immutable,
+and store their fields in slots rather than an instance dictionary. They hash
+and compare by an integer key packing their fields, and unpacked file and page
+identifiers are interned, so that identifiers read from indexes share objects.
 """
 
-import struct
+import functools, struct
 
 class FileId:
   """
@@ -18,8 +21,14 @@ class FileId:
   >>> id2 = FileId.unpack(id1.pack())
   >>> id1 == id2
   True
+
+  # Unpacked file identifiers are interned.
+  >>> id2 is FileId.unpack(id1.pack())
+  True
   """
 
+  __slots__ = ("fileIndex",)
+
   binrepr = struct.Struct("H") # represents unsigned short
   size    = binrepr.size
 
@@ -32,6 +41,9 @@ class FileId:
   def __hash__(self):
     return hash(self.fileIndex)
 
+  def key(self):
+    return self.fileIndex
+
   def pack(self):
     if self.fileIndex != None:
       return FileId.binrepr.pack(self.fileIndex)
@@ -39,6 +51,12 @@ class FileId:
   @classmethod
   def unpack(cls, buffer):
     fileIndex = FileId.binrepr.unpack_from(buffer)[0]
+    return cls.intern(fileIndex)
+
+  # Returns a shared file identifier for the given file index.
+  @classmethod
+  @functools.lru_cache(maxsize=None)
+  def intern(cls, fileIndex):
     return cls(fileIndex)
 
 
@@ -51,31 +69,48 @@ class PageId:
   >>> pId2 = PageId.unpack(pId1.pack())
   >>> pId1 == pId2
   True
+  >>> pId2 is PageId.unpack(pId1.pack()) and pId2.fileId is FileId.unpack(pId1.fileId.pack())
+  True
   """
 
+  __slots__ = ("fileId", "pageIndex")
+
   binrepr = struct.Struct("H")
   size    = FileId.binrepr.size + binrepr.size
 
+  # The packed representation of a page identifier's fields.
+  fieldsRepr = struct.Struct("HH")
+
+  # The maximum number of recently unpacked page identifiers to intern.
+  internSize = 1 << 16
+
   def __init__(self, fileId, pageIndex):
     self.fileId    = fileId
     self.pageIndex = pageIndex
 
   def __eq__(self, other):
-    return self.fileId == other.fileId and self.pageIndex == other.pageIndex
+    return self.pageIndex == other.pageIndex and self.fileId.fileIndex == other.fileId.fileIndex
 
   def __hash__(self):
-    return hash((self.fileId, self.pageIndex))
+    return hash(self.key())
+
+  # Returns an integer packing the file and page indexes.
+  def key(self):
+    return (self.fileId.fileIndex << 32) | self.pageIndex
 
   def pack(self):
     if self.fileId:
-      return self.fileId.pack() + PageId.binrepr.pack(self.pageIndex)
+      return PageId.fieldsRepr.pack(self.fileId.fileIndex, self.pageIndex)
 
   @classmethod
   def unpack(cls, buffer):
-    pageIdSize = PageId.binrepr.size
-    fileId     = FileId.unpack(buffer)
-    pageIndex  = PageId.binrepr.unpack_from(buffer, offset=FileId.size)[0]
-    return cls(fileId, pageIndex)
+    return cls.intern(*PageId.fieldsRepr.unpack_from(buffer))
+
+  # Returns a shared page identifier for the given file and page indexes.
+  @classmethod
+  @functools.lru_cache(maxsize=internSize)
+  def intern(cls, fileIndex, pageIndex):
+    return cls(FileId.intern(fileIndex), pageIndex)
 
 
 class TupleId:
@@ -93,31 +128,42 @@ class TupleId:
   >>> tId2 = TupleId.unpack(tId1.pack())
   >>> tId1 == tId2
   True
+  >>> len({tId1, tId2, TupleId(PageId(FileId(5), 101), 1000), TupleId(PageId(FileId(6), 100), 1000)})
+  3
   """
 
+  __slots__ = ("pageId", "tupleIndex")
+
   binrepr = struct.Struct("H")
   size    = PageId.size + binrepr.size
 
+  # The packed representation of a tuple identifier's fields.
+  fieldsRepr = struct.Struct("HHH")
+
   def __init__(self, pageId, tupleIndex):
     self.pageId     = pageId
     self.tupleIndex = tupleIndex
 
   def __eq__(self, other):
-    return self.pageId == other.pageId and self.tupleIndex == other.tupleIndex
+    return self.tupleIndex == other.tupleIndex \
+             and (self.pageId is other.pageId or self.pageId == other.pageId)
 
   def __hash__(self):
-    return hash((self.pageId, self.tupleIndex))
+    pageId = self.pageId
+    return hash((((pageId.fileId.fileIndex << 32) | pageId.pageIndex) << 32) | self.tupleIndex)
+
+  # Returns an integer packing the file, page and tuple indexes.
+  def key(self):
+    return (self.pageId.key() << 32) | self.tupleIndex
 
   def pack(self):
     if self.pageId:
-      return self.pageId.pack() + TupleId.binrepr.pack(self.tupleIndex)
+      return TupleId.fieldsRepr.pack(self.pageId.fileId.fileIndex, self.pageId.pageIndex, self.tupleIndex)
 
   @classmethod
   def unpack(cls, buffer):
-    tupleIdSize = TupleId.binrepr.size
-    pageId      = PageId.unpack(buffer)
-    tupleIndex  = TupleId.binrepr.unpack_from(buffer, offset=PageId.size)[0]
-    return cls(pageId,tupleIndex)
+    (fileIndex, pageIndex, tupleIndex) = TupleId.fieldsRepr.unpack_from(buffer)
+    return cls(PageId.intern(fileIndex, pageIndex), tupleIndex)
 
 
 if __name__ == "__main__":
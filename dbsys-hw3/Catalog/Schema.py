@@ -2,6 +2,11 @@ import json, re
 from collections import namedtuple, OrderedDict
 from struct import Struct
 
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
 class Types:
   """
   Utility functions for database types.
@@ -12,6 +17,9 @@ class Types:
 
   The list of supported types in the database is given by the keys
   of the 'types' dictionary.
+
+  Variable-length types (e.g., 'varchar(n)') are stored with their actual
+  length, up to the declared maximum, rather than padded to a fixed width.
   """
   types = {
       # name, pack_letter, needs_len, default_val, from_string
@@ -21,9 +29,19 @@ class Types:
       'float'   : ('f', False, 0.0, lambda x: float(x)),
       'double'  : ('d', False, 0.0, lambda x: float(x)),
       'char'    : ('s', True, chr(0), lambda x: x),
-      'text'    : ('s', True, chr(0), lambda x: x)
+      'text'    : ('s', True, chr(0), lambda x: x),
+      'varchar' : ('s', True, chr(0), lambda x: x)
     }
 
+  # Types whose values are stored with their actual length.
+  variableTypes = ['varchar']
+
+  # NumPy type codes for each struct format letter, as used in column batches.
+  batchTypes = {'B': 'u1', 'h': 'i2', 'i': 'i4', 'f': 'f4', 'd': 'f8', 's': 'S'}
+
+  # The length of a variable-length value is stored in the fixed-size part of a tuple, in this format.
+  lengthFormat = 'H'
+
   @classmethod
   def parseType(cls, typeDesc):
     typeMatcher = re.compile("(?P<typeStr>\w+)(\((?P<size>\d+)\))?(?P<rest>.*)")
@@ -44,6 +62,11 @@ class Types:
     >>> Types.formatType('char(100)')
     '100s'
 
+    Variable-length sequences are formatted with their maximum length.
+
+    >>> Types.formatType('varchar(100)')
+    '100s'
+
     Invalid type description examples.
 
     >>> Types.formatType('int(100)') == None
@@ -72,6 +95,18 @@ class Types:
 
     return format
 
+  # Returns whether the given type is stored with a variable length.
+  @classmethod
+  def isVariable(cls, typeDesc):
+    matches = Types.parseType(typeDesc)
+    return bool(matches) and matches.get("typeStr", None) in Types.variableTypes
+
+  # Returns the declared length of a sized type, e.g., 100 for 'varchar(100)'.
+  @classmethod
+  def typeSize(cls, typeDesc):
+    matches = Types.parseType(typeDesc)
+    size    = matches.get("size", None) if matches else None
+    return int(size) if size else None
 
   @classmethod
   def defaultValue(cls, typeDesc):
@@ -105,6 +140,11 @@ class Types:
     return default
 
 
+  # Returns whether values of the given type are character sequences.
+  @classmethod
+  def isText(cls, typeDesc):
+    return typeDesc.startswith(('char', 'text', 'varchar'))
+
   @classmethod
   def formatValue(cls, value, typeDesc, forSerialization=True):
     """
@@ -114,8 +154,7 @@ class Types:
     For now, this converts character sequences from Python strings
     into bytes for Python's struct module.
     """
-    prefixes = ['char', 'text']
-    if list(filter(typeDesc.startswith, prefixes)):
+    if cls.isText(typeDesc):
       if forSerialization:
         return value.encode() if isinstance(value, str) else value
       else:
@@ -136,7 +175,7 @@ class Types:
       rest    = matches.get("rest", None)
       if not rest and typeStr:
         (_, requiresSize, val, conv_lambda) = Types.types.get(typeStr, (None, None, None, None))
-        if requiresSize:
+        if requiresSize and typeStr not in Types.variableTypes:
           if size:
             rem_length = int(size) - len(string)
             string = string + val * rem_length
@@ -197,8 +236,48 @@ class DBSchema:
   >>> projectedSchema.unpack(schema.projectBinary(schema.pack(e1), projectedSchema))
   employeeId(id=1)
 
+  # Binary projections copy fields by offset, matching a projection of the unpacked tuple.
+  >>> keySchema = DBSchema('employeeKey', [('salary', 'int'), ('dob', 'char(10)'), ('id', 'int')])
+  >>> keySchema.unpack(schema.projectBinary(schema.pack(e1), keySchema))
+  employeeKey(salary=100000, dob='1990-01-01', id=1)
+  >>> schema.projectBinary(schema.pack(e1), keySchema) == keySchema.pack(schema.project(e1, keySchema))
+  True
+
   >>> schema.match(DBSchema('employee2', [('id', 'int'), ('dob', 'char(10)'), ('salary', 'int')]))
   True
+
+  >>> schema.fieldLayout()
+  [(0, 4), (4, 10), (16, 4)]
+
+  # Batch unpacking of consecutive packed tuples, optionally selecting some of them.
+  >>> data = b''.join(schema.pack(schema.instantiate(i, '1990-01-0' + str(i), 1000 * i)) for i in range(3))
+  >>> schema.unpackAll(data) == [schema.unpack(data[i*schema.size:(i+1)*schema.size]) for i in range(3)]
+  True
+  >>> schema.unpackAll(data, [2])
+  [employee(id=2, dob='1990-01-02', salary=2000)]
+
+  # Column batches, as NumPy structured arrays sharing the layout of packed tuples.
+  >>> np is None or schema.unpackBatch(data)['salary'].tolist() == [0, 1000, 2000]
+  True
+  >>> np is None or schema.unpackBatch(data, [2]).tobytes() == data[2*schema.size:]
+  True
+
+  Schemas with variable-length fields pack each such field as a length in the
+  fixed-size part of the tuple, followed by the field data at the end of the tuple.
+  Their 'size' is the maximum size of a tuple.
+
+  >>> vschema = DBSchema('employee', [('id', 'int'), ('name', 'varchar(10)'), ('salary', 'int')])
+  >>> vschema.variable, vschema.fixedSize, vschema.size
+  (True, 12, 22)
+
+  >>> vschema.pack(vschema.instantiate(1, 'Jo', 100000))
+  b'\\x01\\x00\\x00\\x00\\x02\\x00\\x00\\x00\\xa0\\x86\\x01\\x00Jo'
+  >>> vschema.unpack(vschema.pack(vschema.instantiate(1, 'Jo', 100000)))
+  employee(id=1, name='Jo', salary=100000)
+
+  # Values longer than the declared length are truncated, as with fixed-length fields.
+  >>> len(vschema.pack(vschema.instantiate(1, 'Jo' * 10, 100000))) == vschema.size
+  True
   """
 
   def __init__(self, name, fieldsAndTypes):
@@ -207,8 +286,17 @@ class DBSchema:
       self.fields  = [x[0] for x in fieldsAndTypes]
       self.types   = [x[1] for x in fieldsAndTypes]
       self.clazz   = namedtuple(self.name, self.fields)
-      self.binrepr = Struct(''.join([Types.formatType(x) for x in self.types]))
-      self.size    = self.binrepr.size
+      self.varFields  = [i for (i, x) in enumerate(self.types) if Types.isVariable(x)]
+      self.varLengths = [Types.typeSize(self.types[i]) for i in self.varFields]
+      self.variable   = bool(self.varFields)
+      self.textFields = [i for (i, x) in enumerate(self.types) if Types.isText(x)]
+      self.formats    = [Types.lengthFormat if Types.isVariable(x) else Types.formatType(x) for x in self.types]
+      self.binrepr    = Struct(''.join(self.formats))
+      self.fixedSize  = self.binrepr.size
+      self.size       = self.fixedSize + sum(self.varLengths)
+      self.projections = {}
+      self.batchDtype  = None
+      self.compileCodecs()
     else:
       raise ValueError("Invalid attributes when constructing a schema")
 
@@ -254,6 +342,15 @@ class DBSchema:
     return list(zip(self.fields, self.types)) \
               == list(zip(other.fields, other.types))
 
+  # Returns the (offset, size) of each field in the fixed-size part of a packed tuple,
+  # including any alignment padding preceding the field.
+  def fieldLayout(self):
+    layout = []
+    for i in range(len(self.formats)):
+      size = Struct(self.formats[i]).size
+      layout.append((Struct(''.join(self.formats[:i+1])).size - size, size))
+    return layout
+
   # Project a tuple to the given schema
   def project(self, instance, schema):
     fields = []
@@ -265,23 +362,146 @@ class DBSchema:
     return schema.instantiate(*fields)
 
   # Project a packed tuple to a binary representation of the given schema.
-  # TODO: make this more efficient by direct field access and copying.
+  # Projection functions are built once per target schema, and cached.
   def projectBinary(self, binaryInstance, schema):
-    return schema.pack(self.project(self.unpack(binaryInstance), schema))
+    key = (tuple(schema.fields), tuple(schema.types))
+    projection = self.projections.get(key, None)
+    if projection is None:
+      projection = self.projections[key] = self.compileProjection(schema)
+    return projection(binaryInstance)
+
+  # Builds a function projecting packed tuples of this schema to packed tuples of the given schema.
+  # For fixed-size schemas whose projected fields keep their types, this concatenates the fields'
+  # byte ranges along with any alignment padding of the given schema. Character fields have their
+  # trailing padding normalized, as when unpacking and repacking them.
+  # Other projections unpack, project and repack the tuple.
+  def compileProjection(self, schema):
+    for f in schema.fields:
+      if f not in self.fields:
+        raise ValueError("Invalid field in projection: "+f)
+
+    sources = [self.fields.index(f) for f in schema.fields]
+    if self.variable or schema.variable or any(self.types[i] != t for (i, t) in zip(sources, schema.types)):
+      return lambda binaryInstance: schema.pack(self.project(self.unpack(binaryInstance), schema))
+
+    layout   = self.fieldLayout()
+    parts    = []
+    position = 0
+    for (i, (offset, size)) in zip(sources, schema.fieldLayout()):
+      if offset > position:
+        parts.append(repr(bytes(offset - position)))
+      start = layout[i][0]
+      if i in self.textFields:
+        parts.append("bytes(v[{0}:{1}]).rstrip(strip).ljust({2}, pad)".format(start, start + size, size))
+      else:
+        parts.append("v[{0}:{1}]".format(start, start + size))
+      position = offset + size
+
+    source = "def projection(b):\n" \
+             + "  v = memoryview(b)\n" \
+             + "  return b''.join([{0}])\n".format(', '.join(parts))
+
+    codecs = {'strip': b"\x00 \n", 'pad': b"\x00"}
+    exec(source, codecs)
+    return codecs['projection']
+
+  # Builds the schema's pack and instantiation functions, specialized to its fields.
+  # Character fields are converted by column index, as with Types.formatValue,
+  # rather than inspecting each field's type for every value.
+  def compileCodecs(self):
+    columns = range(len(self.fields))
+    encoded = ', '.join(('(v[{0}].encode() if isinstance(v[{0}], str) else v[{0}])' if i in self.textFields \
+                           else 'v[{0}]').format(i) for i in columns)
+    decoded = ', '.join(('v[{0}].decode().rstrip(strip)' if i in self.textFields \
+                           else 'v[{0}]').format(i) for i in columns)
+
+    source = "def packInstance(v):\n" \
+             + ("  return packVariable([{0}])\n" if self.variable else "  return pack({0})\n").format(encoded) \
+             + "def instantiateRow(v):\n" \
+             + "  return make(({0},))\n".format(decoded)
+
+    codecs = {'make': self.clazz._make, 'pack': self.binrepr.pack, 'packVariable': self.packVariable, 'strip': "\x00 \n"}
+    exec(source, codecs)
+    self.packInstance   = codecs['packInstance']
+    self.instantiateRow = codecs['instantiateRow']
 
   # Return a binary representation of the instance
   def pack(self, instance):
     if self.binrepr:
-      values = [Types.formatValue(instance[i], self.types[i])
-                  for i in range(len(instance))]
-      return self.binrepr.pack(*values)
+      return self.packInstance(instance)
 
   def unpack(self, buffer):
-    if self.clazz and self.binrepr:
-      x = self.binrepr.unpack(buffer)
-      values = [Types.formatValue(v, self.types[i], False)
-                  for i, v in enumerate(self.binrepr.unpack(buffer))]
-      return self.clazz._make(values)
+    if self.clazz and self.binrepr and self.variable:
+      return self.instantiateRow(self.unpackVariable(buffer))
+    elif self.clazz and self.binrepr:
+      return self.instantiateRow(self.binrepr.unpack(buffer))
+
+  # Returns schema instances for rows of field values, as unpacked by the schema's struct.
+  def instantiateAll(self, rows):
+    return list(map(self.instantiateRow if self.textFields else self.clazz._make, rows))
+
+  # Unpacks a buffer of consecutive packed tuples with a single pass over the buffer,
+  # returning the instances of the tuples at the given indexes, or of all tuples.
+  # This requires a schema with fixed-size fields.
+  def unpackAll(self, buffer, indexes=None):
+    if self.variable:
+      raise ValueError("Batch unpacking requires a schema with fixed-size fields")
+
+    end  = len(buffer) - (len(buffer) % self.size)
+    rows = list(self.binrepr.iter_unpack(buffer[:end]))
+    return self.instantiateAll(rows if indexes is None else [rows[i] for i in indexes])
+
+  # Returns a NumPy structured type matching the layout of packed tuples,
+  # for column batches of schemas with fixed-size fields.
+  def batchType(self):
+    if self.batchDtype is None:
+      if np is None:
+        raise ValueError("Column batches require NumPy")
+      if self.variable:
+        raise ValueError("Column batches require a schema with fixed-size fields")
+
+      formats = [Types.batchTypes[fmt[-1]] + fmt[:-1] for fmt in self.formats]
+      offsets = [offset for (offset, _) in self.fieldLayout()]
+      self.batchDtype = np.dtype({'names': self.fields, 'formats': formats, 'offsets': offsets, 'itemsize': self.size})
+    return self.batchDtype
+
+  # Returns a column batch of the tuples at the given indexes, or of all tuples,
+  # in a buffer of consecutive packed tuples. The batch does not share the buffer's memory.
+  # Tuples are selected as whole records, since NumPy does not copy the padding
+  # between the fields of a structured array when indexing it.
+  def unpackBatch(self, buffer, indexes=None):
+    records = np.frombuffer(buffer, dtype=np.dtype((np.void, self.size)), count=len(buffer) // self.size)
+    return (records.copy() if indexes is None else records[list(indexes)]).view(self.batchType())
+
+  # Returns a column batch from buffers of the packed values of each field,
+  # for the given number of tuples, selecting the tuples at the given indexes if any.
+  def unpackColumnBatch(self, columns, count, indexes=None):
+    batch = np.zeros(count if indexes is None else len(indexes), dtype=self.batchType())
+    for (field, column) in zip(self.fields, columns):
+      values = np.frombuffer(column, dtype=batch.dtype.fields[field][0], count=count)
+      batch[field] = values if indexes is None else values[list(indexes)]
+    return batch
+
+  # Packs formatted values with variable-length fields, replacing each such field
+  # by its length, and appending the field data after the fixed-size values.
+  def packVariable(self, values):
+    varData = []
+    for (i, maxLength) in zip(self.varFields, self.varLengths):
+      data = values[i][:maxLength]
+      varData.append(data)
+      values[i] = len(data)
+    return self.binrepr.pack(*values) + b''.join(varData)
+
+  # Returns the field values of a packed tuple with variable-length fields,
+  # with the data of each variable-length field in place of its length.
+  def unpackVariable(self, buffer):
+    values = list(self.binrepr.unpack_from(buffer))
+    offset = self.fixedSize
+    for i in self.varFields:
+      length    = values[i]
+      values[i] = bytes(buffer[offset:offset+length])
+      offset   += length
+    return values
 
   def packSchema(self):
     return json.dumps(self, cls=DBSchemaEncoder).encode()
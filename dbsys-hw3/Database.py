@@ -27,7 +27,7 @@ class Database:
 
     else:
       storageArgs = {k:v for (k,v) in kwargs.items() \
-                      if k in ["pageSize", "poolSize", "dataDir", "indexDir"]}
+                      if k in ["pageSize", "poolSize", "replacementPolicy", "backgroundWriter", "writerInterval", "readAhead", "dataDir", "indexDir"]}
 
       self.relationMap     = kwargs.get("relations", {})
       self.defaultPageSize = kwargs.get("pageSize", io.DEFAULT_BUFFER_SIZE)
@@ -83,11 +83,14 @@ class Database:
       return self.relationMap[relationName]
 
   # DDL statements
-  def createRelation(self, relationName, relationFields):
+  # Creates a relation. Relations created with 'mapped=True' are read through a memory mapping.
+  # A page class (e.g., Storage.PaxPage.PaxPage) may be given to choose the relation's page layout.
+  # Relations created with 'zoneMaps=True' let selections skip pages by their numeric column ranges.
+  def createRelation(self, relationName, relationFields, mapped=False, pageClass=None, zoneMaps=False):
     if relationName not in self.relationMap:
       schema = DBSchema(relationName, relationFields)
       self.relationMap[relationName] = schema
-      self.storage.createRelation(relationName, schema)
+      self.storage.createRelation(relationName, schema, mapped, pageClass, zoneMaps)
       self.checkpoint()
     else:
       raise ValueError("Relation '" + relationName + "' already exists")
@@ -109,6 +112,22 @@ class Database:
     else:
       raise ValueError("Unknown relation '" + relationName + "' while inserting a tuple")
 
+  # Appends rows of packed tuple data to a relation in full pages, bypassing the buffer pool.
+  # Returns the tuple ids of the loaded rows.
+  def bulkLoad(self, relationName, rows):
+    if relationName in self.relationMap:
+      return self.storage.bulkLoad(relationName, rows)
+    else:
+      raise ValueError("Unknown relation '" + relationName + "' while bulk loading tuples")
+
+  # Appends pages packed with StorageFile.packPages to a relation, returning their tuple ids.
+  # This allows pages to be packed in parallel, and written by a single process.
+  def appendPages(self, relationName, pages):
+    if relationName in self.relationMap:
+      return self.storage.appendPages(relationName, pages)
+    else:
+      raise ValueError("Unknown relation '" + relationName + "' while appending pages")
+
   def deleteTuple(self, tupleId):
     self.storage.deleteTuple(tupleId)
 
@@ -122,7 +141,13 @@ class Database:
     return PlanBuilder(db=self)
 
   # Returns an iterable for query results, after initializing the given plan.
-  def processQuery(self, queryPlan):
+  # Compiled processing fuses chains of selections and projections into pipelines,
+  # and vectorized processing passes NumPy column batches between operators where possible.
+  def processQuery(self, queryPlan, compiled=False, vectorized=False):
+    queryPlan.removePipelines()
+    queryPlan.vectorize(vectorized)
+    if compiled:
+      queryPlan.compilePipelines()
     return queryPlan.prepare(self)
 
   # Returns an optimized version of the given query plan.
@@ -235,8 +235,8 @@ class GreedyOptimizer(Optimizer):
             lhsPlan = left,
             rhsPlan = right,
             method = 'hash',
-            lhsHashFn= 'hash(' + key1 + ') % 4', lhsKeySchema=keySchema,
-            rhsHashFn= 'hash(' + key2 + ') % 4', rhsKeySchema=keySchema2
+            lhsKeySchema=keySchema,
+            rhsKeySchema=keySchema2
           ))
         else:
           testPlan = Plan(root = Join(
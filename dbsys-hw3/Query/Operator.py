@@ -1,4 +1,13 @@
 
+import ast, sys
+
+from Catalog.Schema import Types
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
 class Operator:
   """
   An abstract base class for all operator implementations.
@@ -8,6 +17,14 @@ class Operator:
 
   opCount = 0
 
+  # Compiled expression functions, cached by operator module, expressions and input schema fields.
+  compiledExprs = {}
+
+  # Python operators with the same meaning over NumPy arrays, for vectorized expressions.
+  batchOps = { ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/', ast.FloorDiv: '//', ast.Mod: '%'
+             , ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=', ast.Eq: '==', ast.NotEq: '!='
+             , ast.USub: '-', ast.UAdd: '+' }
+
   def __init__(self, **kwargs):
     self.opId = Operator.opCount
     Operator.opCount += 1
@@ -15,6 +32,7 @@ class Operator:
     self.sampled      = kwargs.get("sampled", False)
     self.sampleFactor = kwargs.get("sampleFactor", 1.0)
     self.tupleCost    = kwargs.get("tupleCost", 1.0)
+    self.vectorized   = False
     self.initializeStatistics()
 
   def initializeStatistics(self):
@@ -87,6 +105,12 @@ class Operator:
     if self.tempFile is None:
       self.initializeOutput()
 
+    # Output pages are not pinned, so the current page is read again once evicted
+    # rather than updating a page whose frame may now hold another page.
+    if self.outputPages and not self.storage.bufferPool.hasPage(self.outputPages[-1][0]):
+      outputPageId = self.outputPages[-1][0]
+      self.outputPages[-1] = (outputPageId, self.storage.bufferPool.getPage(outputPageId))
+
     allocatePage = not(self.outputPages and self.outputPages[-1][1].header.hasFreeTuple())
     if allocatePage:
       # Flush the most recently updated output page, which updates the storage file's
@@ -130,6 +154,34 @@ class Operator:
   def processAllPages(self):
     raise NotImplementedError
 
+  # Vectorized processing methods.
+
+  # Returns whether this operator can process column batches, given that
+  # Plan.vectorize has already considered its inputs.
+  def vectorizable(self):
+    return False
+
+  # Returns an iterator over this operator's output as column batches, i.e.,
+  # NumPy structured arrays of the schema's batch type.
+  def batches(self):
+    raise NotImplementedError
+
+  # Set-at-a-time processing of this operator's column batches,
+  # storing their tuples in the output relation for row-format consumers.
+  def processAllBatches(self):
+    size = self.schema().size
+    for batch in self.batches():
+      data = batch.tobytes()
+      for offset in range(0, len(data), size):
+        self.emitOutputTuple(data[offset:offset+size])
+
+      # No need to track anything but the last output page when in batch mode.
+      if self.outputPages:
+        self.outputPages = [self.outputPages[-1]]
+
+    # Return an iterator to the output relation
+    return self.storage.pages(self.relationId())
+
   # Expression evaluation methods.
 
   # Loads (i.e., binds) all the fields in the given schema and tuple
@@ -143,6 +195,171 @@ class Operator:
       schemaLocals[k] = v
     return schemaLocals
 
+  # Compiles expressions into a function taking a decoded instance of each given
+  # input schema by position, and returning the value of a single expression string,
+  # or a tuple of values for a list of expressions.
+  # Expressions are compiled once, binding only the fields they refer to as local
+  # variables, with any later schema's fields shadowing those of earlier schemas
+  # as with loadSchema. Other names resolve in the operator's module, as with eval.
+  def compileExpr(self, exprs, *schemas):
+    module = type(self).__module__
+    key    = (module, exprs if isinstance(exprs, str) else tuple(exprs), tuple(tuple(s.fields) for s in schemas))
+    if key not in Operator.compiledExprs:
+      exprList = [exprs] if isinstance(exprs, str) else list(exprs)
+      names    = set(node.id for e in exprList for node in ast.walk(ast.parse(e, mode='eval')) \
+                               if isinstance(node, ast.Name))
+
+      bindings = {}
+      for (i, schema) in enumerate(schemas):
+        for (j, field) in enumerate(schema.fields):
+          if field in names:
+            bindings[field] = "r{0}[{1}]".format(i, j)
+
+      result = "(" + exprList[0] + ")" if isinstance(exprs, str) \
+                 else "(" + "".join("(" + e + "), " for e in exprList) + ")"
+      source = "def expression(" + ", ".join("r" + str(i) for i in range(len(schemas))) + "):\n" \
+               + "".join("  {0} = {1}\n".format(field, value) for (field, value) in bindings.items()) \
+               + "  return " + result + "\n"
+
+      env = dict(sys.modules[module].__dict__)
+      exec(source, env)
+      Operator.compiledExprs[key] = env['expression']
+    return Operator.compiledExprs[key]
+
+  # Returns the fields of a schema referred to by expressions, so that pages storing fields
+  # separately may decode only these fields.
+  def referencedFields(self, exprs, schema):
+    exprList = [exprs] if isinstance(exprs, str) else list(exprs)
+    names    = set(node.id for e in exprList for node in ast.walk(ast.parse(e, mode='eval')) \
+                             if isinstance(node, ast.Name))
+    return set(f for f in schema.fields if f in names)
+
+  # Compiles expressions into a function over a column batch of the given schema, as
+  # with compileExpr, returning an array of values for each expression broadcast to the batch.
+  # Expressions may only use arithmetic, comparisons and boolean connectives over numeric
+  # fields and constants. Other expressions raise a ValueError, and are evaluated on rows instead.
+  # Fields are widened to 64-bit integers and doubles before evaluation, as when decoded into
+  # Python values, and floating point errors raise a FloatingPointError rather than a warning.
+  def compileBatchExpr(self, exprs, schema):
+    key = ("batch", exprs if isinstance(exprs, str) else tuple(exprs), tuple(schema.fields), tuple(schema.types))
+    if key not in Operator.compiledExprs:
+      if np is None:
+        raise ValueError("Vectorized expressions require NumPy")
+
+      fields   = set(f for (f, t) in zip(schema.fields, schema.types) if not Types.isText(t))
+      exprList = [exprs] if isinstance(exprs, str) else list(exprs)
+      parsed   = [ast.parse(e, mode='eval') for e in exprList]
+      arrays   = ["_np.broadcast_to(" + self.batchSource(p.body, fields) + ", _batch.shape)" for p in parsed]
+      names    = set(node.id for p in parsed for node in ast.walk(p) if isinstance(node, ast.Name))
+
+      bindings = {}
+      for (field, (fieldType, _)) in schema.batchType().fields.items():
+        if field in names:
+          bindings[field] = "_batch[{0}].astype(_np.{1})".format(repr(field), \
+                              "float64" if fieldType.kind == 'f' else "int64")
+
+      result = arrays[0] if isinstance(exprs, str) else "(" + "".join(a + ", " for a in arrays) + ")"
+      source = "def expression(_batch):\n" \
+               + "".join("  {0} = {1}\n".format(field, value) for (field, value) in bindings.items()) \
+               + "  with _np.errstate(divide='raise', over='raise', invalid='raise'):\n" \
+               + "    return " + result + "\n"
+
+      env = {'_np': np}
+      exec(source, env)
+      Operator.compiledExprs[key] = env['expression']
+    return Operator.compiledExprs[key]
+
+  # Evaluates expressions over a column batch of the given schema, as compiled by compileBatchExpr.
+  # Batches raising a floating point error are instead evaluated on each of their rows, with
+  # the same results or errors as row processing (e.g., a ZeroDivisionError).
+  def evalBatch(self, exprs, schema, batch):
+    try:
+      return self.compileBatchExpr(exprs, schema)(batch)
+    except FloatingPointError:
+      rowFn  = self.compileExpr(exprs, schema)
+      values = [rowFn(row) for row in self.batchRows(batch, schema)]
+      if isinstance(exprs, str):
+        return np.array(values)
+      return tuple(np.array([v[i] for v in values]) for i in range(len(exprs)))
+
+  # Returns the decoded tuples of a column batch of the given schema.
+  def batchRows(self, batch, schema):
+    data = batch.tobytes()
+    return [schema.unpack(data[offset:offset+schema.size]) for offset in range(0, len(data), schema.size)]
+
+  # Returns a column batch of the given schema from an array of values for each of its fields.
+  # Values are cast to the batch's column types when they are stored unchanged, as when packing
+  # rows. Otherwise, the batch is packed row by row, raising the same errors as row processing.
+  def packBatch(self, schema, arrays, count):
+    output = np.zeros(count, dtype=schema.batchType())
+    try:
+      for (field, values) in zip(schema.fields, arrays):
+        output[field] = self.castColumn(values, output.dtype.fields[field][0])
+      return output
+    except ValueError:
+      rows = zip(*(np.broadcast_to(values, (count,)).tolist() for values in arrays))
+      return schema.unpackBatch(b''.join(schema.pack(row) for row in rows))
+
+  # Casts an array of values to a column type, raising a ValueError for integers out of
+  # the type's range, floats overflowing it, or values of any other kind.
+  def castColumn(self, values, columnType):
+    if columnType.kind in 'iu' and values.dtype.kind in 'biu':
+      info = np.iinfo(columnType)
+      if values.size == 0 or (values.min() >= info.min and values.max() <= info.max):
+        return values.astype(columnType)
+
+    elif columnType.kind == 'f' and values.dtype.kind in 'biuf':
+      with np.errstate(over='ignore'):
+        wide = values.astype(np.float64)
+        cast = wide.astype(columnType)
+      if not np.any(np.isinf(cast) & np.isfinite(wide)):
+        return cast
+
+    raise ValueError("Unable to store values of type " + str(values.dtype) + " as " + str(columnType))
+
+  # Returns the source of a vectorized expression for a parsed expression over the given fields.
+  def batchSource(self, node, fields):
+    if isinstance(node, ast.Name) and node.id in fields:
+      return node.id
+
+    elif isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+      return repr(node.value)
+
+    elif isinstance(node, ast.BinOp) and type(node.op) in Operator.batchOps:
+      return "(" + self.batchSource(node.left, fields) + " " + Operator.batchOps[type(node.op)] \
+               + " " + self.batchSource(node.right, fields) + ")"
+
+    elif isinstance(node, ast.UnaryOp) and type(node.op) in Operator.batchOps:
+      return "(" + Operator.batchOps[type(node.op)] + self.batchSource(node.operand, fields) + ")"
+
+    # Boolean connectives only apply to conditions, where they match elementwise logical operations.
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not) and self.isCondition(node.operand):
+      return "_np.logical_not(" + self.batchSource(node.operand, fields) + ")"
+
+    elif isinstance(node, ast.BoolOp) and all(self.isCondition(v) for v in node.values):
+      function = "_np.logical_and(" if isinstance(node.op, ast.And) else "_np.logical_or("
+      values   = [self.batchSource(v, fields) for v in node.values]
+      result   = values[-1]
+      for value in reversed(values[:-1]):
+        result = function + value + ", " + result + ")"
+      return result
+
+    # Chained comparisons hold when every adjacent comparison holds.
+    elif isinstance(node, ast.Compare) and all(type(op) in Operator.batchOps for op in node.ops):
+      operands = [self.batchSource(n, fields) for n in [node.left] + node.comparators]
+      result   = None
+      for (op, lhs, rhs) in zip(node.ops, operands, operands[1:]):
+        comparison = "(" + lhs + " " + Operator.batchOps[type(op)] + " " + rhs + ")"
+        result = comparison if result is None else "_np.logical_and(" + result + ", " + comparison + ")"
+      return result
+
+    raise ValueError("Unable to vectorize expression: " + ast.dump(node))
+
+  # Returns whether a parsed expression is a boolean condition.
+  def isCondition(self, node):
+    return isinstance(node, (ast.Compare, ast.BoolOp)) \
+             or (isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not))
+
   # Plan and statistics information
 
   # Returns a single line description of the operator.
@@ -1,7 +1,33 @@
 from Catalog.Schema import DBSchema
-from Query.Operator import Operator
+from Query.Operator import Operator, np
 
 class GroupBy(Operator):
+  """
+  A group-by-aggregate operator implementation.
+
+  Groups are computed by a group expression, and aggregates by a list of
+  (initial value, increment function, finalize function) triples. For example:
+    groupExpr=(lambda e: e.id),
+    aggExprs=[(0, lambda acc, e: acc + e.salary, lambda x: x)]
+
+  Alternatively, the group expression may be a list of expression strings, one
+  per group field, and aggregates may be (aggregate name, expression string) pairs,
+  with the aggregates named in 'aggregates'. For example:
+    groupExpr=['id'],
+    aggExprs=[('sum', 'salary')]
+
+  Group-bys with expression strings may also be vectorized.
+  """
+
+  # Initial value, increment and finalize functions for named aggregates, given a compiled expression.
+  aggregates = {
+      'sum'   : lambda f: (0,      lambda acc, e: acc + f(e), lambda x: x)
+    , 'count' : lambda f: (0,      lambda acc, e: acc + 1,    lambda x: x)
+    , 'min'   : lambda f: (None,   lambda acc, e: f(e) if acc is None else min(acc, f(e)), lambda x: x)
+    , 'max'   : lambda f: (None,   lambda acc, e: f(e) if acc is None else max(acc, f(e)), lambda x: x)
+    , 'avg'   : lambda f: ((0, 0), lambda acc, e: (acc[0] + f(e), acc[1] + 1), lambda x: x[0] / x[1])
+    }
+
   def __init__(self, subPlan, **kwargs):
     super().__init__(**kwargs)
 
@@ -35,6 +61,18 @@ class GroupBy(Operator):
     if len(self.aggExprs) != len(self.aggSchema.fields):
       raise ValueError("Invalid aggregate fields: schema mismatch")
 
+    if any(self.namedAggregate(aggExpr) and aggExpr[0] not in GroupBy.aggregates for aggExpr in self.aggExprs):
+      raise ValueError("Invalid aggregate: unknown aggregate name")
+
+  # Returns whether an aggregate is given as an (aggregate name, expression string) pair.
+  def namedAggregate(self, aggExpr):
+    return len(aggExpr) == 2 and isinstance(aggExpr[0], str)
+
+  # Returns whether the group expression and aggregates are given as expression strings.
+  def declarative(self):
+    return isinstance(self.groupExpr, (list, tuple)) and all(isinstance(e, str) for e in self.groupExpr) \
+             and all(self.namedAggregate(aggExpr) for aggExpr in self.aggExprs)
+
   # Initializes the group-by's schema as a concatenation of the group-by
   # fields and all aggregate fields.
   def initializeSchema(self):
@@ -58,11 +96,33 @@ class GroupBy(Operator):
   def inputs(self):
     return [self.subPlan]
 
+  # Compiles any expression strings into the functions used for row-at-a-time processing.
+  def prepare(self, database):
+    super().prepare(database)
+    if isinstance(self.groupExpr, (list, tuple)):
+      self.groupFn = self.compileExpr(self.groupExpr, self.subSchema)
+    else:
+      self.groupFn = self.groupExpr
+
+    self.aggFns = [GroupBy.aggregates[aggExpr[0]](self.compileExpr(aggExpr[1], self.subSchema)) \
+                     if self.namedAggregate(aggExpr) else aggExpr for aggExpr in self.aggExprs]
+
+  # Group-bys with expression strings are vectorized when all of their expressions can be.
+  def vectorizable(self):
+    if not self.declarative():
+      return False
+    try:
+      self.compileBatchExpr(self.groupExpr, self.subSchema)
+      self.compileBatchExpr([e for (_, e) in self.aggExprs], self.subSchema)
+      return self.subPlan.vectorized and self.outputSchema.batchType() is not None
+    except ValueError:
+      return False
+
   # Iterator abstraction for selection operator.
   def __iter__(self):
     self.initializeOutput()
     self.partitionFiles = {}
-    self.outputIterator = self.processAllPages()
+    self.outputIterator = self.processAllBatches() if self.vectorized else self.processAllPages()
     return self
 
   def __next__(self):
@@ -81,20 +141,20 @@ class GroupBy(Operator):
       return x
 
   def initialExprs(self):
-    return [i[0] for i in self.aggExprs]
+    return [i[0] for i in self.aggFns]
 
   def incrExprs(self):
-    return [i[1] for i in self.aggExprs]
+    return [i[1] for i in self.aggFns]
 
   def finalizeExprs(self):
-    return [i[2] for i in self.aggExprs]
+    return [i[2] for i in self.aggFns]
 
   # Set-at-a-time operator processing
   def processAllPages(self):
     # Create partitions of the input records by hashing the group-by values
     for (pageId, page) in self.subPlan:
-      for tup in page:
-        groupVal = self.ensureTuple(self.groupExpr(self.subSchema.unpack(tup)))
+      for (tup, namedTup) in zip(page.iterRows(), page.decodeAll(self.subSchema)):
+        groupVal = self.ensureTuple(self.groupFn(namedTup))
         groupId = self.groupHashFn(groupVal)
         self.emitPartitionTuple(groupId, tup)
 
@@ -105,10 +165,9 @@ class GroupBy(Operator):
       # Use an in-memory Python dict to accumulate the aggregates.
       aggregates = {}
       for (pageId, page) in partFile.pages():
-        for tup in page:
+        for namedTup in page.decodeAll(self.subSchema):
           # Evaluate group-by value.
-          namedTup = self.subSchema.unpack(tup)
-          groupVal = self.ensureTuple(self.groupExpr(namedTup))
+          groupVal = self.ensureTuple(self.groupFn(namedTup))
 
           # Look up the aggregate for the group.
           if groupVal not in aggregates:
@@ -136,6 +195,50 @@ class GroupBy(Operator):
     # Return an iterator for the output file.
     return self.storage.pages(self.relationId())
 
+  # Batch-at-a-time operator processing. This sorts the group values of all input batches
+  # to find the groups, and reduces each aggregate's values over the sorted groups.
+  # Groups are found from the evaluated group values, as with rows, before storing them
+  # in the output schema's types.
+  def batches(self):
+    aggExprs = [e for (_, e) in self.aggExprs]
+    keys     = []
+    values   = []
+    for batch in self.subPlan.batches():
+      if len(batch):
+        keys.append(self.evalBatch(self.groupExpr, self.subSchema, batch))
+        values.append(self.evalBatch(aggExprs, self.subSchema, batch))
+
+    if keys:
+      columns = [np.concatenate(groupValues) for groupValues in zip(*keys)]
+      key     = np.zeros(len(columns[0]), dtype=[(f, c.dtype) for (f, c) in zip(self.groupSchema.fields, columns)])
+      for (field, column) in zip(self.groupSchema.fields, columns):
+        key[field] = column
+
+      (groups, inverse) = np.unique(key, return_inverse=True)
+      order  = np.argsort(inverse.ravel(), kind='stable')
+      starts = np.searchsorted(inverse.ravel()[order], np.arange(len(groups)))
+      counts = np.diff(np.append(starts, len(order)))
+
+      arrays = [groups[field] for field in self.groupSchema.fields] \
+                 + [self.reduceBatch(name, np.concatenate(aggValues)[order], starts, counts) \
+                      for ((name, _), aggValues) in zip(self.aggExprs, zip(*values))]
+      yield self.packBatch(self.outputSchema, arrays, len(groups))
+
+  # Reduces the values of a named aggregate, sorted by group, for groups starting at the given offsets.
+  def reduceBatch(self, name, values, starts, counts):
+    if name == 'count':
+      return counts
+    elif name == 'min':
+      return np.minimum.reduceat(values, starts)
+    elif name == 'max':
+      return np.maximum.reduceat(values, starts)
+
+    # Sum integers and booleans with 64 bits, as Python integers would not overflow.
+    if values.dtype.kind in 'biu':
+      values = values.astype(np.int64)
+    sums = np.add.reduceat(values, starts)
+    return sums if name == 'sum' else sums / counts
+
   # Bucket construction helpers.
   def partitionRelationId(self, partitionId):
     return self.operatorType() + str(self.id()) + "_" \
@@ -1,9 +1,22 @@
 import itertools
 import math
+import sys
 from Catalog.Schema import DBSchema
 from Query.Operator import Operator
 
 class Join(Operator):
+
+  # Hybrid hash join parameters: the minimum number of memory pages, the largest fraction of
+  # the buffer pool's size held in hash tables, the bytes taken by a hash table entry, the
+  # partition size slack, the deepest level of repartitioning, and the fraction of a partition
+  # that a subpartition must keep after repartitioning to be considered skewed.
+  minMemoryPages       = 16
+  memoryFraction       = 0.25
+  tableEntryBytes      = 100
+  partitionFudgeFactor = 1.2
+  maxPartitionDepth    = 4
+  skewFraction         = 0.9
+
   def __init__(self, lhsPlan, rhsPlan, **kwargs):
     super().__init__(**kwargs)
 
@@ -21,6 +34,8 @@ class Join(Operator):
     self.rhsKeySchema   = kwargs.get("rhsKeySchema", None)
     self.lhsHashFn      = kwargs.get("lhsHashFn", None)
     self.rhsHashFn      = kwargs.get("rhsHashFn", None)
+    self.memoryPages    = kwargs.get("memoryPages", None)
+    self.numPartitions  = None
 
     self.validateJoin()
     self.initializeSchema()
@@ -41,8 +56,11 @@ class Join(Operator):
       methodParams = [self.lhsKeySchema]
 
     elif self.joinMethod == "hash":
-      methodParams = [self.lhsHashFn, self.lhsKeySchema, \
-                      self.rhsHashFn, self.rhsKeySchema]
+      methodParams = [self.lhsKeySchema, self.rhsKeySchema]
+
+      # Partitioning expressions are optional, but must be given for both inputs.
+      if (self.lhsHashFn is None) != (self.rhsHashFn is None):
+        raise ValueError("Incomplete join specification, hash functions required for both inputs")
 
     requireAllValid = [self.lhsPlan, self.rhsPlan, \
                        self.joinMethod, \
@@ -93,6 +111,19 @@ class Join(Operator):
   def inputs(self):
     return [self.lhsPlan, self.rhsPlan]
 
+  # Compiles the join predicate and any partitioning expressions over the input schemas.
+  def prepare(self, database):
+    super().prepare(database)
+    self.joinPredicate = self.compileExpr(self.joinExpr, self.lhsSchema, self.rhsSchema) if self.joinExpr else None
+    if self.joinMethod == "hash" and self.lhsHashFn:
+      self.lhsHashKey = self.compileExpr(self.lhsHashFn, self.lhsSchema)
+      self.rhsHashKey = self.compileExpr(self.rhsHashFn, self.rhsSchema)
+
+  # Returns the packed output tuple joining two decoded input tuples,
+  # whose fields are concatenated in the join schema.
+  def joinOutput(self, lInstance, rInstance):
+    return self.joinSchema.pack(lInstance + rInstance)
+
   # Iterator abstraction for join operator.
   def __iter__(self):
     self.initializeOutput()
@@ -131,19 +162,12 @@ class Join(Operator):
   #
   def nestedLoops(self):
     for (lPageId, lhsPage) in self.lhsPlan:
-      for lTuple in lhsPage:
-        # Load the lhs once per inner loop.
-        joinExprEnv = self.loadSchema(self.lhsSchema, lTuple)
-
+      for lInstance in lhsPage.decodeAll(self.lhsSchema):
         for (rPageId, rhsPage) in self.rhsPlan:
-          for rTuple in rhsPage:
-            # Load the RHS tuple fields.
-            joinExprEnv.update(self.loadSchema(self.rhsSchema, rTuple))
-
+          for rInstance in rhsPage.decodeAll(self.rhsSchema):
             # Evaluate the join predicate, and output if we have a match.
-            if eval(self.joinExpr, globals(), joinExprEnv):
-              outputTuple = self.joinSchema.instantiate(*[joinExprEnv[f] for f in self.joinSchema.fields])
-              self.emitOutputTuple(self.joinSchema.pack(outputTuple))
+            if self.joinPredicate(lInstance, rInstance):
+              self.emitOutputTuple(self.joinOutput(lInstance, rInstance))
 
         # No need to track anything but the last output page when in batch mode.
         if self.outputPages:
@@ -185,19 +209,12 @@ class Join(Operator):
 
     while lPageBlock:
       for (lPageId, lhsPage) in lPageBlock:
-        for lTuple in lhsPage:
-          # Load the lhs once per inner loop.
-          joinExprEnv = self.loadSchema(self.lhsSchema, lTuple)
-
+        for lInstance in lhsPage.decodeAll(self.lhsSchema):
           for (rPageId, rhsPage) in self.rhsPlan:
-            for rTuple in rhsPage:
-              # Load the RHS tuple fields.
-              joinExprEnv.update(self.loadSchema(self.rhsSchema, rTuple))
-
+            for rInstance in rhsPage.decodeAll(self.rhsSchema):
               # Evaluate the join predicate, and output if we have a match.
-              if eval(self.joinExpr, globals(), joinExprEnv):
-                outputTuple = self.joinSchema.instantiate(*[joinExprEnv[f] for f in self.joinSchema.fields])
-                self.emitOutputTuple(self.joinSchema.pack(outputTuple))
+              if self.joinPredicate(lInstance, rInstance):
+                self.emitOutputTuple(self.joinOutput(lInstance, rInstance))
 
           # No need to track anything but the last output page when in batch mode.
           if self.outputPages:
@@ -225,10 +242,7 @@ class Join(Operator):
     if self.indexId:
       bufPool = self.storage.bufferPool
       for (lPageId, lhsPage) in self.lhsPlan:
-        for lTuple in lhsPage:
-          # Load the lhs once per inner loop.
-          joinExprEnv = self.loadSchema(self.lhsSchema, lTuple)
-
+        for (lTuple, lInstance) in zip(lhsPage.iterRows(), lhsPage.decodeAll(self.lhsSchema)):
           # Match against RHS tuples using the index.
           joinKey = self.lhsSchema.projectBinary(lTuple, self.lhsKeySchema)
           matches = self.storage.fileMgr.lookupByIndex(self.rhsPlan.relationId(), self.indexId, joinKey)
@@ -237,14 +251,12 @@ class Join(Operator):
             rhsPage = bufPool.getPage(rhsTupId.pageId)
             rTuple  = rhsPage.getTuple(rhsTupId)
 
-            # Load the RHS tuple fields.
-            joinExprEnv.update(self.loadSchema(self.rhsSchema, rTuple))
+            rInstance = self.rhsSchema.unpack(rTuple)
 
             # Evaluate any remaining join predicate, and output if we have a match.
-            fullMatch = eval(self.joinExpr, globals(), joinExprEnv) if self.joinExpr else True
+            fullMatch = self.joinPredicate(lInstance, rInstance) if self.joinPredicate else True
             if fullMatch:
-              outputTuple = self.joinSchema.instantiate(*[joinExprEnv[f] for f in self.joinSchema.fields])
-              self.emitOutputTuple(self.joinSchema.pack(outputTuple))
+              self.emitOutputTuple(self.joinOutput(lInstance, rInstance))
 
           # No need to track anything but the last output page when in batch mode.
           if self.outputPages:
@@ -261,40 +273,69 @@ class Join(Operator):
   #
   # Hash join implementation.
   #
+  # This is a hybrid hash join. The build side is the input with the smaller estimated size,
+  # and is partitioned so that each partition fits in the join's memory, as given by the free
+  # frames in the buffer pool. Partition 0 of the build side stays in memory as a hash table,
+  # which probe tuples of partition 0 match against while the probe side is partitioned.
+  # The remaining partitions are written to files, and joined pairwise by building an in-memory
+  # hash table on the smaller partition of each pair.
+  #
+  # Partition 0 is written to a file like any other partition if it outgrows memory, and
+  # partitions that still overflow memory are repartitioned recursively with a different hash
+  # seed. Partitions that repartitioning cannot split, i.e., those dominated by heavy-hitter keys,
+  # are joined by building hash tables over memory-sized chunks of the build side instead.
+  #
+  # Join inputs are partitioned by hashing their binary join keys, unless partitioning
+  # expressions are given with lhsHashFn and rhsHashFn.
+  #
   def hashJoin(self):
-    # Partition the LHS and RHS inputs, creating a temporary file for each partition.
-    # We assume one-level of partitioning is sufficient and skip recurring.
-    for (lPageId, lPage) in self.lhsPlan:
-      for lTuple in lPage:
-        lPartEnv = self.loadSchema(self.lhsSchema, lTuple)
-        lPartKey = eval(self.lhsHashFn, globals(), lPartEnv)
-        self.emitPartitionTuple(lPartKey, lTuple, left=True)
-
-    for (rPageId, rPage) in self.rhsPlan:
-      for rTuple in rPage:
-        rPartEnv = self.loadSchema(self.rhsSchema, rTuple)
-        rPartKey = eval(self.rhsHashFn, globals(), rPartEnv)
-        self.emitPartitionTuple(rPartKey, rTuple, left=False)
-
-    # Iterate over partition pairs and output matches
-    # evaluating the join expression as necessary.
-    for ((lPageId, lPage), (rPageId, rPage)) in self.partitionPairs():
-      for lTuple in lPage:
-        joinExprEnv = self.loadSchema(self.lhsSchema, lTuple)
-        for rTuple in rPage:
-          joinExprEnv.update(self.loadSchema(self.rhsSchema, rTuple))
-          output = \
-            ( self.lhsSchema.projectBinary(lTuple, self.lhsKeySchema) \
-                == self.rhsSchema.projectBinary(rTuple, self.rhsKeySchema) ) \
-            and ( eval(self.joinExpr, globals(), joinExprEnv) if self.joinExpr else True )
-
-          if output:
-            outputTuple = self.joinSchema.instantiate(*[joinExprEnv[f] for f in self.joinSchema.fields])
-            self.emitOutputTuple(self.joinSchema.pack(outputTuple))
-
-      # No need to track anything but the last output page when in batch mode.
-      if self.outputPages:
-        self.outputPages = [self.outputPages[-1]]
+    lhsTuples = self.estimatedTuples(self.lhsPlan)
+    rhsTuples = self.estimatedTuples(self.rhsPlan)
+    buildLeft = lhsTuples is None or rhsTuples is None or lhsTuples <= rhsTuples
+
+    (buildPlan, probePlan) = (self.lhsPlan, self.rhsPlan) if buildLeft else (self.rhsPlan, self.lhsPlan)
+    (buildSchema, buildKeySchema, probeSchema, probeKeySchema) = self.joinSides(buildLeft)
+
+    # Size memory by the first build row, as decoded rows take several times their packed size.
+    buildRows = self.pageRows(buildPlan, buildSchema)
+    firstRow  = next(buildRows, None)
+    rowBytes  = self.rowBytes(firstRow, buildSchema, buildKeySchema) if firstRow else buildSchema.size
+
+    memory        = self.memoryTuples(rowBytes)
+    buildTuples   = lhsTuples if buildLeft else rhsTuples
+    numPartitions = self.partitionCount(memory if buildTuples is None else buildTuples, memory)
+    self.numPartitions = numPartitions
+
+    # Partition the build side, keeping partition 0 in memory while it fits.
+    table    = {}
+    inMemory = []
+    for (tupleData, instance) in itertools.chain([firstRow] if firstRow else [], buildRows):
+      key = buildSchema.projectBinary(tupleData, buildKeySchema)
+      partitionId = self.partitionOf(key, instance, buildLeft, numPartitions)
+      if partitionId == 0 and table is not None:
+        table.setdefault(key, []).append(instance)
+        inMemory.append(tupleData)
+        if len(inMemory) > memory:
+          for inMemoryTuple in inMemory:
+            self.emitPartitionTuple(0, inMemoryTuple, left=buildLeft)
+          (table, inMemory) = (None, [])
+      else:
+        self.emitPartitionTuple(partitionId, tupleData, left=buildLeft)
+
+    # Partition the probe side, joining partition 0 with the in-memory hash table.
+    for (tupleData, instance) in self.pageRows(probePlan, probeSchema):
+      key = probeSchema.projectBinary(tupleData, probeKeySchema)
+      partitionId = self.partitionOf(key, instance, not buildLeft, numPartitions)
+      if partitionId == 0 and table is not None:
+        self.probeTable(table, [(tupleData, instance)], probeKeySchema, buildLeft)
+      else:
+        self.emitPartitionTuple(partitionId, tupleData, left=not buildLeft)
+
+    (table, inMemory) = (None, None)
+
+    # Join the remaining partitions pairwise.
+    for partitionId in self.partitionIds():
+      self.joinPartitionFiles(partitionId, 1, memory)
 
     # Clean up partitions.
     self.removePartitionFiles()
@@ -303,6 +344,136 @@ class Join(Operator):
     return self.storage.pages(self.relationId())
 
   # Hash join helpers.
+
+  # Returns the schemas and key schemas of the build and probe sides of a hash join.
+  def joinSides(self, buildLeft):
+    lhs = (self.lhsSchema, self.lhsKeySchema)
+    rhs = (self.rhsSchema, self.rhsKeySchema)
+    return (lhs + rhs) if buildLeft else (rhs + lhs)
+
+  # Returns the estimated number of tuples produced by a join input, or None if unknown.
+  def estimatedTuples(self, plan):
+    if plan.operatorType() == "TableScan":
+      return plan.cardinality(False)
+    estimate = plan.cardinality(True)
+    return estimate if estimate > 0 else None
+
+  # Returns an estimate of the bytes taken by a build row held in a hash table, counting its
+  # decoded values, packed data and binary key, and its hash table entry.
+  def rowBytes(self, row, schema, keySchema):
+    (tupleData, instance) = row
+    key = schema.projectBinary(tupleData, keySchema)
+    return sys.getsizeof(instance) + sum(sys.getsizeof(v) for v in instance) \
+             + sys.getsizeof(tupleData) + sys.getsizeof(key) + Join.tableEntryBytes
+
+  # Returns the number of build rows of the given size in bytes that may be held in memory.
+  # Hash tables are held outside the buffer pool, in as many bytes as the free frames of the
+  # buffer pool, or the pages given as the join's 'memoryPages', up to a fraction of the pool's size.
+  def memoryTuples(self, rowBytes):
+    bufPool = self.storage.bufferPool
+    pages   = self.memoryPages if self.memoryPages else max(bufPool.numFreePages(), Join.minMemoryPages)
+    memory  = min(pages * bufPool.pageSize, Join.memoryFraction * bufPool.poolSize)
+    return max(1, int(memory // rowBytes))
+
+  # Returns the number of partitions for a build input of the given size,
+  # leaving room for partition sizes to vary.
+  def partitionCount(self, numTuples, memoryTuples):
+    return max(1, math.ceil(numTuples * Join.partitionFudgeFactor / memoryTuples))
+
+  # Returns the partition of a tuple with the given binary join key at the first level of partitioning.
+  def partitionOf(self, key, instance, left, numPartitions):
+    if self.lhsHashFn:
+      return self.lhsHashKey(instance) if left else self.rhsHashKey(instance)
+    return hash((0, key)) % numPartitions
+
+  # Returns the decoded rows of the pages of an operator or partition file, with their packed data.
+  def pageRows(self, pages, schema):
+    for (pageId, page) in pages:
+      yield from zip(page.iterRows(), page.decodeAll(schema))
+
+  # Returns a hash table of decoded rows keyed by their binary join keys.
+  def buildTable(self, rows, schema, keySchema):
+    table = {}
+    for (tupleData, instance) in rows:
+      table.setdefault(schema.projectBinary(tupleData, keySchema), []).append(instance)
+    return table
+
+  # Matches probe rows against a hash table of build rows, evaluating the join expression as necessary.
+  def probeTable(self, table, rows, probeKeySchema, buildLeft):
+    probeSchema = self.rhsSchema if buildLeft else self.lhsSchema
+    for (tupleData, instance) in rows:
+      for match in table.get(probeSchema.projectBinary(tupleData, probeKeySchema), ()):
+        (lInstance, rInstance) = (match, instance) if buildLeft else (instance, match)
+        if self.joinPredicate is None or self.joinPredicate(lInstance, rInstance):
+          self.emitOutputTuple(self.joinOutput(lInstance, rInstance))
+
+  # Joins a pair of partitions, given as iterables of pages, with an in-memory hash table
+  # of the build side's tuples keyed by their binary join keys. Tuples of the probe side
+  # are matched by looking up their keys.
+  def joinPartitions(self, buildPages, probePages, buildLeft):
+    (buildSchema, buildKeySchema, probeSchema, probeKeySchema) = self.joinSides(buildLeft)
+    table = self.buildTable(self.pageRows(buildPages, buildSchema), buildSchema, buildKeySchema)
+    self.probeTable(table, self.pageRows(probePages, probeSchema), probeKeySchema, buildLeft)
+
+  # Joins a pair of partitions whose build side does not fit in memory, and cannot be split by
+  # repartitioning, by building hash tables over memory-sized chunks of the build side,
+  # and probing each one with the whole probe side.
+  def joinChunks(self, buildPages, probeFile, buildLeft, memory):
+    (buildSchema, buildKeySchema, probeSchema, probeKeySchema) = self.joinSides(buildLeft)
+    chunk = []
+    for row in itertools.chain(self.pageRows(buildPages, buildSchema), [None]):
+      if row is not None:
+        chunk.append(row)
+      if chunk and (row is None or len(chunk) >= memory):
+        table = self.buildTable(chunk, buildSchema, buildKeySchema)
+        self.probeTable(table, self.pageRows(probeFile.pages(), probeSchema), probeKeySchema, buildLeft)
+        chunk = []
+
+  # Joins a pair of partition files at the given depth of partitioning. Pairs whose smaller
+  # partition overflows memory are repartitioned with a hash seed for the next depth.
+  def joinPartitionFiles(self, partitionId, depth, memory):
+    (lFile, rFile) = self.partitionPair(partitionId)
+    if lFile and rFile:
+      buildLeft = lFile.numTuples() <= rFile.numTuples()
+      (buildFile, probeFile) = (lFile, rFile) if buildLeft else (rFile, lFile)
+      numTuples = buildFile.numTuples()
+
+      if numTuples <= memory:
+        self.joinPartitions(buildFile.pages(), probeFile.pages(), buildLeft)
+
+      elif depth > Join.maxPartitionDepth:
+        self.joinChunks(buildFile.pages(), probeFile, buildLeft, memory)
+
+      else:
+        # Repartition both sides, and join the subpartitions of the pair.
+        numPartitions = self.partitionCount(numTuples, memory)
+        for (left, partFile) in [(buildLeft, buildFile), (not buildLeft, probeFile)]:
+          (schema, keySchema) = (self.lhsSchema, self.lhsKeySchema) if left else (self.rhsSchema, self.rhsKeySchema)
+          for (tupleData, instance) in self.pageRows(partFile.pages(), schema):
+            subPartition = hash((depth, schema.projectBinary(tupleData, keySchema))) % numPartitions
+            self.emitPartitionTuple(str(partitionId) + "_" + str(subPartition), tupleData, left=left)
+
+        subPartitionIds = [str(partitionId) + "_" + str(i) for i in range(numPartitions)]
+        self.removePartition(partitionId)
+
+        for subPartitionId in subPartitionIds:
+          (lSubFile, rSubFile) = self.partitionPair(subPartitionId)
+          if lSubFile and rSubFile:
+            # Heavy-hitter keys keep most of a partition together, whatever the hash seed.
+            if min(lSubFile.numTuples(), rSubFile.numTuples()) > Join.skewFraction * numTuples:
+              buildSubLeft = lSubFile.numTuples() <= rSubFile.numTuples()
+              (buildSubFile, probeSubFile) = (lSubFile, rSubFile) if buildSubLeft else (rSubFile, lSubFile)
+              self.joinChunks(buildSubFile.pages(), probeSubFile, buildSubLeft, memory)
+            else:
+              self.joinPartitionFiles(subPartitionId, depth + 1, memory)
+          self.removePartition(subPartitionId)
+
+      # No need to track anything but the last output page when in batch mode.
+      if self.outputPages:
+        self.outputPages = [self.outputPages[-1]]
+
+    self.removePartition(partitionId)
+
   def partitionRelationId(self, left, partitionId):
     return self.operatorType() + str(self.id()) + "_" \
             + ("l" if left else "r") + "part_" + str(partitionId)
@@ -314,19 +485,27 @@ class Join(Operator):
     # Create a partition file as needed.
     if not self.storage.hasRelation(partRelId):
       self.storage.createRelation(partRelId, partSchema)
-      self.partitionFiles[int(left)][partitionId] = partRelId
+      self.partitionFiles[0 if left else 1][partitionId] = partRelId
 
     partFile = self.storage.fileMgr.relationFile(partRelId)[1]
     if partFile:
       partFile.insertTuple(partitionTuple)
 
-  # Return pairs of pages from matching partitions.
-  def partitionPairs(self):
-    lKeys = self.partitionFiles[0].keys()
-    rKeys = self.partitionFiles[1].keys()
-    matches = [(self.partitionFiles[0][partId], self.partitionFiles[1][partId]) \
-                for partId in lKeys if partId in rKeys]
-    return PartitionIterator(matches, self.storage)
+  # Returns the identifiers of the current partitions.
+  def partitionIds(self):
+    return list(dict.fromkeys(list(self.partitionFiles[0].keys()) + list(self.partitionFiles[1].keys())))
+
+  # Returns the lhs and rhs files of a partition, or None for a side without any tuples.
+  def partitionPair(self, partitionId):
+    return tuple(self.storage.fileMgr.relationFile(self.partitionFiles[i][partitionId])[1] \
+                   if partitionId in self.partitionFiles[i] else None for i in [0, 1])
+
+  # Deletes the files of a partition.
+  def removePartition(self, partitionId):
+    for i in [0, 1]:
+      partRelId = self.partitionFiles[i].pop(partitionId, None)
+      if partRelId is not None:
+        self.storage.removeRelation(partRelId)
 
   # Delete all existing partition files.
   def removePartitionFiles(self):
@@ -459,42 +638,9 @@ class Join(Operator):
       exprs = "(" + ','.join(filter(lambda x: x is not None, (
           [ "expr='" + str(self.joinExpr) + "'" if self.joinExpr else None ]
         + [ "lhsKeySchema=" + self.lhsKeySchema.toString() ,
-            "rhsKeySchema=" + self.rhsKeySchema.toString() ,
-            "lhsHashFn='" + self.lhsHashFn + "'" ,
-            "rhsHashFn='" + self.rhsHashFn + "'" ]
+            "rhsKeySchema=" + self.rhsKeySchema.toString() ]
+        + ([ "lhsHashFn='" + self.lhsHashFn + "'" ,
+             "rhsHashFn='" + self.rhsHashFn + "'" ] if self.lhsHashFn else [])
         ))) + ")"
 
     return exprs
-
-# An iterator class for looping over pairs of pages from partition files.
-class PartitionIterator:
-  def __init__(self, partFiles, storageEngine):
-    self.partFiles = partFiles
-    self.storage   = storageEngine
-    self.fileIter  = iter(self.partFiles)
-    self.nextFilePair()
-
-  def __iter__(self):
-    return self
-
-  def nextFilePair(self):
-    try:
-      (lPartRelId, rPartRelId) = next(self.fileIter)
-      self.lFile = self.storage.fileMgr.relationFile(lPartRelId)[1]
-      self.rFile = self.storage.fileMgr.relationFile(rPartRelId)[1]
-    except StopIteration:
-      self.fileIter     = None
-      self.pagePairIter = None
-    else:
-      self.pagePairIter = itertools.product(self.lFile.pages(), self.rFile.pages())
-
-  def __next__(self):
-    if self.fileIter is not None:
-      while self.pagePairIter is not None:
-        try:
-          return next(self.pagePairIter)
-        except StopIteration:
-          self.nextFilePair()
-
-    if self.fileIter is None:
-      raise StopIteration
@@ -0,0 +1,222 @@
+import ast, sys
+
+from Query.Operator import Operator
+from Query.Operators.Select    import Select
+from Query.Operators.Project   import Project
+from Query.Operators.TableScan import TableScan
+
+class Pipeline(Operator):
+  """
+  A fused pipeline of selection and projection operators.
+
+  This replaces a chain of unary operators by a single operator whose
+  tuple processing is compiled into one Python function, in the style of
+  a produce/consume query compiler. The function decodes each input page
+  once, binding input fields as local variables, and nests each operator's
+  code within the code of the operator below it: selections guard the
+  remaining code with their predicate, and projections pack their output
+  fields. Later operators see the projection's output fields as decoded from
+  its packed tuple, and no other fields, as with operator-at-a-time processing.
+  Output tuples are the last projection's packed tuples, or the input tuples
+  when the pipeline does not project its input. Input pages decode only the
+  fields used by the pipeline, and input tuples are only retrieved once selected.
+
+  Pipelines are created from query plans with Plan.compilePipelines(), and
+  process pages with the same iterator abstraction as the operators they fuse.
+  The operators are given in the order they consume tuples, from the operator
+  reading the pipeline's input to the one producing its output.
+  """
+
+  def __init__(self, subPlan, operators, **kwargs):
+    super().__init__(**kwargs)
+    self.subPlan   = subPlan
+    self.operators = operators
+
+    if not operators or not all(isinstance(op, (Select, Project)) for op in operators):
+      raise ValueError("Pipelines fuse a non-empty chain of selections and projections")
+
+  # Returns the output schema of this operator
+  def schema(self):
+    return self.operators[-1].schema()
+
+  # Returns any input schemas for the operator if present
+  def inputSchemas(self):
+    return [self.subPlan.schema()]
+
+  # Returns a string describing the operator type
+  def operatorType(self):
+    return "Pipeline"
+
+  # Returns child operators if present
+  def inputs(self):
+    return [self.subPlan]
+
+  # Generates and compiles the pipeline's processing function.
+  def prepare(self, database):
+    super().prepare(database)
+    env = {}
+    for op in self.operators:
+      env.update(sys.modules[type(op).__module__].__dict__)
+    env['_inputSchema'] = self.subPlan.schema()
+    env['_fields']      = self.inputFields()
+    for (i, op) in enumerate(self.operators):
+      if isinstance(op, Project):
+        env.update({ '_pack' + str(i) : op.schema().pack, '_unpack' + str(i) : op.schema().unpack })
+    exec(self.source(), env)
+    self.pipeline = env['pipeline']
+
+
+  # Code generation
+
+  # Returns the input fields referred to by any of the operators' expressions.
+  def inputFields(self):
+    names = set(name for op in self.operators for e in self.expressions(op) for name in self.names(e))
+    return set(f for f in self.subPlan.schema().fields if f in names)
+
+  # Returns the source of a function processing an input page, and calling
+  # an emit function with each packed output tuple. Pipelines without projections
+  # collect the positions of selected tuples, and emit their input tuples.
+  def source(self):
+    inputSchema = self.subPlan.schema()
+    projected   = self.projected()
+
+    # Bind only the input fields referred to by any of the operators' expressions.
+    bound  = self.inputFields()
+    fields = "(" + ", ".join((f if f in bound else "_") for f in inputSchema.fields) + ",)"
+    rows   = "_page.decodeAll(_inputSchema, _fields)"
+
+    if projected:
+      lines = [ "def pipeline(_page, _emit):"
+              , "  for " + fields + " in " + rows + ":" ]
+      lines.extend(self.consume(0, 4, bound))
+    else:
+      lines = [ "def pipeline(_page, _emit):"
+              , "  _selected = []"
+              , "  for (_index, " + fields + ") in enumerate(" + rows + "):" ]
+      lines.extend(self.consume(0, 4, bound))
+      lines.extend([ "  for _row in _page.rowsAt(_selected):"
+                   , "    _emit(_row)" ])
+    return "\n".join(lines) + "\n"
+
+  # Returns whether the pipeline projects its input.
+  def projected(self):
+    return any(isinstance(op, Project) for op in self.operators)
+
+  # Returns the code of the operators consuming a tuple, from the given operator upwards,
+  # given the set of fields bound as variables by the operators below it.
+  def consume(self, index, indent, bound):
+    pad = " " * indent
+    if index == len(self.operators):
+      return [pad + ("_emit(_row)" if self.projected() else "_selected.append(_index)")]
+
+    op = self.operators[index]
+    if isinstance(op, Select):
+      return [pad + "if (" + op.selectExpr + "):"] + self.consume(index + 1, indent + 2, bound)
+
+    # Projections evaluate all of their expressions before binding any output field,
+    # and pack the output fields into the projection's schema.
+    outputs = op.schema().fields
+    exprs   = [op.projectExprs[f][0] for f in outputs]
+    lines   = [ pad + "(" + "".join(f + ", " for f in outputs) + ") = (" + "".join("(" + e + "), " for e in exprs) + ")"
+              , pad + "_row = _pack" + str(index) + "((" + "".join(f + ", " for f in outputs) + "))" ]
+
+    # Later operators read the output fields as stored, e.g., rounded to single precision floats
+    # or truncated to their character length, and may not refer to any of the projection's input fields.
+    later = set(name for laterOp in self.operators[index+1:] for e in self.expressions(laterOp) for name in self.names(e))
+    if later:
+      lines.append(pad + "(" + "".join((f if f in later else "_") + ", " for f in outputs) + ") = _unpack" + str(index) + "(_row)")
+      hidden = sorted(bound - set(outputs))
+      if hidden:
+        lines.append(pad + "del " + ", ".join(hidden))
+    return lines + self.consume(index + 1, indent, set(outputs))
+
+  # Returns the expressions evaluated by an operator.
+  def expressions(self, op):
+    return [op.selectExpr] if isinstance(op, Select) else [e for (e, _) in op.projectExprs.values()]
+
+  # Returns the variable names used by an expression.
+  def names(self, expr):
+    return [node.id for node in ast.walk(ast.parse(expr, mode='eval')) if isinstance(node, ast.Name)]
+
+  # Returns the field ranges implied by the selections applied directly to the pipeline's input,
+  # intersecting the ranges of each selection.
+  def fieldRanges(self):
+    ranges = {}
+    for op in self.operators:
+      if not isinstance(op, Select):
+        break
+      for (field, (low, high)) in op.fieldRanges().items():
+        (curLow, curHigh) = ranges.get(field, (None, None))
+        ranges[field] = ( low if curLow is None else curLow if low is None else max(low, curLow)
+                        , high if curHigh is None else curHigh if high is None else min(high, curHigh) )
+    return ranges
+
+
+  # Iterator abstraction for pipeline operator.
+
+  def __iter__(self):
+    self.initializeOutput()
+    self.inputIterator = self.subPlan
+
+    # Let table scans skip pages that cannot satisfy the leading selections.
+    if isinstance(self.subPlan, TableScan):
+      self.subPlan.restrictPages(self.fieldRanges())
+    self.inputFinished = False
+
+    if not self.pipelined:
+      self.outputIterator = self.processAllPages()
+
+    return self
+
+  def __next__(self):
+    if self.pipelined:
+      while not(self.inputFinished or self.isOutputPageReady()):
+        try:
+          pageId, page = next(self.inputIterator)
+          self.processInputPage(pageId, page)
+        except StopIteration:
+          self.inputFinished = True
+
+      return self.outputPage()
+
+    else:
+      return next(self.outputIterator)
+
+
+  # Page processing and control methods
+
+  # Page-at-a-time operator processing
+  def processInputPage(self, pageId, page):
+    self.pipeline(page, self.emitOutputTuple)
+
+  # Set-at-a-time operator processing
+  def processAllPages(self):
+    if self.inputIterator is None:
+      self.inputIterator = self.subPlan
+
+    # Process all pages from the child operator.
+    try:
+      for (pageId, page) in self.inputIterator:
+        self.processInputPage(pageId, page)
+
+        # No need to track anything but the last output page when in batch mode.
+        if self.outputPages:
+          self.outputPages = [self.outputPages[-1]]
+
+    # To support pipelined operation, processInputPage may raise a
+    # StopIteration exception during its work. We catch this and ignore in batch mode.
+    except StopIteration:
+      pass
+
+    # Return an iterator to the output relation
+    return self.storage.pages(self.relationId())
+
+
+  # Plan and statistics information
+
+  # Returns a single line description of the operator.
+  def explain(self):
+    return super().explain() + self.conciseExplain()
+
+  def conciseExplain(self):
+    return "(" + " -> ".join(op.operatorType() + op.conciseExplain() for op in self.operators) + ")"
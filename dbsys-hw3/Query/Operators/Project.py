@@ -36,6 +36,21 @@ class Project(Operator):
   def inputs(self):
     return [self.subPlan]
 
+  # Compiles the projection expressions into a function returning the output fields' values.
+  def prepare(self, database):
+    super().prepare(database)
+    self.projection = self.compileExpr([self.projectExprs[f][0] for f in self.outputSchema.fields], \
+                                       self.subPlan.schema())
+    self.fields     = self.referencedFields([e for (e, _) in self.projectExprs.values()], self.subPlan.schema())
+
+  # Projections are vectorized as array expressions when all of their expressions can be vectorized.
+  def vectorizable(self):
+    try:
+      self.compileBatchExpr([self.projectExprs[f][0] for f in self.outputSchema.fields], self.subPlan.schema())
+      return self.subPlan.vectorized and self.outputSchema.batchType() is not None
+    except ValueError:
+      return False
+
   # Iterator abstraction for projection operator.
 
   def __iter__(self):
@@ -43,13 +58,15 @@ class Project(Operator):
     self.inputIterator = self.subPlan
     self.inputFinished = False
 
-    if not self.pipelined:
+    if self.vectorized:
+      self.outputIterator = self.processAllBatches()
+    elif not self.pipelined:
       self.outputIterator = self.processAllPages()
 
     return self
 
   def __next__(self):
-    if self.pipelined:
+    if self.pipelined and not self.vectorized:
       while not(self.inputFinished or self.isOutputPageReady()):
         try:
           pageId, page = next(self.inputIterator)
@@ -69,16 +86,22 @@ class Project(Operator):
     outputSchema = self.schema()
 
     if set(locals().keys()).isdisjoint(set(inputSchema.fields)):
-      for inputTuple in page:
+      projection = self.projection
+      for instance in page.decodeAll(inputSchema, self.fields):
         # Execute the projection expressions.
-        projectExprEnv = self.loadSchema(inputSchema, inputTuple)
-        vals = {k : eval(v[0], globals(), projectExprEnv) for (k,v) in self.projectExprs.items()}
-        outputTuple = outputSchema.pack([vals[i] for i in outputSchema.fields])
+        outputTuple = outputSchema.pack(projection(instance))
         self.emitOutputTuple(outputTuple)
 
     else:
       raise ValueError("Overlapping variables detected with operator schema")
 
+  # Batch-at-a-time operator processing, assigning each output column from its expression's array.
+  def batches(self):
+    inputSchema = self.subPlan.schema()
+    exprs       = [self.projectExprs[f][0] for f in self.outputSchema.fields]
+    for batch in self.subPlan.batches():
+      yield self.packBatch(self.outputSchema, self.evalBatch(exprs, inputSchema, batch), len(batch))
+
   # Set-at-a-time operator processing
   def processAllPages(self):
     if self.inputIterator is None:
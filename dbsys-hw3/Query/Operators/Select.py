@@ -1,4 +1,7 @@
+import ast
+
 from Query.Operator import Operator
+from Query.Operators.TableScan import TableScan
 
 class Select(Operator):
   def __init__(self, subPlan, selectExpr, **kwargs):
@@ -22,21 +25,41 @@ class Select(Operator):
   def inputs(self):
     return [self.subPlan]
 
+  # Compiles the predicate over the input schema.
+  def prepare(self, database):
+    super().prepare(database)
+    self.predicate = self.compileExpr(self.selectExpr, self.subPlan.schema())
+    self.fields    = self.referencedFields(self.selectExpr, self.subPlan.schema())
+
+  # Selections are vectorized as boolean masks when their predicate can be vectorized.
+  def vectorizable(self):
+    try:
+      self.compileBatchExpr(self.selectExpr, self.subPlan.schema())
+      return self.subPlan.vectorized
+    except ValueError:
+      return False
+
 
   # Iterator abstraction for selection operator.
 
   def __iter__(self):
     self.initializeOutput()
     self.inputIterator = self.subPlan
+
+    # Let table scans skip pages that cannot satisfy the predicate.
+    if isinstance(self.subPlan, TableScan):
+      self.subPlan.restrictPages(self.fieldRanges())
     self.inputFinished = False
 
-    if not self.pipelined:
+    if self.vectorized:
+      self.outputIterator = self.processAllBatches()
+    elif not self.pipelined:
       self.outputIterator = self.processAllPages()
 
     return self
 
   def __next__(self):
-    if self.pipelined:
+    if self.pipelined and not self.vectorized:
       while not(self.inputFinished or self.isOutputPageReady()):
         try:
           pageId, page = next(self.inputIterator)
@@ -56,16 +79,23 @@ class Select(Operator):
   def processInputPage(self, pageId, page):
     schema = self.subPlan.schema()
     if set(locals().keys()).isdisjoint(set(schema.fields)):
-      for inputTuple in page:
-        # Load tuple fields into the select expression context
-        selectExprEnv = self.loadSchema(schema, inputTuple)
-
-        # Execute the predicate.
-        if eval(self.selectExpr, globals(), selectExprEnv):
-          self.emitOutputTuple(inputTuple)
+      # Execute the predicate on the decoded fields, and emit the packed data of matching tuples.
+      predicate = self.predicate
+      instances = page.decodeAll(schema, self.fields)
+      for inputTuple in page.rowsAt([i for (i, instance) in enumerate(instances) if predicate(instance)]):
+        self.emitOutputTuple(inputTuple)
     else:
       raise ValueError("Overlapping variables detected with operator schema")
 
+  # Batch-at-a-time operator processing, filtering each input batch by the predicate's mask.
+  def batches(self):
+    if isinstance(self.subPlan, TableScan):
+      self.subPlan.restrictPages(self.fieldRanges())
+
+    schema = self.subPlan.schema()
+    for batch in self.subPlan.batches():
+      yield batch[self.evalBatch(self.selectExpr, schema, batch).astype(bool)]
+
   # Set-at-a-time operator processing
   def processAllPages(self):
     if self.inputIterator is None:
@@ -89,6 +119,56 @@ class Select(Operator):
     return self.storage.pages(self.relationId())
 
 
+  # Returns the inclusive (low, high) bounds implied on fields of the input schema
+  # by the predicate, as a dictionary of field names to bounds where either bound may be None.
+  # Only top-level conjuncts comparing a field to a numeric constant are considered,
+  # and strict comparisons are widened to inclusive ones.
+  def fieldRanges(self):
+    try:
+      predicate = ast.parse(self.selectExpr, mode='eval').body
+    except SyntaxError:
+      return {}
+
+    conjuncts = predicate.values if isinstance(predicate, ast.BoolOp) and isinstance(predicate.op, ast.And) \
+                  else [predicate]
+
+    fields = set(self.subPlan.schema().fields)
+    ranges = {}
+    for conjunct in conjuncts:
+      if isinstance(conjunct, ast.Compare):
+        operands = [conjunct.left] + conjunct.comparators
+        for (op, lhs, rhs) in zip(conjunct.ops, operands, operands[1:]):
+          (field, value) = (self.rangeOperand(lhs, fields), self.rangeOperand(rhs, fields))
+          if isinstance(field, str) and isinstance(value, (int, float)):
+            self.boundField(ranges, field, op, value, False)
+          elif isinstance(value, str) and isinstance(field, (int, float)):
+            self.boundField(ranges, value, op, field, True)
+    return ranges
+
+  # Returns a field name or numeric constant for a comparison operand, or None otherwise.
+  def rangeOperand(self, node, fields):
+    if isinstance(node, ast.Name) and node.id in fields:
+      return node.id
+    elif isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+      return node.value
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+      value = self.rangeOperand(node.operand, ())
+      if isinstance(value, (int, float)):
+        return -value if isinstance(node.op, ast.USub) else value
+
+  # Narrows a field's range by a comparison with a constant, where 'flipped'
+  # indicates the constant appears on the left of the comparison.
+  def boundField(self, ranges, field, op, value, flipped):
+    (low, high) = ranges.get(field, (None, None))
+    upper = (ast.Lt, ast.LtE) if not flipped else (ast.Gt, ast.GtE)
+    lower = (ast.Gt, ast.GtE) if not flipped else (ast.Lt, ast.LtE)
+    if isinstance(op, upper + (ast.Eq,)):
+      high = value if high is None else min(high, value)
+    if isinstance(op, lower + (ast.Eq,)):
+      low = value if low is None else max(low, value)
+    if isinstance(op, upper + lower + (ast.Eq,)):
+      ranges[field] = (low, high)
+
   # Plan and statistics information
 
   # Returns a single line description of the operator.
@@ -8,6 +8,7 @@ class TableScan(Operator):
       super().__init__(**kwargs)
       self.relId      = relId
       self.relSchema  = schema
+      self.pageRanges = None
     else:
       raise ValueError("Invalid relation name or schema for a table scan")
 
@@ -32,9 +33,27 @@ class TableScan(Operator):
   def inputs(self):
     return []
 
+  # Restricts the scan to pages that may hold tuples within the given field ranges,
+  # as a dictionary of field names to inclusive (low, high) bounds.
+  # Pages are skipped by the relation's zone map, if it has one.
+  def restrictPages(self, ranges):
+    self.pageRanges = ranges if ranges else None
+
+  # Table scans can produce column batches for relations with fixed-size fields.
+  def vectorizable(self):
+    try:
+      return self.relSchema.batchType() is not None
+    except ValueError:
+      return False
+
+  # Returns an iterator over a column batch for each scanned page.
+  def batches(self):
+    for (pageId, page) in self.storage.pages(self.relId, self.pageRanges):
+      yield page.decodeBatch(self.relSchema)
+
   # Volcano-style iterator abstraction
   def __iter__(self):
-    self.pageIterator = self.storage.pages(self.relId)
+    self.pageIterator = self.storage.pages(self.relId, self.pageRanges)
     self.nextPageId, self.nextPage = None, None
     self.pageSize, self.numPages, _ = self.storage.relationStats(self.relId)
 
@@ -486,16 +486,14 @@ class Optimizer:
           ))
 
         elif hashJoin:
-          lhsHashFn = "hash(" + lhsKeySchema.fields[0] + ") % 8"
-          rhsHashFn = "hash(" + rhsKeySchema.fields[0] + ") % 8"
-
+          # The join sizes its partitions from the inputs' sizes and the available memory.
           joinPlan = Join(
             lhsPlan=lhs,
             rhsPlan=rhs,
             method='hash',
             rhsSchema=rhsNewSchema,
-            lhsHashFn=lhsHashFn, lhsKeySchema=lhsKeySchema,
-            rhsHashFn=rhsHashFn, rhsKeySchema=rhsKeySchema
+            lhsKeySchema=lhsKeySchema,
+            rhsKeySchema=rhsKeySchema
           )
           testPlan = Plan(root=joinPlan)
 
@@ -10,6 +10,7 @@ from Query.Operators.Union     import Union
 from Query.Operators.Join      import Join
 from Query.Operators.GroupBy   import GroupBy
 from Query.Operators.Union     import Union
+from Query.Operators.Pipeline  import Pipeline
 
 class Plan:
   """
@@ -143,6 +144,64 @@ class Plan:
     else:
       raise ValueError("Invalid query plan")
 
+  # Enables batch-at-a-time processing of column batches for every operator able to
+  # vectorize its work, and whose inputs are also vectorized. Other operators process
+  # rows, reading the output relations of any vectorized inputs.
+  # Vectorization is disabled for every operator when 'enabled' is false.
+  def vectorize(self, enabled=True):
+    if self.root:
+      for (_, operator) in reversed(self.flatten()):
+        operator.vectorized = enabled and operator.vectorizable()
+      return self
+    else:
+      raise ValueError("Invalid query plan")
+
+  # Replaces every chain of selections and projections in the plan by a pipeline
+  # operator, which compiles the chain's tuple processing into a single function.
+  def compilePipelines(self):
+    if self.root:
+      self.root = self.fusePipeline(self.root)
+      return self
+    else:
+      raise ValueError("Invalid query plan")
+
+  # Returns the given operator, or a pipeline fusing the chain of selections and
+  # projections starting at the operator, with pipelines fused in all of its inputs.
+  def fusePipeline(self, operator):
+    chain = []
+    while isinstance(operator, (Select, Project)) and not operator.vectorized:
+      chain.append(operator)
+      operator = operator.subPlan
+
+    for attr in ['subPlan', 'lhsPlan', 'rhsPlan']:
+      if hasattr(operator, attr):
+        setattr(operator, attr, self.fusePipeline(getattr(operator, attr)))
+
+    if chain:
+      return Pipeline(operator, list(reversed(chain)), pipeline=chain[0].pipelined)
+    return operator
+
+  # Restores the operators fused by compilePipelines, replacing every pipeline in the plan
+  # by the chain of selections and projections it fuses.
+  def removePipelines(self):
+    if self.root:
+      self.root = self.unfusePipeline(self.root)
+      return self
+    else:
+      raise ValueError("Invalid query plan")
+
+  # Returns the given operator, or the last operator fused by a pipeline, with pipelines
+  # removed from all of its inputs.
+  def unfusePipeline(self, operator):
+    if isinstance(operator, Pipeline):
+      self.unfusePipeline(operator.subPlan)
+      return operator.operators[-1]
+
+    for attr in ['subPlan', 'lhsPlan', 'rhsPlan']:
+      if hasattr(operator, attr):
+        setattr(operator, attr, self.unfusePipeline(getattr(operator, attr)))
+    return operator
+
   # Iterator abstraction for query processing.
   # Thus, we can use: "for page in plan: ..."
   def __iter__(self):
@@ -248,6 +307,30 @@ class PlanBuilder:
   >>> [query2.schema().unpack(tup).id for page in db.processQuery(query2) for tup in page[1]]
   [0, 1, 2, 3, 4]
 
+  ### Compiled pipelines, fusing a chain of selections and projections.
+  >>> query2b = db.query().fromTable('employee').where("age < 30").select( \
+          {'id': ('id', 'int'), 'older': ('age + 1', 'int')}).where("id % 2 == 0").finalize()
+
+  >>> print(db.processQuery(query2b, compiled=True).explain()) # doctest: +ELLIPSIS
+  Pipeline[...,cost=...](Select(predicate='age < 30') -> Project(projections=...) -> Select(predicate='id % 2 == 0'))
+    TableScan[...,cost=...](employee)
+
+  >>> [tuple(query2b.schema().unpack(tup)) for page in db.processQuery(query2b) for tup in page[1]]
+  [(0, 21), (2, 25), (4, 29)]
+  >>> query2b.root.operatorType()
+  'Select'
+
+  ### Fused projections store their output fields in the projection's schema, before later selections.
+  >>> query2c = lambda: db.query().fromTable('employee').select( \
+          {'third': ('age / 3.0', 'float'), 'ageStr': ('str(age)', 'char(1)')}).where( \
+          "third == 20 / 3.0 or ageStr == '2'").finalize()
+
+  >>> sorted(tuple(query2c().schema().unpack(tup)) for page in db.processQuery(query2c()) for tup in page[1]) \
+        == sorted(tuple(query2c().schema().unpack(tup)) for page in db.processQuery(query2c(), compiled=True) for tup in page[1])
+  True
+  >>> len([tup for page in db.processQuery(query2c(), compiled=True) for tup in page[1]])
+  5
+
 
   ### SELECT * FROM Employee UNION ALL Employee
   >>> query3 = db.query().fromTable('employee').union(db.query().fromTable('employee')).finalize()
@@ -300,6 +383,74 @@ class PlanBuilder:
   >>> sorted([(tup.id, tup.id2) for tup in q5results]) # doctest:+ELLIPSIS
   [(0, 0), (1, 1), (2, 2), ..., (18, 18), (19, 19)]
 
+  ### Hash join of relations with different schemas.
+  >>> db.createRelation('bonus', [('bid', 'int'), ('amount', 'double'), ('grade', 'char(2)')])
+  >>> bonusSchema = db.relationSchema('bonus')
+  >>> for tup in [bonusSchema.pack(bonusSchema.instantiate(i, 10.0 * i, 'A')) for i in range(0, 40, 3)]:
+  ...    _ = db.insertTuple(bonusSchema.name, tup)
+  ...
+
+  >>> query5b = db.query().fromTable('employee').join( \
+          db.query().fromTable('bonus'), \
+          method='hash', \
+          lhsHashFn='hash(id) % 4',  lhsKeySchema=keySchema, \
+          rhsHashFn='hash(bid) % 4', rhsKeySchema=DBSchema('bonusKey', [('bid', 'int')]), \
+        ).finalize()
+
+  >>> sorted([(tup.id, tup.amount) for tup in \
+        [query5b.schema().unpack(tup) for page in db.processQuery(query5b) for tup in page[1]]])
+  [(0, 0.0), (3, 30.0), (6, 60.0), (9, 90.0), (12, 120.0), (15, 150.0), (18, 180.0)]
+
+  ### Hybrid hash join with a single page of memory, partitioning both inputs by their join keys.
+  ### Partitions overflowing memory are repartitioned, and the heavy-hitter key 0 is joined in chunks.
+  >>> db.createRelation('lhsWide', [('lk', 'int'), ('lpad', 'char(200)')])
+  >>> db.createRelation('rhsWide', [('rk', 'int'), ('rpad', 'char(200)')])
+  >>> (lWide, rWide) = (db.relationSchema('lhsWide'), db.relationSchema('rhsWide'))
+  >>> (lKeys, rKeys) = ([0] * 60 + list(range(1, 400)), [0] * 60 + list(range(200, 600)))
+  >>> for tup in [lWide.pack(lWide.instantiate(k, 'l')) for k in lKeys]:
+  ...    _ = db.insertTuple(lWide.name, tup)
+  ...
+  >>> for tup in [rWide.pack(rWide.instantiate(k, 'r')) for k in rKeys]:
+  ...    _ = db.insertTuple(rWide.name, tup)
+  ...
+
+  >>> query5c = db.query().fromTable('lhsWide').join( \
+          db.query().fromTable('rhsWide'), \
+          method='hash', \
+          lhsKeySchema=DBSchema('lhsWideKey', [('lk', 'int')]), \
+          rhsKeySchema=DBSchema('rhsWideKey', [('rk', 'int')]), \
+          memoryPages=1 \
+        ).finalize()
+
+  >>> q5cresults = [query5c.schema().unpack(tup) for page in db.processQuery(query5c) for tup in page[1]]
+  >>> len(q5cresults) == 60 * 60 + 200 and all(tup.lk == tup.rk for tup in q5cresults)
+  True
+
+  ### Hash tables take at most a fraction of the buffer pool, counting the size of decoded tuples.
+  >>> smallDb = Database.Database(dataDir='data/smallPool', pageSize=4096, poolSize=32 * 4096)
+  >>> smallDb.createRelation('lhsPad', [('lk', 'int'), ('lpad', 'char(100)')])
+  >>> smallDb.createRelation('rhsPad', [('rk', 'int'), ('rpad', 'char(100)')])
+  >>> (lPad, rPad) = (smallDb.relationSchema('lhsPad'), smallDb.relationSchema('rhsPad'))
+  >>> for i in range(2000):
+  ...    _ = smallDb.insertTuple('lhsPad', lPad.pack(lPad.instantiate(i, 'l' * 100)))
+  ...    _ = smallDb.insertTuple('rhsPad', rPad.pack(rPad.instantiate(i, 'r' * 100)))
+  ...
+
+  >>> query5d = smallDb.query().fromTable('lhsPad').join( \
+          smallDb.query().fromTable('rhsPad'), \
+          method='hash', \
+          lhsKeySchema=DBSchema('lhsPadKey', [('lk', 'int')]), \
+          rhsKeySchema=DBSchema('rhsPadKey', [('rk', 'int')]) \
+        ).finalize()
+
+  >>> len([tup for page in smallDb.processQuery(query5d) for tup in page[1]])
+  2000
+
+  # Each partition's build tuples fit in a quarter of the pool, taking more than twice their packed size.
+  >>> query5d.root.numPartitions >= 2000 * 2 * lPad.size * Join.partitionFudgeFactor / (Join.memoryFraction * 32 * 4096)
+  True
+  >>> smallDb.close()
+
   ### Group by aggregate query
   ### SELECT id, max(age) FROM Employee GROUP BY id
   >>> aggMinMaxSchema = DBSchema('minmax', [('minAge', 'int'), ('maxAge','int')])
@@ -320,6 +471,53 @@ class PlanBuilder:
   >>> sorted([(tup.id, tup.minAge, tup.maxAge) for tup in q6results]) # doctest:+ELLIPSIS
   [(0, 20, 20), (1, 22, 22), ..., (18, 56, 56), (19, 58, 58)]
 
+  ### Group by aggregate query with expression strings, which may be vectorized.
+  ### SELECT id % 2, min(age), max(age) FROM Employee WHERE age < 30 GROUP BY id % 2
+  >>> query7 = db.query().fromTable('employee').where("age < 30").groupBy( \
+          groupSchema=keySchema, \
+          aggSchema=aggMinMaxSchema, \
+          groupExpr=['id % 2'], \
+          aggExprs=[('min', 'age'), ('max', 'age')], \
+          groupHashFn=(lambda gbVal: hash(gbVal[0]) % 2) \
+        ).finalize()
+
+  >>> q7results = sorted([tuple(query7.schema().unpack(tup)) for page in db.processQuery(query7) for tup in page[1]])
+  >>> q7results
+  [(0, 20, 28), (1, 22, 26)]
+
+  >>> from Query.Operator import np
+  >>> np is None or q7results == \
+        sorted([tuple(query7.schema().unpack(tup)) for page in db.processQuery(query7, vectorized=True) for tup in page[1]])
+  True
+  >>> np is None or [op.vectorized for (_, op) in query7.flatten()] == [True, True, True]
+  True
+  >>> _ = db.processQuery(query7)
+  >>> [op.vectorized for (_, op) in query7.flatten()]
+  [False, False, False]
+
+  ### Vectorized expressions compute with the precision of rows, and store the same values.
+  >>> db.createRelation('discount', [('did', 'int'), ('disc', 'float'), ('big', 'int')])
+  >>> discSchema = db.relationSchema('discount')
+  >>> for tup in [discSchema.pack(discSchema.instantiate(*t)) for t in [(1, 0.07, 2 ** 31 - 1), (2, 0.05, 1)]]:
+  ...    _ = db.insertTuple(discSchema.name, tup)
+  ...
+
+  >>> query7b = db.query().fromTable('discount').where("disc <= 0.07").finalize()
+  >>> [query7b.schema().unpack(tup).did for page in db.processQuery(query7b) for tup in page[1]]
+  [2]
+  >>> [query7b.schema().unpack(tup).did for page in db.processQuery(query7b, vectorized=True) for tup in page[1]]
+  [2]
+
+  >>> query7c = db.query().fromTable('discount').select({'total': ('big + big', 'int')}).finalize()
+  >>> [tup for page in db.processQuery(query7c) for tup in page[1]]
+  Traceback (most recent call last):
+  ...
+  struct.error: 'i' format requires -2147483648 <= number <= 2147483647
+  >>> [tup for page in db.processQuery(query7c, vectorized=True) for tup in page[1]]
+  Traceback (most recent call last):
+  ...
+  struct.error: 'i' format requires -2147483648 <= number <= 2147483647
+
   # Populate employees relation with another 10000 tuples
   >>> for tup in [schema.pack(schema.instantiate(i, math.ceil(random.gauss(45, 25)))) for i in range(10000)]:
   ...    _ = db.insertTuple(schema.name, tup)
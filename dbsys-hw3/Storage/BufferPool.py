@@ -1,6 +1,6 @@
-import io, math, struct
+import heapq, io, math, mmap, queue, struct, threading
 
-from collections import OrderedDict
+from collections import OrderedDict, deque
 from struct      import Struct
 
 from Catalog.Identifiers import PageId, FileId, TupleId
@@ -8,25 +8,643 @@ from Catalog.Schema      import DBSchema
 
 import Storage.FileManager
 
+class ReplacementPolicy:
+  """
+  A base class for buffer pool page replacement policies.
+
+  A replacement policy tracks the pages resident in the buffer pool, and picks
+  the page to evict when the buffer pool runs out of free frames. The buffer
+  pool informs its policy of every page entering and leaving the pool, of
+  every cache hit, and of pin count transitions. Pinned pages must never be
+  returned as eviction victims.
+
+  Policies are constructed with the number of pages held by the buffer pool.
+  """
+
+  def __init__(self, numPages):
+    self.numPages = numPages
+
+  # A page has been read into the buffer pool, possibly pinned.
+  def insert(self, pageId, pinned):
+    raise NotImplementedError
+
+  # A resident page has been accessed (i.e., a cache hit).
+  def access(self, pageId):
+    raise NotImplementedError
+
+  # A resident page's pin count has gone from zero to positive.
+  def pin(self, pageId):
+    raise NotImplementedError
+
+  # A resident page's pin count has dropped back to zero.
+  def unpin(self, pageId):
+    raise NotImplementedError
+
+  # A page has left the buffer pool.
+  def remove(self, pageId):
+    raise NotImplementedError
+
+  # Returns the page id of the next page to evict, or None if all pages are pinned.
+  # This does not remove the page from the policy, the buffer pool calls remove() on eviction.
+  def victim(self):
+    raise NotImplementedError
+
+
+class LRUPolicy(ReplacementPolicy):
+  """
+  Least-recently-used replacement.
+
+  We implement LRU through the use of an OrderedDict holding only unpinned pages,
+  and by moving pages to the end of the ordering every time they are accessed.
+  Since pinned pages are never in the candidate list, the least recently used
+  candidate is always at its front, and finding a victim takes constant time.
+
+  >>> pIds = [PageId(FileId(0), i) for i in range(4)]
+  >>> lru  = LRUPolicy(4)
+  >>> for pId in pIds:
+  ...   lru.insert(pId, False)
+  ...
+  >>> lru.access(pIds[0])
+  >>> lru.pin(pIds[1])
+  >>> lru.victim() == pIds[2]
+  True
+
+  >>> lru.unpin(pIds[1])
+  >>> [pId.pageIndex for pId in lru.candidates]
+  [2, 3, 0, 1]
+  """
+
+  def __init__(self, numPages):
+    super().__init__(numPages)
+    self.candidates = OrderedDict()
+
+  def insert(self, pageId, pinned):
+    if not pinned:
+      self.candidates[pageId] = None
+
+  def access(self, pageId):
+    if pageId in self.candidates:
+      self.candidates.move_to_end(pageId)
+
+  def pin(self, pageId):
+    self.candidates.pop(pageId, None)
+
+  def unpin(self, pageId):
+    self.candidates[pageId] = None
+
+  def remove(self, pageId):
+    self.candidates.pop(pageId, None)
+
+  def victim(self):
+    return next(iter(self.candidates), None)
+
+
+class ClockPolicy(ReplacementPolicy):
+  """
+  CLOCK (second chance) replacement.
+
+  Unpinned pages are arranged in a circular buffer, each with a reference bit
+  that is set on access. The clock hand sweeps the buffer, clearing reference bits,
+  until it finds a page whose bit is already clear. Pinned pages are taken out of
+  the circle, leaving a hole that is reused by later insertions.
+
+  >>> pIds  = [PageId(FileId(0), i) for i in range(4)]
+  >>> clock = ClockPolicy(4)
+  >>> for pId in pIds:
+  ...   clock.insert(pId, False)
+  ...
+
+  # All pages start referenced, so the first sweep gives every page a second chance.
+  >>> clock.victim() == pIds[0]
+  True
+
+  >>> clock.remove(pIds[0])
+  >>> clock.access(pIds[1])
+  >>> clock.victim() == pIds[2]
+  True
+  """
+
+  def __init__(self, numPages):
+    super().__init__(numPages)
+    self.ring       = []
+    self.position   = {}
+    self.referenced = {}
+    self.holes      = []
+    self.hand       = 0
+
+  def insert(self, pageId, pinned):
+    self.referenced[pageId] = True
+    if not pinned:
+      self.addToRing(pageId)
+
+  def access(self, pageId):
+    if pageId in self.referenced:
+      self.referenced[pageId] = True
+
+  def pin(self, pageId):
+    self.removeFromRing(pageId)
+
+  def unpin(self, pageId):
+    self.referenced[pageId] = True
+    self.addToRing(pageId)
+
+  def remove(self, pageId):
+    self.removeFromRing(pageId)
+    self.referenced.pop(pageId, None)
+
+  def victim(self):
+    # Two full sweeps suffice, since the first sweep clears every reference bit.
+    for i in range(2 * len(self.ring)):
+      pageId = self.ring[self.hand]
+      if pageId is not None:
+        if self.referenced[pageId]:
+          self.referenced[pageId] = False
+        else:
+          return pageId
+      self.hand = (self.hand + 1) % len(self.ring)
+
+  # Circular buffer helpers.
+  def addToRing(self, pageId):
+    if pageId not in self.position:
+      if self.holes:
+        index = self.holes.pop()
+        self.ring[index] = pageId
+      else:
+        index = len(self.ring)
+        self.ring.append(pageId)
+      self.position[pageId] = index
+
+  def removeFromRing(self, pageId):
+    index = self.position.pop(pageId, None)
+    if index is not None:
+      self.ring[index] = None
+      self.holes.append(index)
+
+      # Compact the circular buffer once it is mostly holes.
+      if len(self.holes) > len(self.position):
+        self.ring     = [pId for pId in self.ring if pId is not None]
+        self.position = dict((pId, i) for (i, pId) in enumerate(self.ring))
+        self.holes    = []
+        self.hand     = 0
+
+
+class TwoQPolicy(ReplacementPolicy):
+  """
+  2Q replacement (Johnson and Shasha, VLDB 1994).
+
+  Pages referenced for the first time enter a FIFO queue (A1in). Pages evicted
+  from this queue are remembered by id in a ghost queue (A1out), and a page
+  that is read in again while remembered there is placed in an LRU queue (Am).
+  Thus a single sequential scan only cycles through A1in, without displacing
+  the frequently accessed pages held in Am.
+
+  Pinned pages leave their queue, and rejoin its tail once unpinned.
+
+  >>> pIds = [PageId(FileId(0), i) for i in range(8)]
+  >>> twoQ = TwoQPolicy(4)
+  >>> twoQ.insert(pIds[0], False)
+  >>> twoQ.insert(pIds[1], False)
+  >>> twoQ.victim() == pIds[0]
+  True
+
+  # Re-reading an evicted page promotes it to the hot queue.
+  >>> twoQ.remove(pIds[0])
+  >>> twoQ.insert(pIds[0], False)
+  >>> pIds[0] in twoQ.am
+  True
+
+  # Once A1in overflows, its oldest page is evicted ahead of the hot pages.
+  >>> twoQ.insert(pIds[2], False)
+  >>> twoQ.victim() == pIds[1]
+  True
+  """
+
+  # Fractions of the buffer pool size for the A1in and A1out queues.
+  inFraction  = 0.25
+  outFraction = 0.5
+
+  def __init__(self, numPages):
+    super().__init__(numPages)
+    self.maxIn      = max(1, int(numPages * TwoQPolicy.inFraction))
+    self.maxOut     = max(1, int(numPages * TwoQPolicy.outFraction))
+    self.a1in       = OrderedDict()
+    self.a1out      = OrderedDict()
+    self.am         = OrderedDict()
+    self.pinnedHome = {}
+
+  def insert(self, pageId, pinned):
+    if pageId in self.a1out:
+      del self.a1out[pageId]
+      queue = self.am
+    else:
+      queue = self.a1in
+
+    if pinned:
+      self.pinnedHome[pageId] = queue
+    else:
+      queue[pageId] = None
+
+  def access(self, pageId):
+    if pageId in self.am:
+      self.am.move_to_end(pageId)
+
+  def pin(self, pageId):
+    if pageId in self.am:
+      self.pinnedHome[pageId] = self.am
+      del self.am[pageId]
+    elif pageId in self.a1in:
+      self.pinnedHome[pageId] = self.a1in
+      del self.a1in[pageId]
+
+  def unpin(self, pageId):
+    queue = self.pinnedHome.pop(pageId, None)
+    if queue is not None:
+      queue[pageId] = None
+
+  def remove(self, pageId):
+    queue = self.pinnedHome.pop(pageId, None)
+    if pageId in self.a1in or queue is self.a1in:
+      self.a1in.pop(pageId, None)
+      self.a1out[pageId] = None
+      if len(self.a1out) > self.maxOut:
+        self.a1out.popitem(last=False)
+    else:
+      self.am.pop(pageId, None)
+
+  def victim(self):
+    if self.a1in and (len(self.a1in) > self.maxIn or not self.am):
+      return next(iter(self.a1in))
+    return next(iter(self.am), None)
+
+
+class LRUKPolicy(ReplacementPolicy):
+  """
+  LRU-K replacement (O'Neil et al., SIGMOD 1993), with K=2 by default.
+
+  The victim is the page whose K-th most recent access is furthest in the past.
+  Pages with fewer than K accesses have an infinite backward K-distance, and are
+  evicted first in least recently used order. Access histories are retained for
+  a bounded number of recently evicted pages.
+
+  Pages with a full history are kept in a heap keyed by their K-th most recent
+  access time, with stale heap entries discarded lazily. The heap is rebuilt
+  from the current candidates once stale entries outnumber them.
+
+  >>> pIds = [PageId(FileId(0), i) for i in range(4)]
+  >>> lru2 = LRUKPolicy(4)
+  >>> for pId in pIds:
+  ...   lru2.insert(pId, False)
+  ...
+  >>> lru2.access(pIds[0])
+  >>> lru2.access(pIds[1])
+  >>> lru2.victim() == pIds[2]
+  True
+
+  >>> lru2.remove(pIds[2]); lru2.remove(pIds[3])
+  >>> lru2.victim() == pIds[0]
+  True
+
+  >>> for i in range(1000):
+  ...   lru2.access(pIds[i % 2])
+  ...
+  >>> len(lru2.heap) <= LRUKPolicy.heapSlack * len(lru2.heapKeys)
+  True
+  >>> lru2.victim() == pIds[0]
+  True
+  """
+
+  # Maximum number of heap entries per candidate page, before rebuilding the heap.
+  heapSlack = 2
+
+  def __init__(self, numPages, k=2):
+    super().__init__(numPages)
+    self.k          = k
+    self.clock      = 0
+    self.history    = {}
+    self.retained   = OrderedDict()
+    self.pinned     = set()
+    self.cold       = OrderedDict()
+    self.heap       = []
+    self.heapKeys   = {}
+    self.heapSeq    = 0
+
+  def insert(self, pageId, pinned):
+    self.history[pageId] = self.retained.pop(pageId, None) or deque(maxlen=self.k)
+    self.recordAccess(pageId)
+    if pinned:
+      self.pinned.add(pageId)
+    else:
+      self.addCandidate(pageId)
+
+  def access(self, pageId):
+    if pageId in self.history:
+      self.recordAccess(pageId)
+      if pageId not in self.pinned:
+        self.addCandidate(pageId)
+
+  def pin(self, pageId):
+    self.pinned.add(pageId)
+    self.removeCandidate(pageId)
+
+  def unpin(self, pageId):
+    self.pinned.discard(pageId)
+    self.addCandidate(pageId)
+
+  def remove(self, pageId):
+    self.pinned.discard(pageId)
+    self.removeCandidate(pageId)
+    history = self.history.pop(pageId, None)
+    if history is not None:
+      self.retained[pageId] = history
+      if len(self.retained) > self.numPages:
+        self.retained.popitem(last=False)
+
+  def victim(self):
+    if self.cold:
+      return next(iter(self.cold))
+
+    while self.heap:
+      (key, _, pageId) = self.heap[0]
+      if self.heapKeys.get(pageId, None) == key:
+        return pageId
+      heapq.heappop(self.heap)
+
+  # History and candidate helpers.
+  def recordAccess(self, pageId):
+    self.clock += 1
+    self.history[pageId].append(self.clock)
+
+  def addCandidate(self, pageId):
+    history = self.history[pageId]
+    if len(history) < self.k:
+      self.cold[pageId] = None
+      self.cold.move_to_end(pageId)
+    else:
+      self.cold.pop(pageId, None)
+      key = history[0]
+      if self.heapKeys.get(pageId, None) != key:
+        self.heapKeys[pageId] = key
+        self.heapSeq += 1
+        heapq.heappush(self.heap, (key, self.heapSeq, pageId))
+        if len(self.heap) > LRUKPolicy.heapSlack * len(self.heapKeys):
+          self.rebuildHeap()
+
+  # Replaces the heap by one holding only the current entry of each candidate page.
+  def rebuildHeap(self):
+    self.heap = []
+    for (pageId, key) in self.heapKeys.items():
+      self.heapSeq += 1
+      self.heap.append((key, self.heapSeq, pageId))
+    heapq.heapify(self.heap)
+
+  def removeCandidate(self, pageId):
+    self.cold.pop(pageId, None)
+    self.heapKeys.pop(pageId, None)
+
+
+class BufferRing:
+  """
+  A small private ring of buffer pool frames, used for bulk reads such as
+  sequential scans over large relations.
+
+  Pages read through a ring are held in the buffer pool's page map, so that they
+  are visible to all other accesses, but they are not tracked by the pool's
+  replacement policy. Once the ring is full, each new page read through the
+  ring reuses the frame of the ring's oldest page. Thus a large scan recycles
+  its own frames rather than evicting every other page from the pool.
+
+  A page read through a ring is adopted by the shared pool when it is accessed
+  without the ring, or when it is still pinned once the ring wraps around to it.
+  """
+
+  def __init__(self, bufferPool, size):
+    self.bufferPool = bufferPool
+    self.size       = size
+    self.pages      = deque()
+
+  # Reads a page through the ring.
+  def getPage(self, pageId, pinned=False):
+    return self.bufferPool.getPage(pageId, pinned, ring=self)
+
+  # Returns all unpinned frames held by the ring to the buffer pool's free list.
+  def release(self):
+    self.bufferPool.releaseRing(self)
+
+
 class BufferPool:
   """
   A buffer pool implementation.
 
   Since the buffer pool is a cache, we do not provide any serialization methods.
 
+  The pool's memory is an anonymous memory map, whose pages are only allocated by
+  the operating system once touched. Frames are handed out lazily in address order,
+  with frames released by evicted pages reused first, so that the pool's resident
+  memory tracks the number of pages actually cached.
+
+  The buffer pool's page replacement policy can be chosen on construction through
+  the 'replacementPolicy' keyword argument, as one of the names in
+  BufferPool.replacementPolicies (LRU by default).
+
+  The buffer pool tracks its dirty pages, which are written out in batches grouped
+  by storage file and sorted by page offset. When evicting a dirty page, we also
+  write out the dirty unpinned pages surrounding it in its file. Optionally, a
+  background writer thread ('backgroundWriter=True') periodically writes out dirty
+  unpinned pages ahead of their eviction. All buffer pool operations hold the
+  pool's lock, while page writes by the background writer hold only the file's lock.
+
+  Pages may be prefetched on a worker thread with prefetchPages(), for example by
+  sequential read-ahead in storage file page iterators (enabled with 'readAhead=True').
+  Prefetched pages are kept out of the replacement policy until first used, and are
+  evicted before any other page, oldest first.
+
+  Pages of memory-mapped storage files are read-only views of the file's mapping,
+  and take a slot in the pool without a frame. They are copied into a frame by
+  getWritablePage() before being modified.
+
   >>> schema = DBSchema('employee', [('id', 'int'), ('age', 'int')])
   >>> bp = BufferPool()
   >>> fm = Storage.FileManager.FileManager(bufferPool=bp)
   >>> bp.setFileManager(fm)
 
   # Check initial buffer pool size
-  >>> len(bp.pool.getbuffer()) == bp.poolSize
+  >>> len(bp.pool) == bp.poolSize
+  True
+
+  # Frames are handed out lazily, so an unused pool touches none of its memory.
+  >>> bp.nextFrame, bp.numFreePages() == bp.numPages()
+  (0, True)
+
+  # Pinned pages are never considered for eviction.
+  >>> fm.createRelation(schema.name, schema)
+  >>> (fId, f) = fm.relationFile(schema.name)
+  >>> pages = [f.allocatePage().pageId for i in range(4)]
+  >>> bp.getPage(pages[0], pinned=True).pageId == pages[0]
+  True
+  >>> _ = [bp.getPage(pId) for pId in pages[1:]]
+  >>> list(bp.policy.candidates) == pages[1:]
+  True
+
+  >>> bp.evictPage()
+  >>> bp.hasPage(pages[0]), bp.hasPage(pages[1])
+  (True, False)
+
+  # Unpinned pages re-enter the eviction list as the most recently used.
+  >>> bp.unpinPage(pages[0])
+  >>> list(bp.policy.candidates) == [pages[2], pages[3], pages[0]]
+  True
+
+  # Check hit ratio tracking
+  >>> bp.resetStatistics()
+  >>> _ = [bp.getPage(pId) for pId in pages]
+  >>> bp.hitRatio()
+  0.75
+
+  # Scans of large relations read through a private ring of frames.
+  >>> bp.clear()
+  >>> _ = [bp.discardPage(pId) for pId in pages]
+  >>> ring = BufferRing(bp, 2)
+  >>> _ = [ring.getPage(pId) for pId in pages]
+  >>> [bp.hasPage(pId) for pId in pages]
+  [False, False, True, True]
+  >>> bp.numFreePages() == bp.numPages() - 2
+  True
+
+  # Accessing a page without the ring hands it over to the shared pool.
+  >>> _ = bp.getPage(pages[3])
+  >>> list(bp.policy.candidates) == [pages[3]]
+  True
+
+  >>> ring.release()
+  >>> [bp.hasPage(pId) for pId in pages]
+  [False, False, False, True]
+
+  # Dirty pages are tracked by the buffer pool, and written out together.
+  >>> for pId in pages[:3]:
+  ...   _ = bp.getPage(pId).insertTuple(schema.pack(schema.instantiate(pId.pageIndex, 20)))
+  ...
+  >>> sorted(bp.dirtyPages[fId]), bp.numDirtyPages
+  ([0, 1, 2], 3)
+
+  >>> bp.flushDirtyPages()
+  >>> bp.numDirtyPages, bp.getPage(pages[0]).isDirty()
+  (0, False)
+
+  # The background writer cleans dirty pages without waiting for eviction.
+  >>> bp3 = BufferPool(backgroundWriter=True, writerInterval=0.01)
+  >>> fm3 = Storage.FileManager.FileManager(bufferPool=bp3)
+  >>> bp3.setFileManager(fm3)
+  >>> (_, f3) = fm3.relationFile(schema.name)
+  >>> _ = f3.insertTuple(schema.pack(schema.instantiate(100, 20)))
+  >>> bp3.writerThread is not None
   True
 
+  >>> bp3.close()
+  >>> bp3.writerThread is None, bp3.numDirtyPages
+  (True, 0)
+
+  # Prefetched pages are evicted first, until used.
+  >>> _ = [bp.discardPage(pId) for pId in pages]
+  >>> bp.prefetchPages(pages[:2])
+  >>> bp.waitForPrefetch()
+  >>> list(bp.prefetchedPages) == pages[:2]
+  True
+
+  >>> bp.getPageWithHit(pages[1])[1]
+  True
+  >>> list(bp.prefetchedPages) == pages[:1]
+  True
+
+  # Failed prefetch reads release their frames, and the pages are read on request instead.
+  >>> _ = [bp.discardPage(pId) for pId in pages]
+  >>> freePages = bp.numFreePages()
+  >>> def failedRead(pageIds, buffers):
+  ...   raise OSError("Read failed")
+  ...
+  >>> f.readPages = failedRead
+  >>> bp.prefetchPages(pages[:2])
+  >>> bp.waitForPrefetch()
+  >>> del f.readPages
+
+  >>> bp.numFreePages() == freePages, len(bp.pendingPages), bp.prefetchThread.is_alive()
+  (True, 0, True)
+  >>> bp.getPageWithHit(pages[0])[1]
+  False
+
+  # So do failures to allocate frames, e.g., when writing out an evicted dirty page.
+  >>> _ = bp.discardPage(pages[0])
+  >>> allocateFrame = bp.allocateFrame
+  >>> def failedAllocation():
+  ...   bp.allocateFrame = failedWrite
+  ...   return allocateFrame()
+  ...
+  >>> def failedWrite():
+  ...   raise OSError("Write failed")
+  ...
+  >>> bp.allocateFrame = failedAllocation
+  >>> bp.prefetchPages(pages[:2])
+  >>> bp.waitForPrefetch()
+  >>> del bp.allocateFrame
+
+  >>> bp.numFreePages() == freePages, len(bp.pendingPages), bp.prefetchThread.is_alive()
+  (True, 0, True)
+  >>> bp.prefetchPages(pages[:2])
+  >>> bp.waitForPrefetch()
+  >>> list(bp.prefetchedPages) == pages[:2]
+  True
+
+  # Pages of memory-mapped files take a frame only once modified.
+  >>> fm.createRelation('mapped', schema, mapped=True)
+  >>> (_, mf) = fm.relationFile('mapped')
+  >>> mId = mf.allocatePage().pageId
+  >>> bp.getPage(mId).isReadOnly(), bp.pageMap[mId][0] is None
+  (True, True)
+
+  >>> tId = mf.insertTuple(schema.pack(schema.instantiate(1, 20)))
+  >>> bp.getPage(mId).isReadOnly(), bp.pageMap[mId][0] is None, bp.isDirtyPage(mId)
+  (False, False, True)
+
+  >>> bp.flushPage(mId)
+  >>> [schema.unpack(tup).id for tup in bp.getPage(mId)], bp.getPage(mId).isReadOnly()
+  ([1], True)
+
+  # Alternative replacement policies
+  >>> sorted(BufferPool.replacementPolicies.keys())
+  ['2q', 'clock', 'lru', 'lru-2']
+
+  >>> bp2 = BufferPool(replacementPolicy='clock')
+  >>> isinstance(bp2.policy, ClockPolicy)
+  True
+
+  >>> import shutil
+  >>> shutil.rmtree(Storage.FileManager.FileManager.defaultDataDir)
   """
 
   defaultPoolSize = 128 * (1 << 20)
 
+  replacementPolicies = { 'lru'   : LRUPolicy
+                        , 'clock' : ClockPolicy
+                        , '2q'    : TwoQPolicy
+                        , 'lru-2' : LRUKPolicy }
+
+  defaultReplacementPolicy = 'lru'
+
+  # Bulk reads of files larger than this fraction of the buffer pool use a ring
+  # of at most scanRingPages frames, rather than the shared pool.
+  scanRingFraction = 0.25
+  scanRingPages    = 32
+
+  # Evicting a dirty page also writes the dirty unpinned pages within this many pages of it.
+  evictionWriteWindow = 32
+
+  # The background writer runs every writerInterval seconds, or earlier once
+  # this fraction of the buffer pool is dirty.
+  defaultWriterInterval = 0.1
+  writerDirtyFraction   = 0.25
+
+  # Prefetch requests are ignored once this fraction of the buffer pool holds unused prefetched pages.
+  prefetchFraction = 0.25
+
   def __init__(self, **kwargs):
     other = kwargs.get("other", None)
     if other:
@@ -36,10 +654,41 @@ class BufferPool:
       self.pageSize     = kwargs.get("pageSize", io.DEFAULT_BUFFER_SIZE)
       self.poolSize     = kwargs.get("poolSize", BufferPool.defaultPoolSize)
 
-      self.pool         = io.BytesIO(b'\x00' * self.poolSize)
-      self.pageMap      = OrderedDict()
-      self.freeList     = list(range(0, self.poolSize, self.pageSize))
-      self.freeListLen  = len(self.freeList)
+      self.pool         = mmap.mmap(-1, self.poolSize)
+      self.poolView     = memoryview(self.pool)
+      self.pageMap      = {}
+      self.freeList     = []
+      self.freeListLen  = self.numPages()
+      self.nextFrame    = 0
+
+      policyName        = kwargs.get("replacementPolicy", None) or BufferPool.defaultReplacementPolicy
+      if policyName not in BufferPool.replacementPolicies:
+        raise ValueError("Unknown buffer pool replacement policy: " + str(policyName))
+      self.policyName   = policyName
+      self.policy       = BufferPool.replacementPolicies[policyName](self.numPages())
+
+      self.ringPages    = {}
+
+      self.dirtyPages    = {}
+      self.numDirtyPages = 0
+
+      self.lock           = threading.RLock()
+      self.writerEnabled  = kwargs.get("backgroundWriter", False)
+      self.writerInterval = kwargs.get("writerInterval", BufferPool.defaultWriterInterval)
+      self.writerThread   = None
+      self.writerWakeup   = threading.Event()
+      self.writerStopping = False
+
+      self.readAhead       = kwargs.get("readAhead", False)
+      self.prefetchedPages = OrderedDict()
+      self.pendingPages    = {}
+      self.prefetchQueue   = queue.Queue()
+      self.prefetchThread  = None
+
+      self.numHits      = 0
+      self.numMisses    = 0
+      self.numPrefetched    = 0
+      self.numPrefetchHits  = 0
 
       self.fileMgr      = None
 
@@ -47,9 +696,31 @@ class BufferPool:
     self.pageSize    = other.pageSize
     self.poolSize    = other.poolSize
     self.pool        = other.pool
+    self.poolView    = other.poolView
     self.pageMap     = other.pageMap
     self.freeList    = other.freeList
     self.freeListLen = other.freeListLen
+    self.nextFrame   = other.nextFrame
+    self.policyName  = other.policyName
+    self.policy      = other.policy
+    self.ringPages   = other.ringPages
+    self.dirtyPages     = other.dirtyPages
+    self.numDirtyPages  = other.numDirtyPages
+    self.lock           = other.lock
+    self.writerEnabled  = other.writerEnabled
+    self.writerInterval = other.writerInterval
+    self.writerThread   = other.writerThread
+    self.writerWakeup   = other.writerWakeup
+    self.writerStopping = other.writerStopping
+    self.readAhead       = other.readAhead
+    self.prefetchedPages = other.prefetchedPages
+    self.pendingPages    = other.pendingPages
+    self.prefetchQueue   = other.prefetchQueue
+    self.prefetchThread  = other.prefetchThread
+    self.numPrefetched   = other.numPrefetched
+    self.numPrefetchHits = other.numPrefetchHits
+    self.numHits     = other.numHits
+    self.numMisses   = other.numMisses
     self.fileMgr     = other.fileMgr
 
   def setFileManager(self, fileMgr):
@@ -73,6 +744,17 @@ class BufferPool:
   def usedSpace(self):
     return self.size() - self.freeSpace()
 
+  # Returns the fraction of page requests served without reading from disk.
+  def hitRatio(self):
+    requests = self.numHits + self.numMisses
+    return self.numHits / requests if requests else 0.0
+
+  def resetStatistics(self):
+    self.numHits         = 0
+    self.numMisses       = 0
+    self.numPrefetched   = 0
+    self.numPrefetchHits = 0
+
 
   # Buffer pool operations
 
@@ -82,51 +764,206 @@ class BufferPool:
   # Gets a page from the buffer pool if present, otherwise reads it from a heap file.
   # This method returns both the page, as well as a boolean to indicate whether
   # there was a cache hit.
-  def getPageWithHit(self, pageId, pinned=False):
+  # Pages may optionally be read through a BufferRing, for bulk accesses.
+  def getPageWithHit(self, pageId, pinned=False, ring=None):
     if self.fileMgr:
-      if self.hasPage(pageId):
-        return (self.getCachedPage(pageId, pinned)[1], True)
+      while True:
+        with self.lock:
+          pending = self.pendingPages.get(pageId, None)
+          if pending is None:
+            return self.fetchPage(pageId, pinned, ring)
 
-      else:
-        # Fetch the page from the file system, adding it to the buffer pool
-        if not self.freeList:
-          self.evictPage()
-
-        self.freeListLen -= 1
-        offset     = self.freeList.pop(0)
-        pageBuffer = self.pool.getbuffer()[offset:offset+self.pageSize]
-        page       = self.fileMgr.readPage(pageId, pageBuffer)
-        
-        self.pageMap[pageId] = (offset, page, 1 if pinned else 0)
-        self.pageMap.move_to_end(pageId)
-        return (page, False)
+        # Wait for a prefetch of this page to complete.
+        pending.wait()
     
     else:
       raise ValueError("Uninitalized buffer pool, no file manager found")
 
+  # Returns a page and whether it was cached, reading it from disk if necessary.
+  # This must be called while holding the buffer pool's lock.
+  def fetchPage(self, pageId, pinned, ring):
+    if self.hasPage(pageId):
+      self.numHits += 1
+      return (self.getCachedPage(pageId, pinned, ring)[1], True)
+
+    else:
+      self.numMisses += 1
+
+      # Fetch the page from the file system, adding it to the buffer pool
+      offset = self.ringFrame(ring) if ring else None
+      rFile  = self.fileMgr.storageFile(pageId.fileId)
+
+      if rFile is not None and rFile.mapped:
+        # Pages of memory-mapped files are views of the mapping, and only take a slot in the pool.
+        if offset is not None:
+          self.freeList.append(offset)
+          self.freeListLen += 1
+        self.allocateSlot()
+        offset = None
+        page   = rFile.readPage(pageId, None)
+
+      else:
+        if offset is None:
+          offset = self.allocateFrame()
+        pageBuffer = self.poolView[offset:offset+self.pageSize]
+        page       = self.fileMgr.readPage(pageId, pageBuffer)
+
+      self.installPage(pageId, offset, page, pinned)
+
+      if ring:
+        self.ringPages[pageId] = ring
+        ring.pages.append(pageId)
+      else:
+        self.policy.insert(pageId, pinned)
+      return (page, False)
+
+  # Adds a page read from disk into the given frame to the page map.
+  def installPage(self, pageId, offset, page, pinned):
+    # The page's contents match the disk, regardless of the dirty flag it was written with.
+    page.header.setDirty(False)
+    page.onDirty = self.markDirty
+    self.pageMap[pageId] = (offset, page, 1 if pinned else 0)
+
+  # Returns the offset of a free frame, evicting a page if necessary.
+  def allocateFrame(self):
+    self.allocateSlot()
+    return self.takeFrame()
+
+  # Reserves a slot in the pool for a page, evicting a page if necessary.
+  def allocateSlot(self):
+    if self.freeListLen == 0:
+      self.evictPage()
+    self.freeListLen -= 1
+
+  # Returns the offset of an unused frame, for a page that already holds a slot.
+  # Frames released by evicted pages are taken from the end of the free list in
+  # constant time, before handing out a frame that has never been used. Since pages
+  # of memory-mapped files hold a slot without a frame, there are always at least
+  # as many unused frames as free slots.
+  def takeFrame(self):
+    if self.freeList:
+      return self.freeList.pop()
+
+    offset = self.nextFrame
+    self.nextFrame += self.pageSize
+    return offset
+
   # Wrapper for getPageWithHit, returning only the page.
-  def getPage(self, pageId, pinned=False):
-    return self.getPageWithHit(pageId, pinned)[0]
+  def getPage(self, pageId, pinned=False, ring=None):
+    return self.getPageWithHit(pageId, pinned, ring)[0]
+
+  # Returns a page that may be modified. Read-only pages of memory-mapped files
+  # are copied into a frame, which the page object then continues on.
+  def getWritablePage(self, pageId, pinned=False):
+    page = self.getPage(pageId, pinned=True)
+    with self.lock:
+      (offset, page, pinCount) = self.pageMap[pageId]
+      if offset is None:
+        offset = self.takeFrame()
+        page.relocate(self.poolView[offset:offset+self.pageSize])
+        self.pageMap[pageId] = (offset, page, pinCount)
+      if not pinned:
+        self.incrementPinCount(pageId, -1)
+    return page
 
   # Returns a triple of offset, page object, and pin count
   # for pages present in the buffer pool.
-  def getCachedPage(self, pageId, pinned=False):
-    if self.hasPage(pageId):
-      if pinned:
-        self.incrementPinCount(pageId, 1)
-      return self.pageMap[pageId]
-    else:
-      return (None, None, None)
+  # This counts as an access to the page for the replacement policy, unless
+  # made through a ring, so that bulk reads do not promote pages.
+  def getCachedPage(self, pageId, pinned=False, ring=None):
+    with self.lock:
+      if self.hasPage(pageId):
+        if pageId in self.prefetchedPages:
+          self.usePrefetchedPage(pageId, ring)
+        elif ring is None:
+          if pageId in self.ringPages:
+            self.adoptPage(pageId)
+          else:
+            self.policy.access(pageId)
+        if pinned:
+          self.incrementPinCount(pageId, 1)
+        return self.pageMap[pageId]
+      else:
+        return (None, None, None)
+
+
+  # Buffer ring operations
+
+  # Returns a buffer ring for bulk reads of a file with the given number of pages,
+  # or None if the file is small enough to be read through the shared pool.
+  def scanRing(self, numFilePages):
+    if numFilePages > BufferPool.scanRingFraction * self.numPages():
+      ringSize = min(BufferPool.scanRingPages, max(1, math.floor(self.numPages() * BufferPool.scanRingFraction)))
+      return BufferRing(self, ringSize)
+
+  # Returns a frame for a new page read through a ring, by recycling the ring's
+  # oldest page once the ring is full. Returns None if the ring should grow,
+  # with a frame taken from the shared pool.
+  def ringFrame(self, ring):
+    while len(ring.pages) >= ring.size:
+      pageId = ring.pages.popleft()
+      if self.ringPages.get(pageId, None) is ring:
+        (offset, page, pinCount) = self.pageMap[pageId]
+        if pinCount == 0:
+          self.writeDirtyPages([pageId])
+          del self.pageMap[pageId]
+          del self.ringPages[pageId]
+          if offset is None:
+            # Pages of memory-mapped files only release their slot.
+            self.freeFrame(offset, page)
+            return None
+          page.onDirty = None
+          page.detach()
+          return offset
+        else:
+          self.adoptPage(pageId)
+
+  # Hands over a page read through a ring to the shared pool's replacement policy.
+  def adoptPage(self, pageId):
+    del self.ringPages[pageId]
+    self.policy.insert(pageId, self.pageMap[pageId][2] > 0)
+
+  # Flushes and frees all unpinned pages held by a ring.
+  # Pinned pages are adopted by the shared pool.
+  def releaseRing(self, ring):
+    with self.lock:
+      while ring.pages:
+        pageId = ring.pages.popleft()
+        if self.ringPages.get(pageId, None) is ring:
+          if self.pageMap[pageId][2] == 0:
+            self.flushPage(pageId)
+          else:
+            self.adoptPage(pageId)
+
+  # Adds a cached page to a ring, recycling the ring's oldest page once the ring is full.
+  def addToRing(self, pageId, ring):
+    offset = self.ringFrame(ring)
+    if offset is not None:
+      self.freeList.append(offset)
+      self.freeListLen += 1
+    self.ringPages[pageId] = ring
+    ring.pages.append(pageId)
+
+  # Stops tracking a page that is leaving the buffer pool.
+  def untrackPage(self, pageId):
+    if pageId in self.prefetchedPages:
+      del self.prefetchedPages[pageId]
+    elif self.ringPages.pop(pageId, None) is None:
+      self.policy.remove(pageId)
 
   # Pins a page.
   def pinPage(self, pageId):
-    if self.hasPage(pageId):
-      self.incrementPinCount(pageId, 1)
+    with self.lock:
+      if self.hasPage(pageId):
+        if pageId in self.prefetchedPages:
+          self.usePrefetchedPage(pageId, None)
+        self.incrementPinCount(pageId, 1)
 
   # Unpins a page.
   def unpinPage(self, pageId):
-    if self.hasPage(pageId):
-      self.incrementPinCount(pageId, -1)
+    with self.lock:
+      if self.hasPage(pageId):
+        self.incrementPinCount(pageId, -1)
 
   # Returns the pin count for a page.
   def pagePinCount(self, pageId):
@@ -134,58 +971,309 @@ class BufferPool:
       return self.pageMap[pageId][2]
 
   # Update the pin counter for a cached page.
+  # The replacement policy is informed when a page becomes pinned, and when
+  # its last pin is released, so that it only considers unpinned pages for eviction.
   def incrementPinCount(self, pageId, delta):
     (offset, page, pinCount) = self.pageMap[pageId]
-    self.pageMap[pageId] = (offset, page, pinCount+delta)
+    newPinCount = max(0, pinCount+delta)
+    self.pageMap[pageId] = (offset, page, newPinCount)
+
+    if pageId not in self.ringPages:
+      if pinCount == 0 and newPinCount > 0:
+        self.policy.pin(pageId)
+      elif pinCount > 0 and newPinCount == 0:
+        self.policy.unpin(pageId)
+
+  # Returns a page's frame to the free list.
+  # Pages are backed directly by their frame, thus we detach the page object
+  # from the frame, since callers may still hold references to it.
+  # Pages of memory-mapped files hold no frame, and remain views of the mapping.
+  def freeFrame(self, offset, page):
+    page.onDirty = None
+    if offset is not None:
+      page.detach()
+      self.freeList.append(offset)
+    self.freeListLen += 1
 
   # Removes a page from the page map, returning it to the free 
   # page list without flushing the page to the disk.
   def discardPage(self, pageId):
-    if self.hasPage(pageId):
-      (offset, _, pinCount) = self.pageMap[pageId]
-      if pinCount == 0:
-        self.freeList.append(offset)
-        self.freeListLen += 1
-        del self.pageMap[pageId]
+    with self.lock:
+      if self.hasPage(pageId):
+        (offset, page, pinCount) = self.pageMap[pageId]
+        if pinCount == 0:
+          self.markClean(pageId)
+          self.freeFrame(offset, page)
+          del self.pageMap[pageId]
+          self.untrackPage(pageId)
 
   # Removes a page from the page map, returning it to the free 
   # page list. This method also flushes the page to disk.
   def flushPage(self, pageId):
     if self.fileMgr:
-      (offset, page, pinCount) = self.getCachedPage(pageId)
-      if all(map(lambda x: x is not None, [offset, page, pinCount])):
-        if pinCount == 0:
-          self.freeList.append(offset)
-          self.freeListLen += 1
-          del self.pageMap[pageId]
-
-        if page.isDirty():
-          self.fileMgr.writePage(page)
+      with self.lock:
+        (offset, page, pinCount) = self.pageMap.get(pageId, (None, None, None))
+        if page is not None:
+          self.writeDirtyPages([pageId])
+          if pinCount == 0:
+            self.freeFrame(offset, page)
+            del self.pageMap[pageId]
+            self.untrackPage(pageId)
     else:
       raise ValueError("Uninitalized buffer pool, no file manager found")
 
-  # Evict using LRU policy, considering only unpinned pages.
-  # We implement LRU through the use of an OrderedDict, and by moving pages
-  # to the end of the ordering every time it is accessed through getPage()
+  # Evict the page chosen by the replacement policy, considering only unpinned pages.
+  # If all pages tracked by the policy are pinned, we fall back to evicting an
+  # unpinned page held by a ring (e.g., from an abandoned scan).
   def evictPage(self):
-    if self.pageMap:
-      # Find an unpinned page to evict.
-      pageToEvict = None
-      for (pageId, (_, _, pinCount)) in self.pageMap.items():
-        if pinCount == 0:
-          pageToEvict = pageId
-          break
+    with self.lock:
+      pageToEvict = next(iter(self.prefetchedPages), None)
+      if pageToEvict is None:
+        pageToEvict = self.policy.victim()
+      if pageToEvict is None:
+        pageToEvict = next((pId for pId in self.ringPages if self.pageMap[pId][2] == 0), None)
 
-      if pageToEvict:
+      if pageToEvict is not None:
+        if self.isDirtyPage(pageToEvict):
+          self.writeDirtyPages(self.dirtyNeighbors(pageToEvict, BufferPool.evictionWriteWindow))
         self.flushPage(pageToEvict)
 
       else:
         raise ValueError("Could not find a page to evict in the buffer pool")
 
+  # Writes out all dirty pages, keeping them in the buffer pool.
   def clear(self):
-    for (pageId, (offset, page, _)) in self.pageMap.items():
-      if page.isDirty():
-        self.flushPage(pageId)
+    self.flushDirtyPages(includePinned=True)
+
+  # Stops the background threads and writes out all dirty pages.
+  def close(self):
+    self.stopPrefetcher()
+    self.stopWriter()
+    self.clear()
+
+
+  # Dirty page tracking
+
+  # Dirty listener for pages held in the buffer pool.
+  def markDirty(self, pageId):
+    with self.lock:
+      pageIndexes = self.dirtyPages.setdefault(pageId.fileId, set())
+      if pageId.pageIndex not in pageIndexes:
+        pageIndexes.add(pageId.pageIndex)
+        self.numDirtyPages += 1
+
+        if self.writerEnabled:
+          if self.writerThread is None:
+            self.startWriter()
+          elif self.numDirtyPages >= BufferPool.writerDirtyFraction * self.numPages():
+            self.writerWakeup.set()
+
+  def markClean(self, pageId):
+    pageIndexes = self.dirtyPages.get(pageId.fileId, None)
+    if pageIndexes is not None and pageId.pageIndex in pageIndexes:
+      pageIndexes.discard(pageId.pageIndex)
+      self.numDirtyPages -= 1
+      if not pageIndexes:
+        del self.dirtyPages[pageId.fileId]
+
+  def isDirtyPage(self, pageId):
+    return pageId.pageIndex in self.dirtyPages.get(pageId.fileId, ())
+
+  # Returns the ids of dirty unpinned pages in the same file as the given page,
+  # within the given number of pages of it.
+  def dirtyNeighbors(self, pageId, window):
+    pageIndexes = self.dirtyPages.get(pageId.fileId, ())
+    if len(pageIndexes) > 2 * window:
+      candidates = filter(lambda i: i in pageIndexes, range(max(0, pageId.pageIndex - window), pageId.pageIndex + window + 1))
+    else:
+      candidates = filter(lambda i: abs(i - pageId.pageIndex) <= window, pageIndexes)
+
+    neighbors = []
+    for pageIndex in candidates:
+      pId = PageId(pageId.fileId, pageIndex)
+      if self.pageMap[pId][2] == 0 or pId == pageId:
+        neighbors.append(pId)
+    return neighbors
+
+  # Writes out all dirty pages, or only unpinned ones, in sorted batches per file.
+  def flushDirtyPages(self, includePinned=False):
+    with self.lock:
+      pageIds = [PageId(fileId, pageIndex) for (fileId, pageIndexes) in self.dirtyPages.items() for pageIndex in pageIndexes]
+      if not includePinned:
+        pageIds = [pId for pId in pageIds if self.pageMap[pId][2] == 0]
+
+    self.writeDirtyPages(pageIds)
+
+  # Writes out the given pages if they are dirty, grouped by storage file and sorted
+  # by page offset. Pages are marked clean and packed while holding the buffer pool's lock,
+  # and then written while holding only their file's lock. Holding the file lock across
+  # the handover ensures no reader observes the file before its pending writes.
+  def writeDirtyPages(self, pageIds):
+    if not self.fileMgr:
+      raise ValueError("Uninitalized buffer pool, no file manager found")
+
+    filePages = {}
+    for pageId in pageIds:
+      filePages.setdefault(pageId.fileId, []).append(pageId)
+
+    for (fileId, filePageIds) in filePages.items():
+      rFile = self.fileMgr.storageFile(fileId)
+      with self.lock:
+        pageData = []
+        for pageId in sorted(filePageIds, key=lambda pId: pId.pageIndex):
+          if self.isDirtyPage(pageId):
+            self.markClean(pageId)
+            page = self.pageMap[pageId][1]
+            page.header.setDirty(False)
+            if rFile:
+              pageData.append((pageId, rFile.packPage(page)))
+
+        if not pageData:
+          continue
+        rFile.lock.acquire()
+
+      try:
+        rFile.writePagesData(pageData)
+      finally:
+        rFile.lock.release()
+
+
+  # Background writer
+
+  def startWriter(self):
+    with self.lock:
+      if self.writerThread is None:
+        self.writerStopping = False
+        self.writerThread   = threading.Thread(target=self.runWriter, daemon=True)
+        self.writerThread.start()
+
+  def stopWriter(self):
+    writerThread = self.writerThread
+    if writerThread is not None:
+      self.writerStopping = True
+      self.writerWakeup.set()
+      writerThread.join()
+      self.writerThread = None
+
+  def runWriter(self):
+    while not self.writerStopping:
+      self.writerWakeup.wait(self.writerInterval)
+      self.writerWakeup.clear()
+      if not self.writerStopping:
+        self.flushDirtyPages()
+
+
+  # Prefetching
+
+  # Requests that the given pages be read into the buffer pool by the prefetch worker.
+  def prefetchPages(self, pageIds):
+    if self.fileMgr and pageIds:
+      with self.lock:
+        if self.prefetchThread is None:
+          self.prefetchThread = threading.Thread(target=self.runPrefetcher, daemon=True)
+          self.prefetchThread.start()
+      self.prefetchQueue.put(list(pageIds))
+
+  # Blocks until all prefetch requests made so far have completed.
+  def waitForPrefetch(self):
+    if self.prefetchThread is not None:
+      self.prefetchQueue.join()
+
+  def stopPrefetcher(self):
+    prefetchThread = self.prefetchThread
+    if prefetchThread is not None:
+      self.prefetchQueue.put(None)
+      prefetchThread.join()
+      self.prefetchThread = None
+
+  # Processes prefetch requests until stopped. A failed request is dropped, and
+  # does not stop the worker from serving later requests.
+  def runPrefetcher(self):
+    while True:
+      pageIds = self.prefetchQueue.get()
+      try:
+        if pageIds is None:
+          break
+        filePages = {}
+        for pageId in pageIds:
+          filePages.setdefault(pageId.fileId, []).append(pageId)
+        for (fileId, filePageIds) in filePages.items():
+          self.prefetchFilePages(fileId, filePageIds)
+      except Exception:
+        pass
+      finally:
+        self.prefetchQueue.task_done()
+
+  # Reads pages of a storage file into free frames with vectored reads, without holding
+  # the buffer pool's lock during the read. Concurrent requests for these pages wait
+  # for the read to complete, and read the pages themselves if it fails.
+  def prefetchFilePages(self, fileId, pageIds):
+    rFile = self.fileMgr.storageFile(fileId)
+    if rFile is None or rFile.mapped:
+      return
+
+    # Prefetching is best-effort: any error while allocating frames, e.g., an OSError when
+    # writing out an evicted dirty page, or while reading, only releases the frames.
+    frames = []
+    with self.lock:
+      try:
+        for pageId in pageIds:
+          if self.hasPage(pageId) or pageId in self.pendingPages:
+            continue
+          if len(self.prefetchedPages) + len(frames) >= BufferPool.prefetchFraction * self.numPages():
+            break
+
+          try:
+            offset = self.allocateFrame()
+          except ValueError:
+            break
+
+          self.pendingPages[pageId] = threading.Event()
+          frames.append((pageId, offset))
+
+      except Exception:
+        self.finishPrefetch(frames, None)
+        return
+
+    if not frames:
+      return
+
+    pages = None
+    try:
+      pages = rFile.readPages([pageId for (pageId, _) in frames], \
+                              [self.poolView[offset:offset+self.pageSize] for (_, offset) in frames])
+    except Exception:
+      pass
+
+    self.finishPrefetch(frames, pages)
+
+  # Installs the pages read by a prefetch into their frames, or releases the frames
+  # if the pages could not be read, waking up any requests waiting for these pages.
+  def finishPrefetch(self, frames, pages):
+    with self.lock:
+      try:
+        for (i, (pageId, offset)) in enumerate(frames):
+          if pages is not None:
+            self.installPage(pageId, offset, pages[i], False)
+            self.prefetchedPages[pageId] = None
+            self.numPrefetched += 1
+          else:
+            self.freeList.append(offset)
+            self.freeListLen += 1
+
+      # Always wake up requests waiting for these pages.
+      finally:
+        for (pageId, _) in frames:
+          self.pendingPages.pop(pageId).set()
+
+  # Hands over a prefetched page on its first use to the replacement policy, or to a ring.
+  def usePrefetchedPage(self, pageId, ring):
+    del self.prefetchedPages[pageId]
+    self.numPrefetchHits += 1
+    if ring:
+      self.addToRing(pageId, ring)
+    else:
+      self.policy.insert(pageId, False)
 
 
 if __name__ == "__main__":
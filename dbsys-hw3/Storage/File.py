@@ -1,10 +1,11 @@
-import io, math, os, os.path, pickle, struct
+import array, io, itertools, math, mmap, os, os.path, pickle, struct, threading
 from struct import Struct
 
 from Catalog.Identifiers import PageId, FileId, TupleId
 from Catalog.Schema      import DBSchema
 from Storage.Page        import PageHeader, Page
-from Storage.SlottedPage import SlottedPageHeader, SlottedPage
+from Storage.SlottedPage import SlottedPageHeader, SlottedPage, VariableSlottedPage
+from Storage.ZoneMap     import ZoneMap
 
 class FileHeader:
   """
@@ -139,10 +140,30 @@ class StorageFile:
   to a file object as metadata.
 
   This implementation supports a readPage() and writePage() method, enabling I/O
-  for specific pages to the backing file. Allocation of new pages is handled by the
+  for specific pages to the backing file. The readPages() and writePages() methods
+  transfer many pages at once, with a single vectored system call for each run of
+  adjacent pages. Allocation of new pages is handled by the
   underlying file system (i.e. simply write the desired page, and the file system
   will grow the backing file by the desired amount).
 
+  Storage files created with 'mapped=True' serve reads from a read-only memory
+  mapping of the backing file, returning pages as views of the mapping rather than
+  copies. Such pages are copied into the buffer pool before they are modified, and
+  all writes still go through the file, keeping the mapping coherent.
+
+  The set of pages with free space is saved to a sidecar file when the storage file
+  is closed, and loaded when reopening it. The sidecar is removed once loaded, so
+  that a file which was not closed cleanly has its page headers scanned instead.
+
+  Tuples may be appended in bulk with bulkLoad(), which packs full pages in memory
+  and writes them past the end of the file, bypassing the buffer pool.
+
+  Storage files created with 'zoneMaps=True' maintain a zone map of the minimum and
+  maximum values of each numeric column per page, through the file's tuple operations.
+  Page iterators given field ranges skip pages that cannot hold matching tuples. As with
+  free pages, the zone map is kept in a sidecar file that is consumed when the file is
+  opened, and rebuilt from the pages if the file was not closed cleanly.
+
   Storage files may also serialize their metadata using the pack() and unpack(),
   allowing their metadata to be written to disk when persisting the database catalog.
 
@@ -213,6 +234,21 @@ class StorageFile:
   >>> f.pageOffset(pIn.pageId) == f.header.size
   True
 
+  # Read and write several pages at once, in any order.
+  >>> buffers = [bytearray(f.pageSize()) for _ in range(2)]
+  >>> [pg.pageId.pageIndex for pg in f.readPages([pId1, pId], buffers)]
+  [1, 0]
+
+  >>> [schema.unpack(tup).id for tup in f.readPages([pId1], buffers[:1])[0]][:3]
+  [10, 11, 12]
+
+  >>> f.pageRuns([pId1, pId, PageId(fId, 3)])
+  [[1, 0], [2]]
+
+  >>> f.writePages(f.readPages([pId, pId1], buffers))
+  >>> [schema.unpack(tup).id for tup in f.readPage(pId, pageBuffer)][:3]
+  [0, 1, 2]
+
   # Test page header iterator
   >>> [p[1].usedSpace() for p in f.headers()]
   [80, 80]
@@ -229,12 +265,99 @@ class StorageFile:
   >>> (bp.numPages() - bp.numFreePages()) == 2
   True
 
+  # Scans of files that are large relative to the buffer pool use a ring of
+  # frames, leaving the rest of the buffer pool intact.
+  >>> bp.clear()
+  >>> smallBp = Storage.BufferPool.BufferPool(poolSize=4*f.pageSize())
+  >>> smallBp.setFileManager(fm)
+  >>> f.bufferPool = smallBp
+  >>> [p[1].pageId.pageIndex for p in f.pages()]
+  [0, 1]
+  >>> smallBp.numFreePages()
+  4
+  >>> f.bufferPool = bp
+
+  # Bulk loading appends full pages after the existing ones.
+  >>> numTuples = f.numTuples()
+  >>> tupleIds = f.bulkLoad(schema.pack(schema.instantiate(i, i+20)) for i in range(20, 2020))
+  >>> f.numPages(), f.numTuples() - numTuples, tupleIds[-1].pageId.pageIndex
+  (4, 2000, 3)
+
+  >>> [schema.unpack(tup).id for tup in f.tuples()][-3:]
+  [2017, 2018, 2019]
+  >>> pId3 = PageId(fId, 3)
+  >>> pId3 in f.freePages, f.readPage(pId3, pageBuffer).header.numTuples() == len(tupleIds) % f.bulkLoadCapacity()
+  (True, True)
+
+  # Memory-mapped storage files return read-only pages sharing the mapping.
+  >>> mf = StorageFile(bufferPool=bp, fileId=fId, filePath=f.path, mode="update", mapped=True)
+  >>> mp = mf.readPage(pId1, None)
+  >>> mp.isReadOnly()
+  True
+  >>> [schema.unpack(tup).id for tup in mp][:3]
+  [10, 11, 12]
+
+  # Writes through the file are visible in pages read from the mapping.
+  >>> wp = mf.readPage(pId1, pageBuffer)
+  >>> wp = mf.pageClass().unpack(pId1, bytearray(wp.getbuffer()))
+  >>> wp.deleteTuple(TupleId(pId1, 0))
+  >>> mf.writePage(wp)
+  >>> [schema.unpack(tup).id for tup in mf.readPage(pId1, None)][:3]
+  [11, 12, 13]
+  >>> mf.close()
+
+  # Reopening a closed file loads its free pages without scanning its page headers.
+  >>> os.path.exists(mf.freeSpaceMapPath())
+  True
+  >>> mf = StorageFile(bufferPool=bp, fileId=fId, filePath=f.path, mode="update")
+  >>> sorted(pId.pageIndex for pId in mf.freePages), os.path.exists(mf.freeSpaceMapPath())
+  ([0, 1, 3], False)
+  >>> mf.close()
+
+  # Relations with variable-length fields store their tuples with their actual length.
+  >>> vschema = DBSchema('vemployee', [('id', 'int'), ('name', 'varchar(100)')])
+  >>> fm.createRelation(vschema.name, vschema)
+  >>> (_, vf) = fm.relationFile(vschema.name)
+  >>> vf.pageClass().__name__
+  'VariableSlottedPage'
+  >>> vIds = vf.bulkLoad(vschema.pack(vschema.instantiate(i, 'e' * (i % 100))) for i in range(1000))
+  >>> vf.numPages(), vf.numTuples(), len(set(vIds))
+  (8, 1000, 1000)
+  >>> vId = vf.insertTuple(vschema.pack(vschema.instantiate(1000, 'f')))
+  >>> vId.pageId.pageIndex in [p.pageIndex for p in vf.freePages]
+  True
+  >>> [vschema.unpack(tup).id for tup in vf.tuples()] == list(range(1001))
+  True
+
   ## Clean up the doctest
   >>> shutil.rmtree(Storage.FileManager.FileManager.defaultDataDir)
   """
 
   defaultPageClass = SlottedPage
 
+  # Page class used by default for schemas with variable-length fields.
+  variablePageClass = VariableSlottedPage
+
+  # Zone map sidecar files hold the per-page bounds of the file's numeric columns.
+  zoneMapSuffix = ".zm"
+
+  # Free space map sidecar files hold the number of pages in the storage file,
+  # the number of free pages, and the free page indexes.
+  freeSpaceMapSuffix = ".fsm"
+  freeSpaceMapHeader = Struct("QQ")
+
+  # Whether the platform supports vectored positional I/O, and the maximum number
+  # of buffers passed to a single vectored call.
+  vectoredIO    = hasattr(os, "preadv") and hasattr(os, "pwritev")
+  maxIOVectors  = min(1024, os.sysconf("SC_IOV_MAX")) if hasattr(os, "sysconf") and "SC_IOV_MAX" in os.sysconf_names else 16
+
+  # Number of pages written together when bulk loading.
+  bulkLoadBatchPages = 64
+
+  # Initial and maximum number of pages prefetched by sequential read-ahead.
+  initialReadAhead = 4
+  maxReadAhead     = 32
+
   def __init__(self, **kwargs):
     other = kwargs.get("other", None)
     if other:
@@ -248,6 +371,8 @@ class StorageFile:
       fileId   = kwargs.get("fileId", None)
       filePath = kwargs.get("filePath", None)
       mode     = kwargs.get("mode", None)
+      mapped   = kwargs.get("mapped", False)
+      zoneMaps = kwargs.get("zoneMaps", False)
       existing = os.path.exists(filePath)
 
       if fileId and filePath:
@@ -257,8 +382,8 @@ class StorageFile:
         if not existing and mode.lower() == "create":
           ioMode    = "w+b"
           pageSize  = kwargs.get("pageSize", io.DEFAULT_BUFFER_SIZE)
-          pageClass = kwargs.get("pageClass", StorageFile.defaultPageClass)
           schema    = kwargs.get("schema", None)
+          pageClass = kwargs.get("pageClass", None) or StorageFile.schemaPageClass(schema)
           if pageSize and pageClass and schema:
             self.header   = FileHeader(pageSize=pageSize, pageClass=pageClass, schema=schema)
             initHeader    = True
@@ -283,13 +408,20 @@ class StorageFile:
           self.file        = io.BufferedRandom(io.FileIO(self.path, ioMode), buffer_size=pageSize)
           self.binrepr     = Struct("H"+str(FileId.binrepr.size)+"s"+str(len(self.path))+"s")
           self.freePages   = set()
+          self.lock        = threading.RLock()
+          self.mapped      = mapped
+          self.mapping     = None
+          self.zoneMap     = ZoneMap(self.schema()) if zoneMaps else None
 
           page = self.pageClass()(pageId=self.pageId(0), buffer=bytes(self.pageSize()), schema=self.schema())
           self.pageHdrSize = page.header.headerSize()
 
-          if initFreePages:
+          if initFreePages and not self.loadFreePages():
             self.initializeFreePages()
 
+          if self.zoneMap and initFreePages and not self.loadZoneMap():
+            self.initializeZoneMap()
+
           if initHeader:
             self.refreshFileHeader()
 
@@ -306,14 +438,19 @@ class StorageFile:
     self.file        = other.file
     self.binrepr     = other.binrepr
     self.freePages   = other.freePages
+    self.lock        = other.lock
+    self.mapped      = other.mapped
+    self.mapping     = other.mapping
+    self.zoneMap     = other.zoneMap
     self.pageHdrSize = other.pageHdrSize
 
   # Refreshes the file header on disk.
   def refreshFileHeader(self):
     if self.file and self.header:
-      self.file.seek(0)
-      self.header.toFile(self.file)
-      self.file.flush()
+      with self.lock:
+        self.file.seek(0)
+        self.header.toFile(self.file)
+        self.file.flush()
 
   # Intialize the free page directory by reading all headers and
   # checking if the page has free space.
@@ -323,13 +460,121 @@ class StorageFile:
         self.freePages.add(pId)
 
   # File control
+  # File I/O is guarded by the file's lock, since the buffer pool may write
+  # pages from a background thread.
   def flush(self):
-    self.file.flush()
+    with self.lock:
+      self.file.flush()
 
   def close(self):
-    if not self.file.closed:
-      self.refreshFileHeader()
-      self.file.close()
+    with self.lock:
+      if not self.file.closed:
+        self.refreshFileHeader()
+        self.saveFreePages()
+        self.saveZoneMap()
+        self.file.close()
+      self.unmap()
+
+  # Free space map persistence
+
+  def freeSpaceMapPath(self):
+    return self.path + StorageFile.freeSpaceMapSuffix
+
+  # Writes the free page directory to the sidecar file.
+  def saveFreePages(self):
+    indexes = array.array('Q', sorted(pId.pageIndex for pId in self.freePages))
+    fsmPath = self.freeSpaceMapPath()
+    with open(fsmPath + ".tmp", 'wb') as f:
+      f.write(StorageFile.freeSpaceMapHeader.pack(self.numPages(), len(indexes)))
+      f.write(indexes.tobytes())
+    os.replace(fsmPath + ".tmp", fsmPath)
+
+  # Loads the free page directory from the sidecar file, and removes the sidecar.
+  # Returns whether a sidecar matching the file's current number of pages was found.
+  def loadFreePages(self):
+    fsmPath = self.freeSpaceMapPath()
+    if not os.path.exists(fsmPath):
+      return False
+
+    with open(fsmPath, 'rb') as f:
+      data = f.read()
+    os.remove(fsmPath)
+
+    hdrRepr = StorageFile.freeSpaceMapHeader
+    if len(data) < hdrRepr.size:
+      return False
+
+    (numPages, numFree) = hdrRepr.unpack_from(data)
+    indexes = array.array('Q')
+    indexes.frombytes(data[hdrRepr.size:hdrRepr.size + numFree * indexes.itemsize])
+    if numPages != self.numPages() or len(indexes) != numFree:
+      return False
+
+    self.freePages.update(map(self.pageId, indexes))
+    return True
+
+  # Zone map persistence
+
+  def zoneMapPath(self):
+    return self.path + StorageFile.zoneMapSuffix
+
+  # Writes the zone map to its sidecar file, if the file has a zone map.
+  def saveZoneMap(self):
+    if self.zoneMap:
+      zmPath = self.zoneMapPath()
+      with open(zmPath + ".tmp", 'wb') as f:
+        f.write(self.zoneMap.pack())
+      os.replace(zmPath + ".tmp", zmPath)
+
+  # Loads the zone map from its sidecar file, and removes the sidecar.
+  # Returns whether a zone map covering the file's current pages was found.
+  def loadZoneMap(self):
+    zmPath = self.zoneMapPath()
+    if not os.path.exists(zmPath):
+      return False
+
+    with open(zmPath, 'rb') as f:
+      data = f.read()
+    os.remove(zmPath)
+
+    zoneMap = ZoneMap.unpack(self.schema(), data)
+    if zoneMap is None or zoneMap.numPages() != self.numPages():
+      return False
+
+    self.zoneMap = zoneMap
+    return True
+
+  # Rebuilds the zone map by reading every page of the file.
+  def initializeZoneMap(self):
+    self.zoneMap = ZoneMap(self.schema())
+    for (pId, page) in self.directPages():
+      self.zoneMap.summarize(pId.pageIndex, page)
+
+  # Returns whether the given page may hold tuples within the given field ranges.
+  def pageMayMatch(self, pageIndex, ranges):
+    return self.zoneMap is None or not ranges or self.zoneMap.mayMatch(pageIndex, ranges)
+
+  # Memory mapping
+
+  # Returns a read-only view of a page in the file's mapping, remapping the file
+  # if it has grown past the current mapping. Earlier mappings remain valid while
+  # pages still refer to them.
+  def mappedView(self, pageId):
+    (start, end) = self.pageRange(pageId)
+    with self.lock:
+      if self.mapping is None or len(self.mapping) < end:
+        self.file.flush()
+        self.mapping = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+      return memoryview(self.mapping)[start:end]
+
+  def unmap(self):
+    if self.mapping is not None:
+      try:
+        self.mapping.close()
+      except BufferError:
+        # Pages still refer to the mapping, which is released once they are garbage collected.
+        pass
+      self.mapping = None
 
   # Storage file helpers
   def pageId(self, pageIndex):
@@ -378,9 +623,10 @@ class StorageFile:
   # Reads a page header from disk.
   def readPageHeader(self, pageId):
     if self.validPageId(pageId):
-      self.file.seek(self.pageOffset(pageId))
       packedHdr = bytearray(self.pageHeaderSize())
-      bytesRead = self.file.readinto(packedHdr)
+      with self.lock:
+        self.file.seek(self.pageOffset(pageId))
+        bytesRead = self.file.readinto(packedHdr)
       if bytesRead == self.pageHeaderSize():
         return self.pageClass().headerClass.unpack(packedHdr)
       else:
@@ -392,18 +638,28 @@ class StorageFile:
   # The page must already exist, that is we cannot extend the file with only a page header.
   def writePageHeader(self, page):
     if isinstance(page, self.pageClass()) and self.validPageId(pageId):
-      self.file.seek(self.pageOffset(page.pageId))
-      self.file.write(page.header.pack())
+      with self.lock:
+        self.file.seek(self.pageOffset(page.pageId))
+        self.file.write(page.header.pack())
     else:
       raise ValueError("Invalid page type or page id while writing a header")
 
 
   # Page operations
 
+  # Reads a page into the given buffer. For memory-mapped files, the page is instead
+  # a read-only view of the mapping, and the buffer is not used.
   def readPage(self, pageId, bufferForPage):
-    if self.validPageId(pageId) and self.validBuffer(bufferForPage):
-      self.file.seek(self.pageOffset(pageId))
-      bytesRead = self.file.readinto(bufferForPage)
+    if self.mapped and self.validPageId(pageId):
+      page = self.pageClass().unpack(pageId, self.mappedView(pageId), readOnly=True)
+      if page.header.hasFreeTuple() and pageId not in self.freePages:
+        self.freePages.add(pageId)
+      return page
+
+    elif self.validPageId(pageId) and self.validBuffer(bufferForPage):
+      with self.lock:
+        self.file.seek(self.pageOffset(pageId))
+        bytesRead = self.file.readinto(bufferForPage)
       if bytesRead == self.pageSize():
         page = self.pageClass().unpack(pageId, bufferForPage)
         # Refresh the free page list based on the on-disk header contents.
@@ -417,22 +673,189 @@ class StorageFile:
 
   def writePage(self, page):
     if isinstance(page, self.pageClass()):
-      self.file.seek(self.pageOffset(page.pageId))
-      self.file.write(page.pack())
-      # Refresh the free page list based on the in-memory header contents.
-      # This is needed if the page has been directly modified while resident in the buffer pool.
-      if not page.header.hasFreeTuple():
-        self.freePages.discard(page.pageId)
+      self.writePageData(page.pageId, self.packPage(page))
     else:
       raise ValueError("Incompatible page type during writePage")
 
+  # Packs a page for writing to disk.
+  def packPage(self, page):
+    pageData = page.pack()
+    # Refresh the free page list based on the in-memory header contents.
+    # This is needed if the page has been directly modified while resident in the buffer pool.
+    if not page.header.hasFreeTuple():
+      self.freePages.discard(page.pageId)
+    return pageData
+
+  # Writes a packed page to disk.
+  # Memory-mapped files flush the write immediately, for it to be visible in the mapping.
+  def writePageData(self, pageId, pageData):
+    with self.lock:
+      self.file.seek(self.pageOffset(pageId))
+      self.file.write(pageData)
+      if self.mapped:
+        self.file.flush()
+
+  # Reads the given pages into the corresponding buffers, returning the pages in the same order.
+  # Runs of adjacent pages are each read with a single vectored read.
+  def readPages(self, pageIds, buffersForPages):
+    pageIds = list(pageIds)
+    buffersForPages = list(buffersForPages)
+    if self.mapped:
+      return [self.readPage(pageId, buffer) for (pageId, buffer) in zip(pageIds, buffersForPages)]
+
+    if len(pageIds) != len(buffersForPages) \
+        or not all(map(self.validPageId, pageIds)) or not all(map(self.validBuffer, buffersForPages)):
+      raise ValueError("Invalid page ids or page buffers")
+
+    if not StorageFile.vectoredIO:
+      return [self.readPage(pageId, buffer) for (pageId, buffer) in zip(pageIds, buffersForPages)]
+
+    with self.lock:
+      # Flushing writes out any buffered data, and discards the file object's read buffer.
+      self.file.flush()
+      for run in self.pageRuns(pageIds):
+        offset    = self.pageOffset(pageIds[run[0]])
+        buffers   = [buffersForPages[i] for i in run]
+        bytesRead = os.preadv(self.file.fileno(), buffers, offset)
+        if bytesRead != len(run) * self.pageSize():
+          raise ValueError("Read a partial page")
+
+    pages = []
+    for (pageId, buffer) in zip(pageIds, buffersForPages):
+      page = self.pageClass().unpack(pageId, buffer)
+      if page.header.hasFreeTuple() and pageId not in self.freePages:
+        self.freePages.add(pageId)
+      pages.append(page)
+    return pages
+
+  # Writes the given pages, with a single vectored write for each run of adjacent pages.
+  def writePages(self, pages):
+    pageData = []
+    for page in pages:
+      if isinstance(page, self.pageClass()):
+        pageData.append((page.pageId, self.packPage(page)))
+      else:
+        raise ValueError("Incompatible page type during writePages")
+    self.writePagesData(pageData)
+
+  # Writes a list of page id and packed page pairs to disk.
+  def writePagesData(self, pageData):
+    if not StorageFile.vectoredIO:
+      for (pageId, data) in pageData:
+        self.writePageData(pageId, data)
+      return
+
+    with self.lock:
+      self.file.flush()
+      for run in self.pageRuns([pageId for (pageId, _) in pageData]):
+        offset  = self.pageOffset(pageData[run[0]][0])
+        buffers = [memoryview(pageData[i][1]) for i in run]
+        while buffers:
+          written = os.pwritev(self.file.fileno(), buffers, offset)
+          offset += written
+          # Drop the fully written buffers, and retry the remainder of a partial write.
+          while buffers and written >= len(buffers[0]):
+            written -= len(buffers[0])
+            buffers.pop(0)
+          if buffers:
+            buffers[0] = buffers[0][written:]
+
+  # Groups the positions of the given page ids into runs of adjacent pages, in page order.
+  # Each run lists positions in the input, and holds at most maxIOVectors pages.
+  def pageRuns(self, pageIds):
+    order = sorted(range(len(pageIds)), key=lambda i: pageIds[i].pageIndex)
+    runs  = []
+    for i in order:
+      if runs and len(runs[-1]) < StorageFile.maxIOVectors \
+          and pageIds[runs[-1][-1]].pageIndex + 1 == pageIds[i].pageIndex:
+        runs[-1].append(i)
+      else:
+        runs.append([i])
+    return runs
+
   # Adds a new page to the file by writing past its end.
   def allocatePage(self):
-    pId = self.pageId(self.numPages())
-    page = self.pageClass()(pageId=pId, buffer=bytes(self.pageSize()), schema=self.schema())
-    self.writePage(page)
-    self.file.flush()
-    return page
+    with self.lock:
+      pId = self.pageId(self.numPages())
+      page = self.pageClass()(pageId=pId, buffer=bytes(self.pageSize()), schema=self.schema())
+      self.writePage(page)
+      self.file.flush()
+      if self.zoneMap:
+        self.zoneMap.ensurePage(pId.pageIndex)
+      return page
+
+  # Appends the given packed tuples in new pages, filling each page before starting the next.
+  # Pages are built outside the buffer pool, and written in batches of adjacent pages.
+  # The file header's tuple count is updated once. Returns the ids of the loaded tuples.
+  def bulkLoad(self, tuples):
+    return self.appendPages(StorageFile.packPages(self.pageClass(), self.schema(), self.pageSize(), tuples))
+
+  # Appends packed pages after the last page of the file, bypassing the buffer pool.
+  # Pages are given as pairs of packed page data and the number of tuples in the page,
+  # as produced by packPages(). Returns the ids of the tuples in the appended pages.
+  def appendPages(self, pages):
+    tupleIds = []
+    pageData = []
+
+    with self.lock:
+      self.file.flush()
+      nextPageIndex = self.numPages()
+      for (data, numTuples) in itertools.chain(pages, [(None, 0)]):
+        if data is not None:
+          pId = self.pageId(nextPageIndex)
+          pageData.append((pId, data))
+          tupleIds.extend(TupleId(pId, i) for i in range(numTuples))
+          page = self.pageClass().unpack(pId, data, readOnly=True)
+          if page.header.hasFreeTuple():
+            self.freePages.add(pId)
+          if self.zoneMap:
+            self.zoneMap.summarize(pId.pageIndex, page)
+          nextPageIndex += 1
+
+        if len(pageData) == StorageFile.bulkLoadBatchPages or (data is None and pageData):
+          self.writePagesData(pageData)
+          pageData = []
+
+      self.header.numTuples += len(tupleIds)
+      self.refreshFileHeader()
+
+    return tupleIds
+
+  # Packs tuples into full pages, yielding pairs of packed page data and the number of
+  # tuples in the page. This does not require a storage file, so that pages may be
+  # packed by other processes.
+  # Tuples are gathered up to the page's tuple capacity, and any tuples that do not fit
+  # in a page of variable-length tuples are carried over to the next page.
+  @staticmethod
+  def packPages(pageClass, schema, pageSize, tuples):
+    pageId     = PageId(FileId(0), 0)
+    capacity   = StorageFile.pageTupleCapacity(pageClass, schema, pageSize)
+    pageTuples = []
+    for tupleData in itertools.chain(tuples, [None]):
+      if tupleData is not None:
+        pageTuples.append(tupleData)
+      while len(pageTuples) >= capacity or (tupleData is None and pageTuples):
+        page = pageClass(pageId=pageId, buffer=bytearray(pageSize), schema=schema)
+        numTuples = len(page.insertTuples(pageTuples))
+        page.header.setDirty(False)
+        yield (page.pack(), numTuples)
+        pageTuples = pageTuples[numTuples:]
+
+  # Returns the number of tuples held by a full page of the given class, schema and size.
+  # For pages of variable-length tuples, this is an upper bound.
+  @staticmethod
+  def pageTupleCapacity(pageClass, schema, pageSize):
+    page = pageClass(pageId=PageId(FileId(0), 0), buffer=bytes(pageSize), schema=schema)
+    return page.header.tupleCapacity()
+
+  # Returns the number of tuples held by a full page of this file.
+  def bulkLoadCapacity(self):
+    return StorageFile.pageTupleCapacity(self.pageClass(), self.schema(), self.pageSize())
+
+  # Returns the page class used by default for relations with the given schema.
+  @staticmethod
+  def schemaPageClass(schema):
+    return StorageFile.variablePageClass if schema and schema.variable else StorageFile.defaultPageClass
 
   # Returns the page id of the first page with available space.
   def availablePage(self):
@@ -443,15 +866,23 @@ class StorageFile:
 
 
   # Tuple operations
+  # Pages are pinned while being modified, since the buffer pool's prefetch worker may evict
+  # unpinned pages at any time. Pages of memory-mapped files are copied into the buffer pool
+  # before they are modified.
 
   # Inserts the given tuple to the first available page.
   def insertTuple(self, tupleData):
     self.header.insertTuple()
     pId  = self.availablePage()
-    page = self.bufferPool.getPage(pId)
-    tupleId = page.insertTuple(tupleData)
-    if not page.header.hasFreeTuple():
-      self.freePages.discard(pId)
+    page = self.bufferPool.getWritablePage(pId, pinned=True)
+    try:
+      tupleId = page.insertTuple(tupleData)
+      if not page.header.hasFreeTuple():
+        self.freePages.discard(pId)
+      if self.zoneMap and tupleId:
+        self.zoneMap.addTuple(pId.pageIndex, tupleData)
+    finally:
+      self.bufferPool.unpinPage(pId)
     return tupleId
 
   # Removes the tuple by its id, tracking if the page is now free
@@ -459,20 +890,30 @@ class StorageFile:
   def deleteTuple(self, tupleId):
     self.header.deleteTuple()
     pId       = tupleId.pageId
-    page      = self.bufferPool.getPage(pId)
-    tupleData = page.getTuple(tupleId)
-    page.deleteTuple(tupleId)
-    if page.header.hasFreeTuple() and pId not in self.freePages:
-      self.freePages.add(pId)
+    page      = self.bufferPool.getWritablePage(pId, pinned=True)
+    try:
+      tupleData = page.getTuple(tupleId)
+      page.deleteTuple(tupleId)
+      if page.header.hasFreeTuple() and pId not in self.freePages:
+        self.freePages.add(pId)
+      if self.zoneMap:
+        self.zoneMap.summarize(pId.pageIndex, page)
+    finally:
+      self.bufferPool.unpinPage(pId)
     return tupleData
 
   # Updates the tuple by id
   # Returns the updated tuple for further operations (e.g., index maintenance)
   def updateTuple(self, tupleId, tupleData):
     pId     = tupleId.pageId
-    page    = self.bufferPool.getPage(pId)
-    oldData = page.getTuple(tupleId)
-    page.putTuple(tupleId, tupleData)
+    page    = self.bufferPool.getWritablePage(pId, pinned=True)
+    try:
+      oldData = page.getTuple(tupleId)
+      page.putTuple(tupleId, tupleData)
+      if self.zoneMap:
+        self.zoneMap.summarize(pId.pageIndex, page)
+    finally:
+      self.bufferPool.unpinPage(pId)
     return oldData
 
 
@@ -483,12 +924,19 @@ class StorageFile:
 
   # Page iterator, using the buffer pool.
   # This can optionally pin the pages in the buffer pool while accessing them.
-  def pages(self, pinned=False):
-    return self.FilePageIterator(self, pinned)
+  # Files large relative to the buffer pool are read through a private ring of
+  # frames, to avoid flushing the rest of the buffer pool during a scan.
+  # When enabled in the buffer pool, once a scan misses on consecutive pages, the iterator reads ahead by
+  # prefetching a window of upcoming pages, doubling the window each time
+  # the scan reaches the previous window.
+  # Given field ranges, the iterator skips pages that the file's zone map excludes.
+  def pages(self, pinned=False, ranges=None):
+    return self.FilePageIterator(self, pinned, ranges)
 
   # Unbuffered page iterator.
   # Use with care, direct pages are not authoritative if the
-  # page is present in the buffer pool.
+  # page is present in the buffer pool. Also, each page shares
+  # its buffer with the iterator, and is only valid until the next page is read.
   def directPages(self):
     return self.FileDirectPageIterator(self)
 
@@ -543,22 +991,69 @@ class StorageFile:
         raise StopIteration
 
   class FilePageIterator:
-    def __init__(self, storageFile, pinned=False):
+    def __init__(self, storageFile, pinned=False, ranges=None):
       self.currentPageIdx = 0
       self.storageFile    = storageFile
       self.pinned         = pinned
+      self.ranges         = ranges
+      self.numPages       = storageFile.numPages()
+      self.ring           = storageFile.bufferPool.scanRing(self.numPages)
+
+      # Read-ahead state: the last page index read from disk by the iterator, and the current
+      # window, its end and marker (the first page of the most recently prefetched window).
+      self.lastMiss       = None
+      self.readAheadSize  = 0
+      self.readAheadEnd   = 0
+      self.readAheadMark  = None
 
     def __iter__(self):
       return self
 
     def __next__(self):
+      while self.currentPageIdx < self.numPages \
+              and not self.storageFile.pageMayMatch(self.currentPageIdx, self.ranges):
+        self.currentPageIdx += 1
+
       pId = self.storageFile.pageId(self.currentPageIdx)
       if self.storageFile.validPageId(pId):
+        (page, hit) = self.storageFile.bufferPool.getPageWithHit(pId, self.pinned, self.ring)
+        self.readAhead(self.currentPageIdx, hit)
         self.currentPageIdx += 1
-        return (pId, self.storageFile.bufferPool.getPage(pId, self.pinned))
+        return (pId, page)
       else:
+        if self.ring:
+          self.ring.release()
+          self.ring = None
         raise StopIteration
 
+    # Starts read-ahead on two consecutive misses, and extends it by the next,
+    # doubled window once the scan reaches the marker of the current window.
+    def readAhead(self, pageIndex, hit):
+      if not self.storageFile.bufferPool.readAhead:
+        return
+
+      if not hit and pageIndex >= self.readAheadEnd:
+        sequential    = self.lastMiss is not None and self.lastMiss == pageIndex - 1
+        self.lastMiss = pageIndex
+        if sequential:
+          self.readAheadSize = StorageFile.initialReadAhead
+          self.readAheadEnd  = pageIndex + 1
+          self.prefetchWindow()
+
+      elif pageIndex == self.readAheadMark:
+        self.readAheadSize = min(2 * self.readAheadSize, StorageFile.maxReadAhead)
+        self.prefetchWindow()
+
+    def prefetchWindow(self):
+      start = self.readAheadEnd
+      end   = min(start + self.readAheadSize, self.numPages)
+      if start < end:
+        self.storageFile.bufferPool.prefetchPages(map(self.storageFile.pageId, range(start, end)))
+        self.readAheadEnd  = end
+        self.readAheadMark = start
+      else:
+        self.readAheadMark = None
+
   class FileDirectPageIterator:
     def __init__(self, storageFile):
       self.currentPageIdx = 0
@@ -13,6 +13,9 @@ class FileManager:
   relation name to a file identifier, and the second mapping a file
   identifier to the storage file object.
 
+  Relations may be created with 'mapped=True' to read their storage file
+  through a memory mapping, which suits read-mostly relations.
+
   >>> import Storage.BufferPool
   >>> schema = DBSchema('employee', [('id', 'int'), ('age', 'int')])
   >>> bp = Storage.BufferPool.BufferPool()
@@ -39,6 +42,33 @@ class FileManager:
   >>> bp.setFileManager(fm)
   >>> list(fm.relations())
   ['employee']
+
+  # Memory-mapped relations remain mapped when restored.
+  >>> fm.createRelation('mapped', schema, mapped=True)
+  >>> fm = FileManager(bufferPool=bp)
+  >>> bp.setFileManager(fm)
+  >>> fm.relationFile('mapped')[1].mapped, fm.relationFile('employee')[1].mapped
+  (True, False)
+
+  # Relations may be created with their own page class, which is kept in their storage file.
+  >>> from Storage.PaxPage import PaxPage
+  >>> fm.createRelation('columnar', schema, pageClass=PaxPage)
+  >>> fm = FileManager(bufferPool=bp)
+  >>> bp.setFileManager(fm)
+  >>> fm.relationFile('columnar')[1].pageClass().__name__, fm.relationFile('employee')[1].pageClass().__name__
+  ('PaxPage', 'SlottedPage')
+
+  # Zone maps are maintained by tuple operations, and kept across restarts.
+  >>> fm.createRelation('zoned', schema, zoneMaps=True)
+  >>> for i in range(2000):
+  ...   _ = fm.insertTuple('zoned', schema.pack(schema.instantiate(i, 20 + i % 50)))
+  >>> fm.close()
+  >>> fm = FileManager(bufferPool=bp)
+  >>> bp.setFileManager(fm)
+  >>> [pId.pageIndex for (pId, _) in fm.pages('zoned', {'id': (1500, 1510)})]
+  [1]
+  >>> [pId.pageIndex for (pId, _) in fm.pages('zoned', {'age': (None, 19)})]
+  []
   """
 
   defaultDataDir     = "data/"
@@ -77,10 +107,13 @@ class FileManager:
         if restoring:
           self.relationFiles = dict([(i[0], FileId(i[1])) for i in kwargs["restore"][0]])
           for i in kwargs["restore"][1]:
-            fId   = FileId(i[0])
-            fPath = i[1]
+            fId     = FileId(i[0])
+            fPath   = i[1]
+            fMapped = i[2] if len(i) > 2 else False
+            fZoned  = i[3] if len(i) > 3 else False
             self.fileMap[fId] = \
-              self.fileClass(bufferPool=self.bufferPool, fileId=fId, filePath=fPath, mode="update")
+              self.fileClass(bufferPool=self.bufferPool, fileId=fId, filePath=fPath, mode="update", \
+                             mapped=fMapped, zoneMaps=fZoned)
 
       else:
         self.restore()
@@ -100,7 +133,7 @@ class FileManager:
   # This includes flushing all pages held in the buffer pool.
   def close(self):
     if self.bufferPool:
-      self.bufferPool.clear()
+      self.bufferPool.close()
 
     if self.fileMap:
       for storageFile in self.fileMap.values():
@@ -132,7 +165,10 @@ class FileManager:
   def hasRelation(self, relId):
     return relId in self.relationFiles
 
-  def createRelation(self, relId, schema):
+  # Creates a storage file for a relation, optionally reading it through a memory mapping.
+  # Relations use the given page class, or the storage file's default page class for their schema.
+  # Relations created with 'zoneMaps=True' keep per-page bounds of their numeric columns.
+  def createRelation(self, relId, schema, mapped=False, pageClass=None, zoneMaps=False):
     if relId not in self.relationFiles:
       fId = FileId(self.fileCounter)
       path = os.path.join(self.dataDir, str(self.fileCounter)+'.rel')
@@ -141,7 +177,8 @@ class FileManager:
       self.fileMap[fId] = \
         self.fileClass(bufferPool=self.bufferPool, \
                        fileId=fId, filePath=path, mode="create", \
-                       pageSize=self.defaultPageSize, schema=schema)
+                       pageSize=self.defaultPageSize, schema=schema, mapped=mapped, \
+                       pageClass=pageClass, zoneMaps=zoneMaps)
 
       self.checkpoint()
 
@@ -165,6 +202,9 @@ class FileManager:
       if not detach:
         rFile.close()
         os.remove(rFile.path)
+        for sidecarPath in [rFile.freeSpaceMapPath(), rFile.zoneMapPath()]:
+          if os.path.exists(sidecarPath):
+            os.remove(sidecarPath)
 
       self.checkpoint()
 
@@ -172,6 +212,9 @@ class FileManager:
     fId = self.relationFiles.get(relId, None) if relId else None
     return (fId, self.fileMap.get(fId, None)) if fId else (None, None)
 
+  def storageFile(self, fileId):
+    return self.fileMap.get(fileId, None) if fileId else None
+
 
   # Page operations
   def readPage(self, pageId, pageBuffer):
@@ -216,6 +259,28 @@ class FileManager:
       self.indexManager.insertTuple(relId, tupleData, tupleId)
       return tupleId
 
+  # Appends the given packed tuples to a relation in bulk, maintaining its indexes.
+  # Returns the tuple ids of the loaded tuples.
+  def bulkLoad(self, relId, tuples):
+    (_, rFile) = self.relationFile(relId)
+    if rFile:
+      return self.appendPages(relId, rFile.packPages(rFile.pageClass(), rFile.schema(), rFile.pageSize(), tuples))
+
+  # Appends packed pages to a relation, maintaining its indexes.
+  # Returns the tuple ids of the tuples in the appended pages.
+  def appendPages(self, relId, pages):
+    (_, rFile) = self.relationFile(relId)
+    if rFile and self.indexManager:
+      if self.indexManager.indexes(relId):
+        pages    = list(pages)
+        tupleIds = rFile.appendPages(pages)
+        tuples   = (tup for (pageData, _) in pages for tup in rFile.pageClass().unpack(rFile.pageId(0), pageData))
+        for (tupleData, tupleId) in zip(tuples, tupleIds):
+          self.indexManager.insertTuple(relId, tupleData, tupleId)
+        return tupleIds
+      else:
+        return rFile.appendPages(pages)
+
   def deleteTuple(self, relId, tupleId):
     rFile = self.fileMap.get(tupleId.pageId.fileIndex, None)
     if rFile and self.indexManager:
@@ -291,11 +356,11 @@ class FileManager:
     if rFile:
       return rFile.tuples()
 
-  # Page-based table scan
-  def pages(self, relId):
+  # Page-based table scan, skipping pages outside of any given field ranges.
+  def pages(self, relId, ranges=None):
     (_, rFile) = self.relationFile(relId)
     if rFile:
-      return rFile.pages()
+      return rFile.pages(ranges=ranges)
 
 
   # File manager serialization
@@ -303,7 +368,7 @@ class FileManager:
     if self.relationFiles is not None and self.fileMap is not None:
       pfileClass     = pickle.dumps(self.fileClass).decode(encoding=FileManager.checkpointEncoding)
       prelationFiles = list(map(lambda entry: (entry[0], entry[1].fileIndex), self.relationFiles.items()))
-      pfileMap       = list(map(lambda entry: (entry[0].fileIndex, entry[1].path), self.fileMap.items()))
+      pfileMap       = list(map(lambda entry: (entry[0].fileIndex, entry[1].path, entry[1].mapped, entry[1].zoneMap is not None), self.fileMap.items()))
       return json.dumps((self.dataDir, self.indexDir, pfileClass, self.fileCounter, prelationFiles, pfileMap))
 
   @classmethod
@@ -1,4 +1,3 @@
-from io import BytesIO
 import copy, math, struct
 
 from Catalog.Identifiers import TupleId
@@ -160,6 +159,11 @@ class PageHeader:
   def headerSize(self):
     return PageHeader.size
 
+  # Points the header at a new backing buffer holding the same page contents.
+  # Headers that keep views on their page's buffer must override this method.
+  def rebind(self, buffer):
+    pass
+
   # Flag operations.
   def flag(self, mask):
     return (ord(self.flags) & mask) > 0
@@ -272,6 +276,14 @@ class PageHeader:
   def useTuple(self, tupleId):
     self.useTupleIndex(tupleId.tupleIndex)
 
+  # Returns the number of tuples held by a full page.
+  def tupleCapacity(self):
+    return (self.pageCapacity - self.dataOffset()) // self.tupleSize
+
+  # Marks the first given number of tuples of an empty page as used.
+  def useTuples(self, count):
+    self.freeSpaceOffset = self.dataOffset() + count * self.tupleSize
+
   # Marks the tuple as being free.
   # In a contiguous tuple, all tuples after the given tuple id become free.
   def resetTupleIndex(self, tupleIndex):
@@ -293,20 +305,29 @@ class PageHeader:
                  freeSpaceOffset=values[2], pageCapacity=values[3])
 
 
-class Page(BytesIO):
+class Page:
   """
   A page class, representing a unit of storage for database tuples.
 
   A page includes a page identifier, and a page header containing metadata
   about the state of the page (e.g., its free space offset).
 
-  Our page class inherits from an io.BytesIO, providing it an implementation
-  of a in-memory binary stream.
-
   The page constructor requires a byte buffer in which we can store tuples.
   The user has the responsibility for constructing a suitable buffer, for
   example with Python's 'bytes()' builtin.
 
+  Pages read and write their contents directly through a memoryview on this
+  buffer, without copying it. Thus a page constructed on a writeable buffer,
+  such as a buffer pool frame, is backed by that buffer's memory. Immutable
+  buffers (e.g., 'bytes' objects) are copied once into a private bytearray.
+  A page may later be detached from its buffer, for example when its frame
+  is reused by the buffer pool, by giving it a private copy of its contents.
+
+  A page may have a dirty listener ('onDirty'), which is called with the page
+  identifier whenever the page is marked dirty. Page modifications mark the page
+  as dirty only after changing its contents, so that a concurrent writer that
+  cleans the page before writing it out never misses an update.
+
   The page also provides several methods to retrieve and modify its contents
   based on a tuple identifier, and where relevant, tuple data represented as
   an immutable sequence of bytes.
@@ -403,10 +424,41 @@ class Page(BytesIO):
   >>> [schema.unpack(tup).age for tup in p]
   [20, 22, 24, 26, 28, 30, 32, 34, 36, 38]
 
+  # Decode all tuples at once.
+  >>> p.decodeAll(schema) == [schema.unpack(tup) for tup in p] == [schema.unpack(tup) for tup in p.iterRows()]
+  True
+  >>> p.rowsAt([0, 2]) == list(p.iterRows())[0:3:2]
+  True
+
+  # Decode all tuples as a column batch, when NumPy is available.
+  >>> from Catalog.Schema import np
+  >>> np is None or p.decodeBatch(schema).tobytes() == b''.join(p.iterRows())
+  True
+
   # Check that the page's data segment has been compacted after the remove.
   >>> p.header.usedSpace() == (sizeBeforeRemove - p.header.tupleSize)
   True
 
+  # Pages on writeable buffers share their memory, and may be detached.
+  >>> frame = bytearray(p.pack())
+  >>> p3    = Page.unpack(pId, memoryview(frame))
+  >>> p3.insertTuple(schema.pack(schema.instantiate(100, 50))) is not None
+  True
+  >>> frame == p3.pack()
+  True
+
+  >>> p3.detach()
+  >>> p3.clear()
+  >>> frame == p3.pack()
+  False
+
+  # Read-only pages share immutable buffers, until relocated to a writeable buffer.
+  >>> p4 = Page.unpack(pId, bytes(frame), readOnly=True)
+  >>> p4.isReadOnly()
+  True
+  >>> p4.relocate(memoryview(bytearray(len(frame))))
+  >>> p4.isReadOnly() or p4.getvalue() != bytes(frame)
+  False
   """
 
   headerClass = PageHeader
@@ -419,8 +471,9 @@ class Page(BytesIO):
     else:
       buffer = kwargs.get("buffer", None)
       if buffer:
-        BytesIO.__init__(self, buffer)
-        self.pageId = kwargs.get("pageId", None)
+        self.buffer  = Page.pageBuffer(buffer, kwargs.get("readOnly", False))
+        self.onDirty = None
+        self.pageId  = kwargs.get("pageId", None)
         header      = kwargs.get("header", None)
 
         if self.pageId and header:
@@ -433,9 +486,40 @@ class Page(BytesIO):
         raise ValueError("No backing buffer provided to page constructor.")
 
   def fromOther(self, other):
-    BytesIO.__init__(self, other.getvalue())
-    self.pageId = copy.deepcopy(other.pageId)
+    self.buffer  = memoryview(bytearray(other.getbuffer()))
+    self.onDirty = None
+    self.pageId  = copy.deepcopy(other.pageId)
     self.header = copy.deepcopy(other.header)
+    self.header.rebind(self.buffer)
+
+  # Returns a writeable memoryview on the given buffer, copying the buffer
+  # only if it is immutable. Read-only pages share immutable buffers.
+  @staticmethod
+  def pageBuffer(buffer, readOnly=False):
+    view = buffer if isinstance(buffer, memoryview) else memoryview(buffer)
+    return memoryview(bytearray(view)) if view.readonly and not readOnly else view
+
+  def isReadOnly(self):
+    return self.buffer.readonly
+
+  # Returns the memoryview backing this page.
+  def getbuffer(self):
+    return self.buffer
+
+  # Returns a copy of the page's contents.
+  def getvalue(self):
+    return self.buffer.tobytes()
+
+  # Gives the page a private copy of its contents, releasing the buffer it was constructed on.
+  def detach(self):
+    self.buffer = memoryview(bytearray(self.buffer))
+    self.header.rebind(self.buffer)
+
+  # Copies the page's contents into the given writeable buffer, and continues on that buffer.
+  def relocate(self, buffer):
+    buffer[:] = self.buffer
+    self.buffer = buffer
+    self.header.rebind(self.buffer)
 
   # Header constructor. This can be overridden by subclasses.
   def initializeHeader(self, **kwargs):
@@ -449,69 +533,133 @@ class Page(BytesIO):
   def __iter__(self):
     return PageTupleIterator(self)
 
+  # Batch tuple access.
+
+  # Returns the page's data region, holding consecutive packed tuples.
+  def dataRegion(self):
+    return self.buffer[self.header.dataOffset():self.header.freeSpaceOffset]
+
+  # Returns the indexes of the live tuples in the data region, or None if all of its tuples are live.
+  def liveTupleIndexes(self):
+    return None
+
+  # Returns an iterator over the packed data of every live tuple in the page,
+  # copying the page's data region once.
+  def iterRows(self):
+    size    = self.header.tupleSize
+    data    = self.dataRegion().tobytes()
+    indexes = self.liveTupleIndexes()
+    return (data[i*size:(i+1)*size] for i in (range(len(data) // size) if indexes is None else indexes))
+
+  # Returns the packed data of the live tuples at the given positions in the page's iteration order,
+  # e.g., of the tuples whose instances are at these positions in the list returned by decodeAll.
+  def rowsAt(self, positions):
+    size    = self.header.tupleSize
+    data    = self.dataRegion()
+    indexes = self.liveTupleIndexes()
+    return [data[i*size:(i+1)*size].tobytes() for i in (positions if indexes is None else [indexes[p] for p in positions])]
+
+  # Returns a list of instances of the given schema for every live tuple in the page,
+  # decoded with a single struct pass over the page's data region.
+  # Callers may name the only fields they use, for pages that decode fields separately.
+  def decodeAll(self, schema, fields=None):
+    if schema.variable or schema.size != self.header.tupleSize:
+      return [schema.unpack(tupleData) for tupleData in self.iterRows()]
+    return schema.unpackAll(self.dataRegion(), self.liveTupleIndexes())
+
+  # Returns a column batch of every live tuple in the page, as a NumPy structured array
+  # decoded directly from the page's data region. This requires NumPy.
+  def decodeBatch(self, schema):
+    if schema.variable or schema.size != self.header.tupleSize:
+      return schema.unpackBatch(b''.join(self.iterRows()))
+    return schema.unpackBatch(self.dataRegion(), self.liveTupleIndexes())
+
   # Dirty bit accessors
   def isDirty(self):
     return self.header.isDirty()
 
   def setDirty(self, dirty):
     self.header.setDirty(dirty)
+    if dirty and self.onDirty:
+      self.onDirty(self.pageId)
 
   # Tuple accessor methods
+  # Tuples are returned as copies, since the page's buffer may be reused
+  # by the buffer pool once the page is evicted.
   def getTuple(self, tupleId):
     if self.header and tupleId:
       (start, end) = self.header.tupleRange(tupleId)
       if start and end:
-        return self.getbuffer()[start:end]
+        return self.buffer[start:end].tobytes()
 
   def putTuple(self, tupleId, tupleData):
     if self.header and tupleId and tupleData and self.header.validTuple(tupleData):
       (start, end) = self.header.tupleRange(tupleId)
       if start and end:
-        self.setDirty(True)
         self.getbuffer()[start:end] = tupleData
+        self.setDirty(True)
 
   def insertTuple(self, tupleData):
     if self.header and tupleData and self.header.validTuple(tupleData):
       (tupleIndex, start, end) = self.header.nextTupleRange()
       if start and end:
-        self.setDirty(True)
         self.getbuffer()[start:end] = tupleData
+        self.setDirty(True)
         return TupleId(self.pageId, tupleIndex)
 
+  # Fills an empty page with the given packed tuples, with a single copy into the page's buffer.
+  # Returns the tuple ids of the inserted tuples.
+  def insertTuples(self, tuples):
+    if self.header and len(tuples) <= self.header.tupleCapacity():
+      tupleData = b''.join(tuples)
+      if len(tupleData) != len(tuples) * self.header.tupleSize:
+        raise ValueError("Invalid tuple size while inserting tuples")
+
+      start = self.header.dataOffset()
+      self.getbuffer()[start:start+len(tupleData)] = tupleData
+      self.header.useTuples(len(tuples))
+      self.setDirty(True)
+      return [TupleId(self.pageId, i) for i in range(len(tuples))]
+    else:
+      raise ValueError("Too many tuples to insert into a page")
+
   def clearTuple(self, tupleId):
     if self.header and tupleId:
       (start, end) = self.header.tupleRange(tupleId)
       if start and end:
+        self.getbuffer()[start:end] = b'\x00' * (end - start)
         self.setDirty(True)
-        self.getbuffer()[start:end] = b'\x00' * self.header.tupleSize
 
   def deleteTuple(self, tupleId):
     if self.header and tupleId:
       (start, end) = self.header.tupleRange(tupleId)
       if start and end:
-        self.setDirty(True)
         shiftLen = self.header.freeSpaceOffset - end
         self.getbuffer()[start:start+shiftLen] = self.getbuffer()[end:end+shiftLen]
         resetTupleIndex = self.header.tupleIndex(self.header.freeSpaceOffset - self.header.tupleSize)
         self.header.resetTuple(TupleId(self.pageId, resetTupleIndex))
+        self.setDirty(True)
 
   def clear(self):
     if self.header:
       start = self.header.dataOffset()
       end   = self.header.pageCapacity
       if start and end:
-        self.setDirty(True)
         self.getbuffer()[start:end] = b'\x00' * (end-start)
+        self.setDirty(True)
 
   def pack(self):
     if self.header:
       self.getbuffer()[0:self.header.headerSize()] = self.header.pack()
       return self.getvalue()
 
+  # Constructs a page on the given buffer, without copying writeable buffers.
+  # Read-only pages are constructed on immutable buffers without copying them.
   @classmethod
-  def unpack(cls, pageId, buffer):
+  def unpack(cls, pageId, buffer, readOnly=False):
+    buffer = Page.pageBuffer(buffer, readOnly)
     header = cls.headerClass.unpack(buffer)
-    return cls(pageId=pageId, buffer=buffer, header=header)
+    return cls(pageId=pageId, buffer=buffer, header=header, readOnly=readOnly)
 
 class PageTupleIterator:
   """
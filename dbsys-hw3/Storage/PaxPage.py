@@ -0,0 +1,363 @@
+import itertools, math
+from struct import Struct
+
+from Catalog.Identifiers import TupleId
+from Storage.Page import PageHeader, PageTupleIterator
+from Storage.SlottedPage import SlottedPageHeader, SlottedPage
+
+class PaxPageHeader(SlottedPageHeader):
+  """
+  A page header for PAX (partition attributes across) pages. In addition to
+  the slot bitvector of a slotted page header, this stores the layout of the
+  page's columns, as the (offset, size) pair of each field in a packed tuple.
+
+  The data area of a PAX page is divided into one minipage per column, each
+  holding the values of its field for every slot in the page.
+
+  The binary representation of this header object is: (numSlots, slotBuffer, numColumns, columns)
+
+  >>> import io
+  >>> buffer = io.BytesIO(bytes(4096))
+  >>> ph     = PaxPageHeader(buffer=buffer.getbuffer(), tupleSize=8, columns=[(0, 4), (4, 4)])
+  >>> ph2    = PaxPageHeader.unpack(buffer.getbuffer())
+  >>> ph == ph2 and ph2.columns == [(0, 4), (4, 4)]
+  True
+
+  >>> ph.numSlots == ph.tupleCapacity() == ph.maxTuples()
+  True
+
+  # Minipages follow the header, sized to hold a value for each slot.
+  >>> ph.minipageOffsets == [ph.headerSize(), ph.headerSize() + 4 * ph.numSlots]
+  True
+
+  >>> [ph.nextFreeTuple() for i in range(3)]
+  [0, 1, 2]
+  >>> ph.numTuples()
+  3
+  """
+
+  columnCountRepr = Struct("H")
+
+  # Columns are two unsigned shorts: field offset and field size in a packed tuple
+  columnRepr      = Struct("HH")
+
+  def __init__(self, **kwargs):
+    other = kwargs.get("other", None)
+    if other:
+      self.fromOther(other)
+
+    else:
+      self.columns = kwargs.get("columns", None)
+      if self.columns:
+        super().__init__(**kwargs)
+        self.minipageOffsets = self.initializeMinipages()
+      else:
+        raise ValueError("No columns supplied for PaxPageHeader")
+
+  def __eq__(self, other):
+    return super().__eq__(other) and self.columns == other.columns
+
+  def postHeaderInitialize(self, **kwargs):
+    super().postHeaderInitialize(**kwargs)
+
+    # Push the column layout into the buffer after the slots.
+    fresh  = kwargs.get("unpacked", None) is None
+    buffer = kwargs.get("buffer", None)
+    if hasattr(self, "reprSize") and fresh and buffer:
+      buffer[self.reprSize:self.headerSize()] = self.packColumns()
+
+  def fromOther(self, other):
+    super().fromOther(other)
+    if isinstance(other, PaxPageHeader):
+      self.columns         = other.columns
+      self.minipageOffsets = other.minipageOffsets
+
+  # Parent method overrides
+  def headerSize(self):
+    return self.reprSize + self.columnsSize()
+
+  # Returns the maximum number of tuples that can be held in this page,
+  # where tuples are stored without any alignment padding between fields.
+  def maxTuples(self):
+    headerSize = PageHeader.size + SlottedPageHeader.prefixRepr.size + self.columnsSize()
+    headerPerTuple = 0.125
+    return math.floor((self.pageCapacity - headerSize) / (self.columnsWidth() + headerPerTuple))
+
+  # A full PAX page uses all of its slots.
+  def tupleCapacity(self):
+    return self.numSlots
+
+  # Tuples in PAX pages do not occupy a contiguous range of the page.
+  def tupleRange(self, tupleId):
+    return (None, None)
+
+  def pageRange(self, tupleId):
+    return (None, None)
+
+  # Marks the tuple as being used. PAX pages do not use the parent's free space offset.
+  def useTupleIndex(self, tupleIndex):
+    self.setSlot(tupleIndex, True)
+
+  def useTuples(self, count):
+    self.useSlots(count)
+
+  # PAX page specific methods
+
+  # Returns the size of the column layout in the header.
+  def columnsSize(self):
+    return PaxPageHeader.columnCountRepr.size + len(self.columns) * PaxPageHeader.columnRepr.size
+
+  # Returns the total size of a tuple's field values.
+  def columnsWidth(self):
+    return sum(size for (_, size) in self.columns)
+
+  # Returns the page offset of each column's minipage.
+  def initializeMinipages(self):
+    offsets = []
+    start   = self.headerSize()
+    for (_, size) in self.columns:
+      offsets.append(start)
+      start += size * self.numSlots
+    return offsets
+
+  # Returns whether the given slot holds a tuple.
+  def usedSlot(self, slotIndex):
+    return 0 <= slotIndex and slotIndex < self.numSlots and self.getSlot(slotIndex)
+
+  def packColumns(self):
+    return PaxPageHeader.columnCountRepr.pack(len(self.columns)) \
+             + b''.join(PaxPageHeader.columnRepr.pack(*column) for column in self.columns)
+
+  def pack(self):
+    if self.numSlots and self.slots:
+      return super().pack() + self.packColumns()
+
+  @classmethod
+  def unpack(cls, buffer):
+    parent = PageHeader.unpack(buffer)
+    brepr  = SlottedPageHeader.binrepr(buffer)
+    (numSlots, slotBuffer) = brepr.unpack_from(buffer, offset=PageHeader.size)
+
+    start      = PageHeader.size + brepr.size
+    numColumns = cls.columnCountRepr.unpack_from(buffer, offset=start)[0]
+    start     += cls.columnCountRepr.size
+    columns    = [cls.columnRepr.unpack_from(buffer, offset=start + i * cls.columnRepr.size) \
+                    for i in range(numColumns)]
+    return cls(parent=parent, buffer=buffer, numSlots=numSlots, slots=slotBuffer, \
+               columns=columns, unpacked=True)
+
+
+class PaxPage(SlottedPage):
+  """
+  A PAX page implementation, storing each column of its tuples in a separate
+  minipage. Tuples are accessed by slot index as with slotted pages, and are
+  reassembled into their packed representation when retrieved, while single
+  columns may be read directly from their minipage without touching the other
+  fields of a tuple.
+
+  PAX pages require schemas with fixed-size fields.
+
+  >>> from Catalog.Identifiers import FileId, PageId, TupleId
+  >>> from Catalog.Schema      import DBSchema
+
+  # Test harness setup.
+  >>> schema = DBSchema('employee', [('id', 'int'), ('name', 'char(3)'), ('age', 'int')])
+  >>> pId    = PageId(FileId(1), 100)
+  >>> p      = PaxPage(pageId=pId, buffer=bytes(4096), schema=schema)
+
+  # Tuples are stored without the alignment padding of their packed representation.
+  >>> p.header.numSlots > SlottedPage(pageId=pId, buffer=bytes(4096), schema=schema).header.numSlots
+  True
+
+  # Create, retrieve and update tuples.
+  >>> tIds = [p.insertTuple(schema.pack(schema.instantiate(i, 'e' + str(i), 20 + i))) for i in range(10)]
+  >>> schema.unpack(p.getTuple(tIds[1]))
+  employee(id=1, name='e1', age=21)
+
+  >>> p.putTuple(tIds[1], schema.pack(schema.instantiate(1, 'f1', 40)))
+  >>> schema.unpack(p.getTuple(tIds[1]))
+  employee(id=1, name='f1', age=40)
+
+  # Read a single column.
+  >>> [Struct('i').unpack(v)[0] for v in p.getColumn(2)]
+  [20, 40, 22, 23, 24, 25, 26, 27, 28, 29]
+
+  # Decode only some columns, and reassemble the tuples at some positions.
+  >>> [e.age for e in p.decodeAll(schema, {'age'})]
+  [20, 40, 22, 23, 24, 25, 26, 27, 28, 29]
+  >>> [schema.unpack(tup).name for tup in p.rowsAt([1, 3])]
+  ['f1', 'e3']
+
+  # Delete tuples, and iterate over the remaining ones.
+  >>> p.deleteTuple(tIds[0])
+  >>> [schema.unpack(tup).id for tup in p]
+  [1, 2, 3, 4, 5, 6, 7, 8, 9]
+  >>> len(p.getColumn(0))
+  9
+  >>> [e.id for e in p.decodeAll(schema, {'id'})], [schema.unpack(tup).id for tup in p.rowsAt([0, 8])]
+  ([1, 2, 3, 4, 5, 6, 7, 8, 9], [1, 9])
+
+  # Pages are unpacked without their schema, and may be filled at once.
+  >>> p2 = PaxPage.unpack(pId, p.pack())
+  >>> [schema.unpack(tup) for tup in p2] == [schema.unpack(tup) for tup in p]
+  True
+  >>> p2.decodeAll(schema) == [schema.unpack(tup) for tup in p2.iterRows()] == [schema.unpack(tup) for tup in p]
+  True
+  >>> from Catalog.Schema import np
+  >>> np is None or p2.decodeBatch(schema).tobytes() == b''.join(p2.iterRows())
+  True
+
+  >>> tuples = [schema.pack(schema.instantiate(i, 'e', i)) for i in range(11)]
+  >>> p3 = PaxPage(pageId=pId, buffer=bytes(4096), schema=schema)
+  >>> p4 = PaxPage(pageId=pId, buffer=bytes(4096), schema=schema)
+  >>> [p3.insertTuple(tup) for tup in tuples] == p4.insertTuples(tuples)
+  True
+  >>> p3.pack() == p4.pack()
+  True
+  """
+
+  headerClass = PaxPageHeader
+
+  # Header constructor override for PAX pages.
+  def initializeHeader(self, **kwargs):
+    schema = kwargs.get("schema", None)
+    if schema and not schema.variable:
+      return PaxPageHeader(buffer=self.getbuffer(), tupleSize=schema.size, columns=schema.fieldLayout())
+    elif schema:
+      raise ValueError("PAX pages require a schema with fixed-size fields.")
+    else:
+      raise ValueError("No schema provided when constructing a PAX page.")
+
+  # Tuple iterator
+  def __iter__(self):
+    return PaxPageTupleIterator(self)
+
+  # Returns the page ranges holding each field of the tuple in the given slot.
+  def fieldRanges(self, slotIndex):
+    return [(start + slotIndex * size, start + (slotIndex + 1) * size, offset, size) \
+              for ((offset, size), start) in zip(self.header.columns, self.header.minipageOffsets)]
+
+  # Reassembles the packed tuple in the given slot.
+  def rowData(self, slotIndex):
+    row = bytearray(self.header.tupleSize)
+    for (start, end, offset, size) in self.fieldRanges(slotIndex):
+      row[offset:offset+size] = self.buffer[start:end]
+    return bytes(row)
+
+  # Writes the fields of a packed tuple into the given slot.
+  def putRowData(self, slotIndex, tupleData):
+    for (start, end, offset, size) in self.fieldRanges(slotIndex):
+      self.getbuffer()[start:end] = tupleData[offset:offset+size]
+
+  # Returns an iterator over the packed data of every live tuple in the page.
+  def iterRows(self):
+    return iter(self)
+
+  # Reassembles the packed tuples at the given positions among the live tuples.
+  def rowsAt(self, positions):
+    slots = self.header.usedSlots()
+    return [self.rowData(slots[p]) for p in positions]
+
+  # Decodes the live tuples of the page column-at-a-time, with a struct pass over each minipage.
+  # Only the minipages of the given fields are read, when given. Other fields are left empty.
+  def decodeAll(self, schema, fields=None):
+    if schema.variable or schema.size != self.header.tupleSize:
+      return [schema.unpack(tupleData) for tupleData in self]
+
+    numSlots = self.header.numSlots
+    slots    = self.header.usedSlots()
+    columns  = []
+    for (i, (field, fmt, (_, size), start)) in \
+          enumerate(zip(schema.fields, schema.formats, self.header.columns, self.header.minipageOffsets)):
+      if fields is None or field in fields:
+        values = [v for (v,) in Struct(fmt).iter_unpack(self.buffer[start:start + size * numSlots])]
+        columns.append(values if len(slots) == numSlots else [values[s] for s in slots])
+      else:
+        columns.append(itertools.repeat(b'' if i in schema.textFields else None, len(slots)))
+    return schema.instantiateAll(zip(*columns))
+
+  # Builds a column batch directly from the page's minipages.
+  def decodeBatch(self, schema):
+    if schema.variable or schema.size != self.header.tupleSize:
+      return schema.unpackBatch(b''.join(self))
+
+    numSlots = self.header.numSlots
+    columns  = [self.buffer[start:start + size * numSlots] \
+                  for ((_, size), start) in zip(self.header.columns, self.header.minipageOffsets)]
+    return schema.unpackColumnBatch(columns, numSlots, self.header.usedSlots())
+
+  # Returns the packed values of a column, for each tuple in the page.
+  def getColumn(self, column):
+    (_, size) = self.header.columns[column]
+    start     = self.header.minipageOffsets[column]
+    minipage  = self.buffer[start:start + size * self.header.numSlots]
+    return [minipage[i*size:(i+1)*size].tobytes() for i in self.header.usedSlots()]
+
+  # Tuple accessor methods
+  def getTuple(self, tupleId):
+    if self.header and tupleId and self.header.usedSlot(tupleId.tupleIndex):
+      return self.rowData(tupleId.tupleIndex)
+
+  def putTuple(self, tupleId, tupleData):
+    if self.header and tupleId and tupleData and self.header.validTuple(tupleData):
+      if self.header.usedSlot(tupleId.tupleIndex):
+        self.putRowData(tupleId.tupleIndex, tupleData)
+        self.setDirty(True)
+
+  def insertTuple(self, tupleData):
+    if self.header and tupleData and self.header.validTuple(tupleData):
+      tupleIndex = self.header.nextFreeTuple()
+      if tupleIndex is not None:
+        self.putRowData(tupleIndex, tupleData)
+        self.setDirty(True)
+        return TupleId(self.pageId, tupleIndex)
+
+  # Fills an empty page with the given packed tuples, with a single copy into each minipage.
+  # Returns the tuple ids of the inserted tuples.
+  def insertTuples(self, tuples):
+    if self.header and len(tuples) <= self.header.tupleCapacity():
+      if any(not self.header.validTuple(tupleData) for tupleData in tuples):
+        raise ValueError("Invalid tuple size while inserting tuples")
+
+      for ((offset, size), start) in zip(self.header.columns, self.header.minipageOffsets):
+        columnData = b''.join(tupleData[offset:offset+size] for tupleData in tuples)
+        self.getbuffer()[start:start+len(columnData)] = columnData
+      self.header.useTuples(len(tuples))
+      self.setDirty(True)
+      return [TupleId(self.pageId, i) for i in range(len(tuples))]
+    else:
+      raise ValueError("Too many tuples to insert into a page")
+
+  def clearTuple(self, tupleId):
+    if self.header and tupleId and self.header.usedSlot(tupleId.tupleIndex):
+      self.putRowData(tupleId.tupleIndex, bytes(self.header.tupleSize))
+      self.setDirty(True)
+
+
+class PaxPageTupleIterator(PageTupleIterator):
+  """
+  Iteration over the tuples in a PAX page, reassembling each tuple from its minipages.
+  """
+  def __init__(self, page):
+    if not isinstance(page, PaxPage):
+      raise ValueError("Invalid PAX page instance for a PAX page iterator")
+    super().__init__(page)
+    self.slotIterator = None
+
+  def __iter__(self):
+    return self
+
+  # Visits the slots in use when iteration starts.
+  def __next__(self):
+    if self.slotIterator is None:
+      self.slotIterator = iter(self.page.header.usedSlots())
+
+    for self.iterTupleIdx in self.slotIterator:
+      if self.page.header.getSlot(self.iterTupleIdx):
+        return self.page.rowData(self.iterTupleIdx)
+
+    raise StopIteration
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
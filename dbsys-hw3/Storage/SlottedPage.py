@@ -1,4 +1,4 @@
-import functools, math, struct, sys
+import functools, itertools, math, struct, sys
 from struct import Struct
 from io     import BytesIO
 
@@ -75,6 +75,13 @@ class SlottedPageHeader(PageHeader):
 
   >>> ph.freeSpace() < ph.tupleSize
   True
+
+  # Freed slots are found and reused in slot order.
+  >>> ph.resetSlot(12); ph.resetSlot(3)
+  >>> ph.freeSlots(), ph.numTuples() == ph.numSlots - 2, ph.hasFreeTuple()
+  ([3, 12], True, True)
+  >>> ph.nextFreeTuple(), ph.freeSlots(), ph.usedSlots()[:4]
+  (3, [12], [0, 1, 2, 3])
   """
 
   # # Slots are two unsigned shorts: slot offset and slot data length
@@ -84,6 +91,9 @@ class SlottedPageHeader(PageHeader):
   prefixFmt   = "H"
   prefixRepr  = struct.Struct(prefixFmt)
 
+  # Translation of a binary string of slot bits into a byte per slot, for use as an itertools selector.
+  slotBitTable = bytes.maketrans(b'01', b'\x00\x01')
+
   def __init__(self, **kwargs):
     other = kwargs.get("other", None)
     if other:
@@ -100,6 +110,7 @@ class SlottedPageHeader(PageHeader):
 
         self.numSlots = kwargs.get("numSlots", self.maxTuples())
         self.slots    = self.initializeSlots(buffer)
+        self.slotMask = self.initializeSlotMask()
         self.binrepr  = Struct(SlottedPageHeader.prefixFmt+str(self.slotBufferSize())+"s")
         self.reprSize = PageHeader.size + self.binrepr.size
 
@@ -132,23 +143,31 @@ class SlottedPageHeader(PageHeader):
         end   = start + SlottedPageHeader.prefixRepr.size
         buffer[start:end] = SlottedPageHeader.prefixRepr.pack(self.numSlots)
         self.slots[:] = b'\x00' * self.slotBufferSize()
-      else:
+      elif not self.slots.readonly:
         self.slots[:] = kwargs.get("slots", b'\x00' * self.slotBufferSize())
+      # Otherwise, this header is unpacked from a read-only page, whose slots are already in its buffer.
+
+      self.usedCount = None
 
   def fromOther(self, other):
     super().fromOther(other)
     if isinstance(other, SlottedPageHeader):
-      self.numSlots = other.numSlots
-      self.slots    = other.slots
-      self.binrepr  = other.binrepr
-      self.reprSize = other.reprSize
+      self.numSlots  = other.numSlots
+      self.slots     = other.slots
+      self.slotMask  = other.slotMask
+      self.usedCount = None
+      self.binrepr   = other.binrepr
+      self.reprSize  = other.reprSize
 
   # Parent method overrides
   def headerSize(self):
     return self.reprSize
 
+  # The number of used slots is cached, and maintained as slots are set and reset.
   def numTuples(self):
-    return len(self.usedSlots())
+    if self.usedCount is None:
+      self.usedCount = self.slotBits().bit_count()
+    return self.usedCount
 
   # Returns the maximum number of tuples that can be held in this page.
   def maxTuples(self):
@@ -165,6 +184,10 @@ class SlottedPageHeader(PageHeader):
       else:
         return sz + 1
 
+  def rebind(self, buffer):
+    self.slots     = self.initializeSlots(buffer)
+    self.usedCount = None
+
   # Initializes the bitvector object for slots.
   def initializeSlots(self, buffer):
     if self.numSlots:
@@ -174,6 +197,11 @@ class SlottedPageHeader(PageHeader):
     else:
       raise ValueError("Unable to initialize slots, do not know number of slots")
 
+  # Returns an integer with the bits of all valid slots set, in the bit order of slotBits.
+  def initializeSlotMask(self):
+    padding = 8 * self.slotBufferSize() - self.numSlots
+    return ((1 << self.numSlots) - 1) << padding
+
   # Slotted page specific methods
 
   # Returns the byte offset of the given slot in the bitvector.
@@ -188,6 +216,15 @@ class SlottedPageHeader(PageHeader):
     offset = self.slotBufferByteOffset(slotIndex)
     return 0 <= offset and offset < self.slots.nbytes
 
+  # Returns the slot bitvector as a single integer, with the first slot as its most significant bit.
+  def slotBits(self):
+    return int.from_bytes(self.slots, 'big')
+
+  # Returns the indexes of the set bits in the given slot bitvector integer.
+  def slotIndexes(self, bits):
+    bitString = format(bits, '0' + str(8 * self.slots.nbytes) + 'b')[:self.numSlots]
+    return list(itertools.compress(range(self.numSlots), bitString.encode().translate(SlottedPageHeader.slotBitTable)))
+
   def getSlot(self, slotIndex):
     if self.hasSlot(slotIndex):
       (byteIdx, bitIdx) = self.slotBufferOffset(slotIndex)
@@ -198,10 +235,14 @@ class SlottedPageHeader(PageHeader):
   def setSlot(self, slotIndex, used):
     if self.hasSlot(slotIndex):
       (byteIdx, bitIdx) = self.slotBufferOffset(slotIndex)
+      byte = self.slots[byteIdx]
       if used:
-        self.slots[byteIdx] = self.slots[byteIdx] | (0b1 << bitIdx)
+        self.slots[byteIdx] = byte | (0b1 << bitIdx)
       else:
-        self.slots[byteIdx] = self.slots[byteIdx] & ~(0b1 << bitIdx)
+        self.slots[byteIdx] = byte & ~(0b1 << bitIdx)
+
+      if self.usedCount is not None and bool(byte & (0b1 << bitIdx)) != bool(used):
+        self.usedCount += 1 if used else -1
     else:
       raise ValueError("Invalid set slot index or slot value")
 
@@ -211,39 +252,11 @@ class SlottedPageHeader(PageHeader):
 
   # Returns the slot indexes for all of the unused slots.
   def freeSlots(self):
-    freeIndexes = []
-    for i in range(self.slots.nbytes-1):
-      for j in range(8):
-        if not ( self.slots[i] & (0b1 << (7 - j)) ):
-          freeIndexes.append((i << 3) + j)
-
-    # Special handling of the final byte to only consider up to numSlots.
-    i = self.slots.nbytes-1
-    j = 0
-    while (i << 3) + j < self.numSlots:
-      if not ( self.slots[i] & (0b1 << (7 - j)) ):
-        freeIndexes.append((i << 3) + j)
-      j += 1
-
-    return freeIndexes
+    return self.slotIndexes(~self.slotBits() & self.slotMask)
 
   # Returns the slot indexes for all used slots.
   def usedSlots(self):
-    usedIndexes = []
-    for i in range(self.slots.nbytes-1):
-      for j in range(8):
-        if self.slots[i] & (0b1 << (7 - j)):
-          usedIndexes.append((i << 3) + j)
-
-    # Special handling of the final byte to only consider up to numSlots.
-    i = self.slots.nbytes-1
-    j = 0
-    while (i << 3) + j < self.numSlots:
-      if self.slots[i] & (0b1 << (7 - j)):
-        usedIndexes.append((i << 3) + j)
-      j += 1
-
-    return usedIndexes
+    return self.slotIndexes(self.slotBits())
 
   # Converts an absolute page offset into a slot index.
   def tupleIndex(self, offset):
@@ -288,46 +301,23 @@ class SlottedPageHeader(PageHeader):
 
   # Returns the space used in the page associated with this header.
   def usedSpace(self):
-    usage = sum([self.tupleSize for i in self.usedSlots()])
-    return usage if isinstance(usage, int) else 0
+    return self.numTuples() * self.tupleSize
 
   # Returns whether the page has any free space for a tuple.
   def hasFreeTuple(self):
-    fullSlots = bytearray(b'\xff' * self.slots.nbytes)
-    if self.numSlots % 8 != 0:
-      b = 0
-      for i in range(self.numSlots % 8):
-        b = b | (0b1 << (7 - i))
-      fullSlots[self.slots.nbytes-1] = b
-
-    return self.slots != fullSlots
+    return self.numTuples() < self.numSlots
 
   # Returns the tupleIndex of the next free tuple.
   # This should also "allocate" the tuple, such that any subsequent call
   # does not yield the same tupleIndex.
+  # The first free slot follows from the bit length of the free slot mask, i.e.,
+  # the position of its most significant set bit.
   def nextFreeTuple(self):
-    index = None
-    for i in range(self.slots.nbytes-1):
-      # Compute the first free slot by:
-      # i. xor'ing with all bits set to determine the free bit mask
-      # ii. differencing against the bit length (i.e., the # of bits to represent the free mask)
-      slotInByte = 8 - ( (self.slots[i] ^ 0xff).bit_length() )
-      if slotInByte < 8:
-        index = (i << 3) + slotInByte
-        self.useTupleIndex(index)
-        break
-
-    # Special handling of the final byte to only consider up to numSlots.
-    if index is None:
-      i = self.slots.nbytes-1
-      j = 0
-      while index is None and (i << 3) + j < self.numSlots:
-        if not ( self.slots[i] & (0b1 << (7 - j)) ):
-          index = (i << 3) + j
-          self.useTupleIndex(index)
-        j += 1
-
-    return index
+    free = ~self.slotBits() & self.slotMask
+    if free:
+      index = 8 * self.slots.nbytes - free.bit_length()
+      self.useTupleIndex(index)
+      return index
 
   def nextTupleRange(self):
     tupleIndex = self.nextFreeTuple()
@@ -342,6 +332,23 @@ class SlottedPageHeader(PageHeader):
     self.setSlot(tupleIndex, True)
     super().useTupleIndex(tupleIndex)
 
+  # A full slotted page uses all of its slots.
+  def tupleCapacity(self):
+    return min(self.numSlots, super().tupleCapacity())
+
+  # Marks the first given number of slots of an empty page as used.
+  def useTuples(self, count):
+    self.useSlots(count)
+    super().useTuples(count)
+
+  # Sets the bits of the first given number of slots in the bitvector.
+  def useSlots(self, count):
+    (fullBytes, remainder) = divmod(count, 8)
+    self.slots[0:fullBytes] = b'\xff' * fullBytes
+    if remainder:
+      self.slots[fullBytes] = (0xff << (8 - remainder)) & 0xff
+    self.usedCount = None
+
   # Marks the tuple as being free.
   # In a slotted page, we reset the given slot. Note we do not update the
   # parent's freeSpaceOffset since the tuple's validity is overriden by the slot.
@@ -468,6 +475,30 @@ class SlottedPage(Page):
   # Check that the page's slots have tracked the deletion.
   >>> p.header.usedSpace() == (sizeBeforeRemove - p.header.tupleSize)
   True
+
+  # Decoding all tuples at once skips free slots.
+  >>> [e.age for e in p.decodeAll(schema)]
+  [20, 22, 24, 26, 28, 30, 32, 34, 36, 38]
+  >>> [schema.unpack(tup) for tup in p.iterRows()] == p.decodeAll(schema)
+  True
+  >>> from Catalog.Schema import np
+  >>> np is None or p.decodeBatch(schema)['age'].tolist() == [e.age for e in p.decodeAll(schema)]
+  True
+
+  # Filling a page at once lays it out as inserting its tuples one at a time.
+  >>> tuples = [schema.pack(schema.instantiate(i, 2*i)) for i in range(11)]
+  >>> p1 = SlottedPage(pageId=pId, buffer=bytes(4096), schema=schema)
+  >>> p2 = SlottedPage(pageId=pId, buffer=bytes(4096), schema=schema)
+  >>> [p1.insertTuple(tup) for tup in tuples] == p2.insertTuples(tuples)
+  True
+  >>> p1.pack() == p2.pack()
+  True
+
+  >>> full = [tuples[0]] * p2.header.tupleCapacity()
+  >>> p2 = SlottedPage(pageId=pId, buffer=bytes(4096), schema=schema)
+  >>> _ = p2.insertTuples(full)
+  >>> p2.header.hasFreeTuple(), p2.header.numTuples() == len(full)
+  (False, True)
   """
 
   headerClass = SlottedPageHeader
@@ -480,7 +511,7 @@ class SlottedPage(Page):
     else:
       header = kwargs.get("header", None)
       if header:
-        super().__init__(pageId=pageId, buffer=buffer, header=header)
+        super().__init__(pageId=pageId, buffer=buffer, header=header, readOnly=kwargs.get("readOnly", False))
       else:
         super().__init__(pageId=pageId, buffer=buffer, **kwargs)
 
@@ -499,11 +530,410 @@ class SlottedPage(Page):
   def __iter__(self):
     return SlottedPageTupleIterator(self)
 
+  # Live tuples are those in used slots.
+  def liveTupleIndexes(self):
+    return self.header.usedSlots()
+
   # Override contiguous page's deleteTuple to prevent it shifting data.
   def deleteTuple(self, tupleId):
     if self.header and tupleId:
       self.clearTuple(tupleId)
       self.header.resetTuple(tupleId)
+      self.setDirty(True)
+
+
+class VariableSlottedPageHeader(PageHeader):
+  """
+  A slotted page header for variable-length tuples. This stores a slot
+  directory of (offset, length) entries following the header fields, which
+  grows towards the end of the page, while tuple data is allocated from the
+  end of the page towards the directory. The parent's free space offset is
+  the start of the tuple data.
+
+  Deleted tuples leave empty directory entries that are reused by later
+  inserts, and their space is reclaimed by compacting the page's tuple data
+  when an insert does not fit in the contiguous free space.
+
+  The header also maintains the number of tuples and the space they use,
+  so that a page's free space can be checked from its header fields alone.
+
+  The binary representation of this header object is: (numSlots, numTuples, usedSpace, slotDirectory)
+
+  >>> import io
+  >>> buffer = io.BytesIO(bytes(4096))
+  >>> ph     = VariableSlottedPageHeader(buffer=buffer.getbuffer(), tupleSize=100)
+
+  >>> ph.hasFreeTuple(), ph.numTuples(), ph.freeSpace() == 4096 - ph.headerSize()
+  (True, 0, True)
+
+  # Tuples are allocated from the end of the page, with their actual length.
+  >>> [ph.allocateTuple(n) for n in [10, 20, 30]]
+  [(0, 4086, 4096), (1, 4066, 4086), (2, 4036, 4066)]
+
+  >>> ph.numTuples(), ph.usedSpace(), ph.headerSize() == PageHeader.size + 6 + 3 * 4
+  (3, 60, True)
+
+  # Freed slots are reused, and their space is reclaimed by compaction.
+  >>> ph.allocateTuple(ph.contiguousSpace() - 4)
+  (3, 30, 4036)
+  >>> ph.resetTupleIndex(1)
+  >>> ph.numTuples(), ph.usedSpace()
+  (3, 4046)
+
+  >>> ph.allocateTuple(20)
+  (1, 30, 50)
+
+  >>> ph.hasFreeTuple(), ph.allocateTuple(1)
+  (False, (None, None, None))
+
+  # Headers can be unpacked from their fixed-size fields alone.
+  >>> buffer.getbuffer()[0:ph.headerSize()] = ph.pack()
+  >>> ph2 = VariableSlottedPageHeader.unpack(buffer.getbuffer()[0:ph.headerSize()])
+  >>> ph2.numTuples() == ph.numTuples() and ph2.freeSpace() == ph.freeSpace()
+  True
+  """
+
+  # Slots are two unsigned shorts: slot offset and slot data length
+  slotRepr    = Struct("HH")
+  slotSize    = slotRepr.size
+
+  prefixFmt   = "HHH"
+  prefixRepr  = struct.Struct(prefixFmt)
+
+  def __init__(self, **kwargs):
+    other = kwargs.get("other", None)
+    if other:
+      self.fromOther(other)
+
+    else:
+      buffer = kwargs.get("buffer", None)
+      parent = kwargs.get("parent", None)
+      if buffer:
+        self.buffer     = buffer
+        self.numSlots   = kwargs.get("numSlots", 0)
+        self.tupleCount = kwargs.get("numTuples", 0)
+        self.tupleBytes = kwargs.get("usedSpace", 0)
+
+        if parent:
+          super().__init__(other=parent)
+        else:
+          super().__init__(**kwargs)
+
+      else:
+        raise ValueError("No backing buffer supplied for VariableSlottedPageHeader")
+
+  def __eq__(self, other):
+    return super().__eq__(other) and (
+            self.numSlots == other.numSlots
+            and self.tupleCount == other.tupleCount
+            and self.tupleBytes == other.tupleBytes )
+
+  def postHeaderInitialize(self, **kwargs):
+    fresh  = kwargs.get("flags", None) is None
+    buffer = kwargs.get("buffer", None)
+
+    # Tuple data starts at the end of a fresh page.
+    self.freeSpaceOffset = kwargs.get("freeSpaceOffset", self.pageCapacity)
+    if fresh and buffer:
+      buffer[0:PageHeader.size + VariableSlottedPageHeader.prefixRepr.size] = self.pack()
+
+  def fromOther(self, other):
+    super().fromOther(other)
+    if isinstance(other, VariableSlottedPageHeader):
+      self.buffer     = other.buffer
+      self.numSlots   = other.numSlots
+      self.tupleCount = other.tupleCount
+      self.tupleBytes = other.tupleBytes
+
+  def rebind(self, buffer):
+    self.buffer = buffer
+
+  # Parent method overrides
+  def headerSize(self):
+    return self.slotOffset(self.numSlots)
+
+  def numTuples(self):
+    return self.tupleCount
+
+  # Slots beyond the end of the directory do not hold tuples.
+  def maxTuples(self):
+    return self.numSlots
+
+  # Tuples may have any length up to the tuple size given for the page.
+  def validTuple(self, tupleData):
+    return 0 < len(tupleData) and len(tupleData) <= self.tupleSize
+
+  # Returns the space available in the page, including space held by deleted tuples.
+  def freeSpace(self):
+    return self.pageCapacity - (self.headerSize() + self.tupleBytes)
+
+  def usedSpace(self):
+    return self.tupleBytes
+
+  # Returns whether a tuple of the maximum size, and a new slot for it, fit in the page.
+  def hasFreeTuple(self):
+    return self.freeSpace() >= self.tupleSize + VariableSlottedPageHeader.slotSize
+
+  # Returns an upper bound on the number of tuples held by a page, if all tuples had a single byte.
+  def tupleCapacity(self):
+    headerSize = PageHeader.size + VariableSlottedPageHeader.prefixRepr.size
+    return (self.pageCapacity - headerSize) // (1 + VariableSlottedPageHeader.slotSize)
+
+  # Slot directory methods
+
+  # Returns the offset within the page of the given slot's directory entry.
+  def slotOffset(self, slotIndex):
+    return PageHeader.size + VariableSlottedPageHeader.prefixRepr.size \
+             + slotIndex * VariableSlottedPageHeader.slotSize
+
+  # Returns the (offset, length) pair of a slot. Unused slots have a zero offset.
+  def getSlot(self, slotIndex):
+    if 0 <= slotIndex and slotIndex < self.numSlots:
+      return VariableSlottedPageHeader.slotRepr.unpack_from(self.buffer, self.slotOffset(slotIndex))
+    else:
+      raise ValueError("Invalid get slot index")
+
+  def setSlot(self, slotIndex, offset, length):
+    VariableSlottedPageHeader.slotRepr.pack_into(self.buffer, self.slotOffset(slotIndex), offset, length)
+
+  # Returns the slot indexes for all used slots.
+  def usedSlots(self):
+    return [i for i in range(self.numSlots) if self.getSlot(i)[0]]
+
+  # Returns the space between the slot directory and the tuple data.
+  def contiguousSpace(self):
+    return self.freeSpaceOffset - self.headerSize()
+
+  # Moves all tuples to the end of the page, coalescing the space of deleted tuples.
+  def compact(self):
+    slots = [(i,) + self.getSlot(i) for i in self.usedSlots()]
+    data  = [self.buffer[offset:offset+length].tobytes() for (_, offset, length) in slots]
+    self.freeSpaceOffset = self.pageCapacity
+    for ((i, _, length), tupleData) in zip(slots, data):
+      self.freeSpaceOffset -= length
+      self.buffer[self.freeSpaceOffset:self.freeSpaceOffset+length] = tupleData
+      self.setSlot(i, self.freeSpaceOffset, length)
+
+  # Allocates space for a tuple of the given length in the given slot, compacting the page if needed.
+  def placeTuple(self, slotIndex, length):
+    if self.contiguousSpace() < length:
+      self.compact()
+    self.freeSpaceOffset -= length
+    self.setSlot(slotIndex, self.freeSpaceOffset, length)
+    self.tupleBytes += length
+    return (self.freeSpaceOffset, self.freeSpaceOffset + length)
+
+  # Allocates a tuple of the given length, reusing an empty slot if available.
+  # Returns a triple of (tupleIndex, start, end), or Nones if the tuple does not fit.
+  def allocateTuple(self, length):
+    emptySlots = (i for i in range(self.numSlots) if not self.getSlot(i)[0])
+    slotIndex  = next(emptySlots, None)
+    required   = length if slotIndex is not None else length + VariableSlottedPageHeader.slotSize
+    if self.freeSpace() < required:
+      return (None, None, None)
+
+    if slotIndex is None:
+      if self.contiguousSpace() < required:
+        self.compact()
+      slotIndex = self.numSlots
+      self.numSlots += 1
+
+    (start, end) = self.placeTuple(slotIndex, length)
+    self.tupleCount += 1
+    return (slotIndex, start, end)
+
+  # Changes the length of a used tuple, moving it if it grows.
+  # Returns the tuple's new range, or Nones if the tuple does not fit.
+  def resizeTuple(self, slotIndex, length):
+    (offset, oldLength) = self.getSlot(slotIndex)
+    if length <= oldLength:
+      self.setSlot(slotIndex, offset, length)
+      self.tupleBytes -= oldLength - length
+      return (offset, offset + length)
+    elif self.freeSpace() >= length - oldLength:
+      self.setSlot(slotIndex, 0, 0)
+      self.tupleBytes -= oldLength
+      return self.placeTuple(slotIndex, length)
+    else:
+      return (None, None)
+
+  # Slotted pages interpret tuple indexes as the slot index.
+  def tupleIndex(self, offset):
+    for i in self.usedSlots():
+      (start, length) = self.getSlot(i)
+      if start <= offset and offset < start + length:
+        return i
+
+  def tupleRange(self, tupleId):
+    if tupleId and 0 <= tupleId.tupleIndex and tupleId.tupleIndex < self.numSlots:
+      (start, length) = self.getSlot(tupleId.tupleIndex)
+      if start:
+        return (start, start + length)
+    return (None, None)
+
+  def pageRange(self, tupleId):
+    return self.tupleRange(tupleId)
+
+  # Marks the first slots of an empty page as used by tuples of the given lengths,
+  # which are stored contiguously at the end of the page in reverse slot order,
+  # as when inserting them one at a time. Returns the offset of the last tuple.
+  def useTupleLengths(self, lengths):
+    start   = self.pageCapacity - sum(lengths)
+    offsets = [self.pageCapacity - end for end in itertools.accumulate(lengths)]
+    entries = [x for entry in zip(offsets, lengths) for x in entry]
+    struct.pack_into(str(len(entries))+"H", self.buffer, self.slotOffset(0), *entries)
+    self.numSlots        = len(lengths)
+    self.tupleCount      = len(lengths)
+    self.tupleBytes      = self.pageCapacity - start
+    self.freeSpaceOffset = start
+    return start
+
+  # Marks the tuple as being free.
+  # Trailing empty slots are removed from the directory, and the space of
+  # the last allocated tuple is returned to the contiguous free space.
+  def resetTupleIndex(self, tupleIndex):
+    (offset, length) = self.getSlot(tupleIndex)
+    if offset:
+      self.setSlot(tupleIndex, 0, 0)
+      self.tupleCount -= 1
+      self.tupleBytes -= length
+      if offset == self.freeSpaceOffset:
+        self.freeSpaceOffset += length
+      while self.numSlots and not self.getSlot(self.numSlots - 1)[0]:
+        self.numSlots -= 1
+
+  def pack(self):
+    return super().pack() \
+            + VariableSlottedPageHeader.prefixRepr.pack(self.numSlots, self.tupleCount, self.tupleBytes) \
+            + bytes(self.buffer[self.slotOffset(0):self.slotOffset(self.numSlots)])
+
+  @classmethod
+  def unpack(cls, buffer):
+    parent = PageHeader.unpack(buffer)
+    (numSlots, numTuples, usedSpace) = cls.prefixRepr.unpack_from(buffer, offset=PageHeader.size)
+    return cls(parent=parent, buffer=buffer, numSlots=numSlots, numTuples=numTuples, usedSpace=usedSpace)
+
+
+class VariableSlottedPage(SlottedPage):
+  """
+  A slotted page implementation for variable-length tuples, using the
+  VariableSlottedPageHeader class for its headers. Tuples are stored with
+  their actual length, and are located through the header's slot directory.
+
+  >>> from Catalog.Identifiers import FileId, PageId, TupleId
+  >>> from Catalog.Schema      import DBSchema
+
+  # Test harness setup.
+  >>> schema = DBSchema('employee', [('id', 'int'), ('name', 'varchar(20)')])
+  >>> pId    = PageId(FileId(1), 100)
+  >>> p      = VariableSlottedPage(pageId=pId, buffer=bytes(4096), schema=schema)
+
+  # Create and retrieve tuples
+  >>> tIds = [p.insertTuple(schema.pack(schema.instantiate(i, 'e' * i))) for i in range(10)]
+  >>> [schema.unpack(tup).name for tup in p][:4]
+  ['', 'e', 'ee', 'eee']
+  >>> p.header.usedSpace() == 10 * schema.fixedSize + sum(range(10))
+  True
+
+  # Update tuples, growing and shrinking them.
+  >>> p.putTuple(tIds[1], schema.pack(schema.instantiate(1, 'f' * 20)))
+  >>> p.putTuple(tIds[9], schema.pack(schema.instantiate(9, 'g')))
+  >>> [schema.unpack(p.getTuple(tIds[i])).name for i in [1, 9]]
+  ['ffffffffffffffffffff', 'g']
+
+  # Deleted tuples keep the remaining tuple ids valid.
+  >>> p.deleteTuple(tIds[0])
+  >>> [schema.unpack(tup).id for tup in p]
+  [1, 2, 3, 4, 5, 6, 7, 8, 9]
+  >>> schema.unpack(p.getTuple(tIds[5]))
+  employee(id=5, name='eeeee')
+
+  # Fill the page, compacting it to reuse the space of deleted and moved tuples.
+  >>> while p.insertTuple(schema.pack(schema.instantiate(0, 'h'))): pass
+  >>> p.header.hasFreeTuple(), p.header.freeSpace() < schema.fixedSize + 1 + p.header.slotSize
+  (False, True)
+  >>> schema.unpack(p.getTuple(tIds[1])).name, schema.unpack(p.getTuple(tIds[5])).name
+  ('ffffffffffffffffffff', 'eeeee')
+
+  # Filling a page at once lays it out as inserting its tuples one at a time,
+  # and inserts only the leading tuples that fit in the page.
+  >>> tuples = [schema.pack(schema.instantiate(i, 'e' * (i % 20))) for i in range(1000)]
+  >>> p1 = VariableSlottedPage(pageId=pId, buffer=bytes(4096), schema=schema)
+  >>> p2 = VariableSlottedPage(pageId=pId, buffer=bytes(4096), schema=schema)
+  >>> inserted = p2.insertTuples(tuples)
+  >>> [p1.insertTuple(tup) for tup in tuples[:len(inserted)]] == inserted
+  True
+  >>> p1.insertTuple(tuples[len(inserted)]) is None and p1.pack() == p2.pack()
+  True
+
+  # Pages are unpacked through their slot directory.
+  >>> p3 = VariableSlottedPage.unpack(pId, p2.pack())
+  >>> [schema.unpack(tup) for tup in p3] == [schema.unpack(tup) for tup in tuples[:len(inserted)]]
+  True
+  >>> p3.decodeAll(schema) == [schema.unpack(tup) for tup in p3.iterRows()] == [schema.unpack(tup) for tup in p3]
+  True
+  """
+
+  headerClass = VariableSlottedPageHeader
+
+  # Tuples are not at fixed offsets in the data region, and are decoded one at a time.
+  def iterRows(self):
+    return iter(self)
+
+  def rowsAt(self, positions):
+    rows = list(self)
+    return [rows[p] for p in positions]
+
+  def decodeAll(self, schema, fields=None):
+    return [schema.unpack(tupleData) for tupleData in self]
+
+  # Header constructor override for variable-length tuples.
+  def initializeHeader(self, **kwargs):
+    schema = kwargs.get("schema", None)
+    if schema:
+      return VariableSlottedPageHeader(buffer=self.getbuffer(), tupleSize=schema.size)
+    else:
+      raise ValueError("No schema provided when constructing a slotted page.")
+
+  def putTuple(self, tupleId, tupleData):
+    if self.header and tupleId and tupleData and self.header.validTuple(tupleData):
+      (start, end) = self.header.tupleRange(tupleId)
+      if start and end:
+        (start, end) = self.header.resizeTuple(tupleId.tupleIndex, len(tupleData))
+        if start is None:
+          raise ValueError("Not enough space in the page to update a tuple")
+        self.getbuffer()[start:end] = tupleData
+        self.setDirty(True)
+
+  def insertTuple(self, tupleData):
+    if self.header and tupleData and self.header.validTuple(tupleData):
+      (tupleIndex, start, end) = self.header.allocateTuple(len(tupleData))
+      if start and end:
+        self.getbuffer()[start:end] = tupleData
+        self.setDirty(True)
+        return TupleId(self.pageId, tupleIndex)
+
+  # Fills an empty page with the leading tuples that fit in the page, with a single copy
+  # into the page's buffer. Returns the tuple ids of the inserted tuples.
+  def insertTuples(self, tuples):
+    if self.header and self.header.numTuples() == 0:
+      freeSpace = self.header.freeSpace()
+      lengths   = []
+      for tupleData in tuples:
+        if not self.header.validTuple(tupleData):
+          raise ValueError("Invalid tuple size while inserting tuples")
+        freeSpace -= len(tupleData) + VariableSlottedPageHeader.slotSize
+        if freeSpace < 0:
+          break
+        lengths.append(len(tupleData))
+
+      if lengths:
+        start = self.header.useTupleLengths(lengths)
+        self.getbuffer()[start:self.header.pageCapacity] = b''.join(reversed(tuples[:len(lengths)]))
+        self.setDirty(True)
+      return [TupleId(self.pageId, i) for i in range(len(lengths))]
+    else:
+      raise ValueError("Tuples can only be inserted at once into an empty page")
 
 
 class SlottedPageTupleIterator(PageTupleIterator):
@@ -514,20 +944,18 @@ class SlottedPageTupleIterator(PageTupleIterator):
     if not isinstance(page, SlottedPage):
       raise ValueError("Invalid slotted page instance for a slotted page iterator")
     super().__init__(page)
+    self.slotIterator = None
 
   def __iter__(self):
     return self
 
-  # Tuple iterator
+  # Tuple iterator, visiting the slots in use when iteration starts.
   def __next__(self):
-    (start, end) = (None, None)
-    while (start is None or end is None) and self.iterTupleIdx < self.page.header.maxTuples():
-      tId = TupleId(self.page.pageId, self.iterTupleIdx)
-      (start, end) = self.page.header.tupleRange(tId)
-      self.iterTupleIdx += 1
-
-    if start and end:
-      t = self.page.getTuple(tId)
+    if self.slotIterator is None:
+      self.slotIterator = iter(self.page.header.usedSlots())
+
+    for self.iterTupleIdx in self.slotIterator:
+      t = self.page.getTuple(TupleId(self.page.pageId, self.iterTupleIdx))
       if t:
         return t
 
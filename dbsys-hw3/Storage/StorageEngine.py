@@ -36,7 +36,7 @@ class StorageEngine:
       self.fromOther(other)
 
     else:
-      bpArgs          = {k:v for (k,v) in kwargs.items() if k in ["pageSize", "poolSize"]}
+      bpArgs          = {k:v for (k,v) in kwargs.items() if k in ["pageSize", "poolSize", "replacementPolicy", "backgroundWriter", "writerInterval", "readAhead"]}
       fmArgs          = {k:v for (k,v) in kwargs.items() if k in ["pageSize", "dataDir", "indexDir"]}
       self.bufferPool = BufferPool(**bpArgs)
       self.fileMgr    = FileManager(bufferPool=self.bufferPool, **fmArgs)
@@ -62,9 +62,9 @@ class StorageEngine:
     if self.fileMgr:
       return self.fileMgr.hasRelation(relId)
 
-  def createRelation(self, relId, schema):
+  def createRelation(self, relId, schema, mapped=False, pageClass=None, zoneMaps=False):
     if self.fileMgr:
-      self.fileMgr.createRelation(relId, schema)
+      self.fileMgr.createRelation(relId, schema, mapped, pageClass, zoneMaps)
     else:
       raise ValueError("Could not create relation, no file manager found")
 
@@ -114,6 +114,20 @@ class StorageEngine:
     else:
       raise ValueError("Could not insert tuple, no file manager found")
 
+  # Appends packed tuples to a relation in bulk, returning their tuple ids.
+  def bulkLoad(self, relId, tuples):
+    if self.fileMgr:
+      return self.fileMgr.bulkLoad(relId, tuples)
+    else:
+      raise ValueError("Could not bulk load tuples, no file manager found")
+
+  # Appends pages packed with StorageFile.packPages to a relation, returning their tuple ids.
+  def appendPages(self, relId, pages):
+    if self.fileMgr:
+      return self.fileMgr.appendPages(relId, pages)
+    else:
+      raise ValueError("Could not append pages, no file manager found")
+
   def deleteTuple(self, relId, tupleId):
     if self.fileMgr:
       self.fileMgr.deleteTuple(relId, tupleId)
@@ -131,10 +145,10 @@ class StorageEngine:
     if self.fileMgr:
       return self.fileMgr.tuples(relId)
 
-  # Page-based table scan
-  def pages(self, relId):
+  # Page-based table scan, skipping pages outside of any given field ranges.
+  def pages(self, relId, ranges=None):
     if self.fileMgr:
-      return self.fileMgr.pages(relId)
+      return self.fileMgr.pages(relId, ranges)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,137 @@
+import array, math
+from struct import Struct
+
+from Catalog.Schema import DBSchema, Types
+
+class ZoneMap:
+  """
+  A zone map, storing the minimum and maximum values of each numeric column
+  of a relation for every page of its storage file.
+
+  Zone maps allow scans to skip pages whose values cannot satisfy a range
+  predicate without reading the pages. Bounds are kept as doubles in a flat
+  array, with a (minimum, maximum) pair per column for each page. Empty pages
+  have empty bounds, i.e., an infinite minimum and a negative infinite maximum.
+
+  Bounds are widened as tuples are inserted, and recomputed from a page's
+  tuples when tuples are updated or deleted.
+
+  >>> schema = DBSchema('employee', [('id', 'int'), ('name', 'char(5)'), ('salary', 'double')])
+  >>> zm = ZoneMap(schema)
+  >>> zm.fields
+  ['id', 'salary']
+
+  >>> for i in range(10):
+  ...   zm.addTuple(i // 5, schema.pack(schema.instantiate(i, 'e', 1000.0 * i)))
+  >>> zm.numPages(), zm.pageBounds(1)
+  (2, [(5.0, 9.0), (5000.0, 9000.0)])
+
+  # Pages are skipped when any bounded field lies outside of its range.
+  >>> [zm.mayMatch(i, {'id': (3, None)}) for i in range(2)]
+  [True, True]
+  >>> [zm.mayMatch(i, {'id': (None, 4), 'salary': (2000.0, 3000.0)}) for i in range(2)]
+  [True, False]
+
+  # Recomputing a page's bounds, and untracked pages.
+  >>> zm.summarize(1, [schema.pack(schema.instantiate(7, 'e', 7000.0))])
+  >>> zm.pageBounds(1), zm.mayMatch(2, {'id': (100, None)})
+  ([(7.0, 7.0), (7000.0, 7000.0)], True)
+
+  >>> zm2 = ZoneMap.unpack(schema, zm.pack())
+  >>> zm2.bounds == zm.bounds
+  True
+  """
+
+  numericTypes = ['byte', 'short', 'int', 'float', 'double']
+
+  # Zone map files hold the number of pages and columns, followed by the bounds.
+  fileHeader   = Struct("QQ")
+
+  def __init__(self, schema, **kwargs):
+    self.schema  = schema
+    self.columns = [i for (i, t) in enumerate(schema.types) \
+                      if Types.parseType(t).get("typeStr", None) in ZoneMap.numericTypes]
+    self.fields  = [schema.fields[i] for i in self.columns]
+    self.bounds  = kwargs.get("bounds", array.array('d'))
+
+    # Extract the numeric fields of a packed tuple, skipping any other fields and padding.
+    fmt      = '='
+    position = 0
+    layout   = schema.fieldLayout()
+    for i in self.columns:
+      (offset, size) = layout[i]
+      fmt     += (str(offset - position) + 'x' if offset > position else '') + schema.formats[i]
+      position = offset + size
+    self.valueRepr = Struct(fmt)
+
+  # Returns the numeric field values of a packed tuple.
+  def values(self, tupleData):
+    return self.valueRepr.unpack_from(tupleData)
+
+  def numPages(self):
+    return len(self.bounds) // (2 * len(self.columns)) if self.columns else 0
+
+  # Adds empty bounds for any pages up to the given page index.
+  def ensurePage(self, pageIndex):
+    if self.columns and pageIndex >= self.numPages():
+      self.bounds.extend([math.inf, -math.inf] * len(self.columns) * (pageIndex + 1 - self.numPages()))
+
+  # Returns the (minimum, maximum) pair of each column for a page.
+  def pageBounds(self, pageIndex):
+    start = 2 * len(self.columns) * pageIndex
+    return [(self.bounds[start + 2*i], self.bounds[start + 2*i + 1]) for i in range(len(self.columns))]
+
+  # Widens a page's bounds to include the values of the given tuple.
+  def addTuple(self, pageIndex, tupleData):
+    if self.columns:
+      self.ensurePage(pageIndex)
+      start = 2 * len(self.columns) * pageIndex
+      for (i, v) in enumerate(self.values(tupleData)):
+        if v < self.bounds[start + 2*i]:
+          self.bounds[start + 2*i] = v
+        if v > self.bounds[start + 2*i + 1]:
+          self.bounds[start + 2*i + 1] = v
+
+  # Recomputes a page's bounds from all of the tuples in the page.
+  def summarize(self, pageIndex, tuples):
+    if self.columns:
+      self.ensurePage(pageIndex)
+      start  = 2 * len(self.columns) * pageIndex
+      values = [self.values(tupleData) for tupleData in tuples]
+      for (i, column) in enumerate(zip(*values) if values else [() for _ in self.columns]):
+        self.bounds[start + 2*i]     = min(column, default=math.inf)
+        self.bounds[start + 2*i + 1] = max(column, default=-math.inf)
+
+  # Returns whether a page may hold tuples within the given ranges. Ranges are
+  # a dictionary of field names to inclusive (low, high) bounds, where either bound
+  # may be None. Fields without a zone map, and pages not yet summarized, may always match.
+  def mayMatch(self, pageIndex, ranges):
+    if not self.columns or pageIndex >= self.numPages():
+      return True
+
+    start = 2 * len(self.columns) * pageIndex
+    for (i, field) in enumerate(self.fields):
+      if field in ranges:
+        (low, high) = ranges[field]
+        if (low is not None and self.bounds[start + 2*i + 1] < low) \
+            or (high is not None and self.bounds[start + 2*i] > high):
+          return False
+    return True
+
+  def pack(self):
+    return ZoneMap.fileHeader.pack(self.numPages(), len(self.columns)) + self.bounds.tobytes()
+
+  # Returns a zone map from its packed representation, or None if it does not match the schema.
+  @classmethod
+  def unpack(cls, schema, buffer):
+    zoneMap = cls(schema)
+    if len(buffer) >= cls.fileHeader.size and (len(buffer) - cls.fileHeader.size) % zoneMap.bounds.itemsize == 0:
+      (numPages, numColumns) = cls.fileHeader.unpack_from(buffer)
+      zoneMap.bounds.frombytes(buffer[cls.fileHeader.size:])
+      if numColumns == len(zoneMap.columns) and zoneMap.numPages() == numPages \
+          and len(zoneMap.bounds) == 2 * numColumns * numPages:
+        return zoneMap
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -1,6 +1,8 @@
-import io, math, os, os.path, random, shutil, time, timeit
+import concurrent.futures, contextlib, io, itertools, math, os, os.path, random, shutil, time, timeit
 
 from Catalog.Schema        import DBSchema
+from Storage.BufferPool    import BufferPool
+from Storage.File          import StorageFile
 from Storage.StorageEngine import StorageEngine
 from Database              import Database
 
@@ -36,6 +38,19 @@ class WorkloadGenerator:
   >>> [wg.schemas['orders'].unpack(t).O_ORDERKEY for t in db.storageEngine().tuples('orders')] # doctest:+ELLIPSIS
   [1, 2, 3, ..., 582]
 
+  >>> db.close()
+  >>> shutil.rmtree(db.fileManager().dataDir, ignore_errors=True)
+  >>> del db
+
+  # Parallel loading parses and packs pages in worker processes.
+  >>> db = Database()
+  >>> wg.createRelations(db)
+  >>> wg.loadDataset(db, 'test/datasets/tpch-tiny', 1.0, workers=2)
+  >>> [wg.schemas['nation'].unpack(t).N_NATIONKEY for t in db.storageEngine().tuples('nation')][:5]
+  [0, 1, 2, 3, 4]
+  >>> len(wg.tupleIds['lineitem']) == len(list(db.storageEngine().tuples('lineitem')))
+  True
+
   >>> db.close()
   >>> shutil.rmtree(db.fileManager().dataDir, ignore_errors=True)
   >>> del db
@@ -44,29 +59,43 @@ class WorkloadGenerator:
   Tuples: 736
   Throughput: ...
   Execution time: ...
+  Hit ratio: ...
 
   >>> wg.runWorkload('test/datasets/tpch-tiny', 1.0, 4096, 2) # doctest:+ELLIPSIS
   Tuples: 736
   Throughput: ...
   Execution time: ...
+  Hit ratio: ...
 
   >>> wg.runWorkload('test/datasets/tpch-tiny', 1.0, 4096, 3) # doctest:+ELLIPSIS
   Tuples: 736
   Throughput: ...
   Execution time: ...
+  Hit ratio: ...
 
   >>> wg.runWorkload('test/datasets/tpch-tiny', 1.0, 4096, 4) # doctest:+ELLIPSIS
   Tuples: 736
   Throughput: ...
   Execution time: ...
+  Hit ratio: ...
 
   >>> print("Total time: " + str( \
             timeit.timeit(stmt="wg = WorkloadGenerator(); wg.runWorkload('test/datasets/tpch-tiny', 1.0, 4096, 1)", \
                           setup="from __main__ import WorkloadGenerator", number=10))) # doctest:+ELLIPSIS
   Tuples: ...
   Total time: ...
+
+  # Compare buffer pool replacement policies with a pool smaller than the dataset.
+  >>> wg.comparePolicies('test/datasets/tpch-tiny', 1.0, 4096, 16, modes=[1]) # doctest:+ELLIPSIS
+  Policy: lru Mode: 1 Hit ratio: ...
+  Policy: clock Mode: 1 Hit ratio: ...
+  Policy: 2q Mode: 1 Hit ratio: ...
+  Policy: lru-2 Mode: 1 Hit ratio: ...
   """
 
+  # Size of the byte ranges of CSV files parsed by each task when loading in parallel.
+  splitSize = 1 << 22
+
   def __init__(self):
     random.seed(a=12345)
     self.initializeSchemas()
@@ -187,26 +216,61 @@ class WorkloadGenerator:
 
   # Load the CSV files corresponding to the TPC-H relations into the given storage engine.
   # This method (naively) samples the dataset based on the scale factor.
-  def loadDataset(self, db, datadir, scaleFactor):
+  # Relations are bulk loaded, unless 'bulk=False' is given to insert tuples one at a time.
+  # With 'workers' set, CSV files are parsed and packed into pages by that many processes.
+  def loadDataset(self, db, datadir, scaleFactor, bulk=True, workers=None):
     self.tupleIds = {}
-    for i in self.schemas:
-      if db.hasRelation(i):
-        filePath = os.path.join(datadir, i+".csv")
-        if os.path.exists(filePath):
-          with open(filePath) as f:
-            self.tupleIds[i] = []
-            for line in f:
-              if random.random() <= scaleFactor:
-                tup = self.schemas[i].instantiate(*(self.parsers[i].parse(line)))
-                tupleId = db.insertTuple(i, self.schemas[i].pack(tup))
+    executor = concurrent.futures.ProcessPoolExecutor(workers) if bulk and workers else None
+    try:
+      for i in self.schemas:
+        if db.hasRelation(i):
+          filePath = os.path.join(datadir, i+".csv")
+          if os.path.exists(filePath):
+            if executor:
+              self.tupleIds[i] = self.loadParallel(db, i, filePath, scaleFactor, executor)
+              continue
+
+            with open(filePath) as f:
+              if bulk:
+                self.tupleIds[i] = db.bulkLoad(i, self.packLines(i, f, scaleFactor))
+                continue
+
+              self.tupleIds[i] = []
+              for tupleData in self.packLines(i, f, scaleFactor):
+                tupleId = db.insertTuple(i, tupleData)
                 if tupleId is not None:
                   self.tupleIds[i].append(tupleId)
                 else:
                   raise ValueError("Failed to insert tuple")
+          else:
+            raise ValueError("Could not find file: " + filePath)
         else:
-          raise ValueError("Could not find file: " + filePath)
-      else:
-        raise ValueError("Uninitialized relation: "+i)
+          raise ValueError("Uninitialized relation: "+i)
+    finally:
+      if executor:
+        executor.shutdown()
+
+  # Splits a relation's CSV file into byte ranges, which are parsed and packed into pages by
+  # worker processes. The pages are appended to the relation by this process in file order,
+  # as each range completes.
+  def loadParallel(self, db, relation, filePath, scaleFactor, executor):
+    (_, rFile) = db.storageEngine().fileMgr.relationFile(relation)
+    fileSize   = os.path.getsize(filePath)
+    numSplits  = max(1, math.ceil(fileSize / WorkloadGenerator.splitSize))
+    bounds     = [fileSize * k // numSplits for k in range(numSplits + 1)]
+
+    splitPages = executor.map(packCSVRange, itertools.repeat(relation), itertools.repeat(filePath), \
+                              bounds[:-1], bounds[1:], itertools.repeat(scaleFactor), \
+                              itertools.repeat(rFile.pageClass()), itertools.repeat(rFile.pageSize()))
+    return db.appendPages(relation, itertools.chain.from_iterable(splitPages))
+
+  # Parses and packs the sampled lines of a relation's CSV file.
+  def packLines(self, relation, lines, scaleFactor):
+    schema = self.schemas[relation]
+    parser = self.parsers[relation]
+    for line in lines:
+      if random.random() <= scaleFactor:
+        yield schema.pack(schema.instantiate(*(parser.parse(line))))
 
   # Scan through all the stored tuples for the given relations
   def scanRelations(self, db, relations):
@@ -258,9 +322,11 @@ class WorkloadGenerator:
     print("Throughput: " + str(tuplesRead / (end - start)))
     print("Execution time: " + str(end - start))
 
-  # Dispatch a workload mode.
+  # Dispatch a workload mode, reporting the buffer pool hit ratio for the workload.
   def runOperations(self, db, mode):
     if hasattr(self, 'tupleIds') and self.tupleIds:
+      db.bufferPool().resetStatistics()
+
       if mode == 1:
         self.scanRelations(db, ['lineitem', 'orders'])
 
@@ -275,17 +341,68 @@ class WorkloadGenerator:
 
       else:
         raise ValueError("Invalid workload mode (expected 1-4): "+str(mode))
+
+      print("Hit ratio: " + str(db.bufferPool().hitRatio()))
     else:
       raise ValueError("No tuple ids found, has the dataset been loaded?")
 
-  def runWorkload(self, datadir, scaleFactor, pageSize, workloadMode):
-    db = Database(pageSize=pageSize)
+  # Runs a workload on a fresh database.
+  # Optional keyword arguments 'poolPages' and 'replacementPolicy' configure the buffer pool.
+  def runWorkload(self, datadir, scaleFactor, pageSize, workloadMode, **kwargs):
+    dbArgs = {'pageSize': pageSize}
+    if kwargs.get('poolPages', None):
+      dbArgs['poolSize'] = kwargs['poolPages'] * pageSize
+    if kwargs.get('replacementPolicy', None):
+      dbArgs['replacementPolicy'] = kwargs['replacementPolicy']
+
+    db = Database(**dbArgs)
     self.createRelations(db)
     self.loadDataset(db, datadir, scaleFactor)
     self.runOperations(db, workloadMode)
+    hitRatio = db.bufferPool().hitRatio()
     db.close()
     shutil.rmtree(db.fileManager().dataDir, ignore_errors=True)
     del db
+    return hitRatio
+
+  # Runs each workload mode under every buffer pool replacement policy, with a pool
+  # of the given number of pages, and reports the hit ratio achieved by each policy.
+  def comparePolicies(self, datadir, scaleFactor, pageSize, poolPages, modes=[1, 2, 3, 4]):
+    results = {}
+    with open(os.devnull, 'w') as devnull:
+      for policy in BufferPool.replacementPolicies:
+        for mode in modes:
+          with contextlib.redirect_stdout(devnull):
+            hitRatio = self.runWorkload(datadir, scaleFactor, pageSize, mode, \
+                                        poolPages=poolPages, replacementPolicy=policy)
+          results[(policy, mode)] = hitRatio
+          print("Policy: " + policy + " Mode: " + str(mode) + " Hit ratio: " + str(hitRatio))
+    return results
+
+
+# Parses and packs the lines of a relation's CSV file that start within the given byte range,
+# returning the packed pages. Each range samples its lines with its own random seed.
+# This is run by worker processes when loading a dataset in parallel.
+def packCSVRange(relation, filePath, start, end, scaleFactor, pageClass, pageSize):
+  wg = WorkloadGenerator()
+  random.seed(a=12345 + start)
+
+  lines = []
+  with open(filePath, 'rb') as f:
+    # Skip the line spanning the start of the range, which belongs to the previous range.
+    if start > 0:
+      f.seek(start - 1)
+      f.readline()
+
+    while f.tell() < end:
+      line = f.readline()
+      if not line:
+        break
+      lines.append(line.decode())
+
+  tuples = wg.packLines(relation, lines, scaleFactor)
+  return list(StorageFile.packPages(pageClass, wg.schemas[relation], pageSize, tuples))
+
 
 if __name__ == "__main__":
     import doctest